@@ -0,0 +1,178 @@
+import json
+import logging
+import multiprocessing as mp
+import socket
+import threading
+import time
+
+# Default budget: total bytes yang boleh sedang di-buffer/ditransfer sekaligus
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024  # 512MB
+# Transfer di bawah threshold ini (LIST, DELETE, GET file kecil) tidak pernah antri
+LARGE_TRANSFER_THRESHOLD = 1024 * 1024  # 1MB
+
+# Index untuk state array (dipakai bersama oleh thread maupun process)
+_IN_FLIGHT = 0
+_WAITING = 1
+_DRAIN_RATE = 2
+_ADMITTED = 3
+_REJECTED = 4
+
+
+class AdmissionController:
+    """Track bytes in flight against a memory budget and admit or reject transfers.
+
+    Satu instance dipakai bersama oleh semua handler. Dengan shared=True state
+    disimpan di shared memory sehingga bisa dipakai lintas worker process.
+    """
+
+    def __init__(self, memory_budget=DEFAULT_MEMORY_BUDGET, max_wait=5.0, max_queue=16,
+                 large_threshold=LARGE_TRANSFER_THRESHOLD, shared=False):
+        self.memory_budget = memory_budget
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.large_threshold = large_threshold
+        self.shared = shared
+        if shared:
+            self._state = mp.Array('d', 5, lock=False)
+            self._cond = mp.Condition()
+        else:
+            self._state = [0.0] * 5
+            self._cond = threading.Condition()
+        # Perkiraan awal kecepatan release sebelum ada data (50MB/s)
+        self._state[_DRAIN_RATE] = 50 * 1024 * 1024
+        logging.info(f"AdmissionController initialized, budget: {memory_budget} bytes, shared: {shared}")
+
+    def reservation(self):
+        return Reservation(self)
+
+    def _fits(self, current, nbytes):
+        in_flight = self._state[_IN_FLIGHT]
+        # Transfer kecil selalu lolos, transfer yang lebih besar dari budget
+        # tetap boleh jalan kalau tidak ada transfer lain yang sedang aktif
+        if current + nbytes < self.large_threshold:
+            return True
+        if in_flight - current <= 0:
+            return True
+        return in_flight + nbytes <= self.memory_budget
+
+    def acquire(self, nbytes, current=0, timeout=None):
+        """Reserve nbytes on top of `current` bytes already held by the caller.
+
+        Returns True if admitted. Waits in the queue up to `timeout` seconds
+        (default max_wait) and returns False immediately if the queue is full.
+        """
+        timeout = self.max_wait if timeout is None else timeout
+        with self._cond:
+            if self._fits(current, nbytes):
+                self._state[_IN_FLIGHT] += nbytes
+                self._state[_ADMITTED] += 1 if current == 0 else 0
+                return True
+
+            if self._state[_WAITING] >= self.max_queue or timeout <= 0:
+                self._state[_REJECTED] += 1
+                return False
+
+            deadline = time.time() + timeout
+            self._state[_WAITING] += 1
+            try:
+                while not self._fits(current, nbytes):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self._state[_REJECTED] += 1
+                        return False
+                    self._cond.wait(remaining)
+                self._state[_IN_FLIGHT] += nbytes
+                self._state[_ADMITTED] += 1 if current == 0 else 0
+                return True
+            finally:
+                self._state[_WAITING] -= 1
+
+    def release(self, nbytes, duration=None):
+        """Return nbytes to the budget. `duration` updates the drain rate estimate."""
+        if nbytes <= 0:
+            return
+        with self._cond:
+            self._state[_IN_FLIGHT] = max(0.0, self._state[_IN_FLIGHT] - nbytes)
+            if duration and duration > 0 and nbytes >= self.large_threshold:
+                rate = nbytes / duration
+                # EWMA supaya satu transfer lambat tidak langsung merusak estimasi
+                self._state[_DRAIN_RATE] = 0.8 * self._state[_DRAIN_RATE] + 0.2 * rate
+            self._cond.notify_all()
+
+    def retry_after_ms(self, nbytes=0):
+        """Estimate how long a client should wait before retrying a transfer of nbytes."""
+        with self._cond:
+            in_flight = self._state[_IN_FLIGHT]
+            drain_rate = max(self._state[_DRAIN_RATE], 1.0)
+            waiting = self._state[_WAITING]
+        excess = max(in_flight + nbytes - self.memory_budget, self.large_threshold)
+        estimate = excess / drain_rate * 1000 * (1 + waiting)
+        return int(min(max(estimate, 100), 30000))
+
+    def snapshot(self):
+        with self._cond:
+            return dict(
+                memory_budget=self.memory_budget,
+                in_flight=int(self._state[_IN_FLIGHT]),
+                waiting=int(self._state[_WAITING]),
+                admitted=int(self._state[_ADMITTED]),
+                rejected=int(self._state[_REJECTED]),
+                drain_rate=int(self._state[_DRAIN_RATE]),
+            )
+
+
+class Reservation:
+    """Bytes held by a single request. Grows as data is buffered, released once."""
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.reserved = 0
+        self.started = time.time()
+
+    def grow(self, nbytes, timeout=None):
+        if nbytes <= 0:
+            return True
+        if self.controller.acquire(nbytes, current=self.reserved, timeout=timeout):
+            self.reserved += nbytes
+            return True
+        return False
+
+    def release(self):
+        if self.reserved:
+            self.controller.release(self.reserved, time.time() - self.started)
+            self.reserved = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def busy_response(retry_after_ms):
+    return json.dumps(dict(status='BUSY', message='Server busy, retry later',
+                           retry_after_ms=int(retry_after_ms)))
+
+
+def send_busy(connection, retry_after_ms):
+    """Send a BUSY reply and half-close so the client can read it before we close"""
+    try:
+        response = busy_response(retry_after_ms) + "\r\n\r\n"
+        connection.sendall(response.encode('utf-8'))
+        connection.shutdown(socket.SHUT_WR)
+    except OSError as e:
+        logging.warning(f"Failed to send BUSY reply: {e}")
+
+
+if __name__ == '__main__':
+    ac = AdmissionController(memory_budget=10 * 1024 * 1024, max_wait=0.5)
+    print("Testing AdmissionController:")
+    r1 = ac.reservation()
+    print("1. Reserve 8MB:", r1.grow(8 * 1024 * 1024))
+    r2 = ac.reservation()
+    print("2. Reserve another 8MB (should be rejected):", r2.grow(8 * 1024 * 1024))
+    print("3. Small request still admitted:", ac.reservation().grow(1024))
+    print("4. Retry hint (ms):", ac.retry_after_ms(8 * 1024 * 1024))
+    r1.release()
+    print("5. Reserve 8MB after release:", r2.grow(8 * 1024 * 1024))
+    print("6. Snapshot:", ac.snapshot())
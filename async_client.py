@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+
+from buffered_reader import AsyncBufferedReader, TERMINATOR
+from client_protocol import (encode_copy, encode_delete, encode_get, encode_list, encode_move, encode_stats,
+                             upload_header, iter_upload_body, decode_response, busy_delay,
+                             receive_download_async)
+
+
+def raise_fd_limit(needed):
+    """Raise the soft open-files limit towards the hard limit; returns the limit in effect"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError) as e:
+            logging.warning(f"Cannot raise open files limit to {needed}: {e}")
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        logging.warning(f"Open files limit {soft} is below {needed} concurrent connections")
+    return soft
+
+
+class AsyncFileClient:
+    """asyncio version of the file client: one event loop can drive thousands of connections.
+
+    Encoding/decoding protokol sama dengan file_client_cli (client_protocol).
+    Body upload dikirim bertahap dari file (tidak pernah ada string base64
+    utuh di memory), response dibaca dengan AsyncBufferedReader.
+    Error koneksi/timeout di-retry dengan exponential backoff + jitter,
+    BUSY di-retry setelah retry_after_ms dari server.
+    """
+
+    def __init__(self, server_address=('localhost', 6666), timeout=120, max_retries=3, backoff=0.5,
+                 max_backoff=8.0, max_busy_retries=10, source_address=None, read_size=65536):
+        self.server_address = server_address
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_busy_retries = max_busy_retries
+        # Bind ke IP lokal tertentu (misal 127.0.0.2) untuk mensimulasikan client berbeda
+        self.source_address = source_address
+        self.read_size = read_size
+
+    def backoff_delay(self, attempt):
+        """Full-range jitter so that thousands of clients do not retry in lockstep"""
+        return min(self.max_backoff, self.backoff * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+    async def _exchange(self, header, body_path=None, receive=None):
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            if self.source_address:
+                sock.bind((self.source_address, 0))
+            await loop.sock_connect(sock, self.server_address)
+            try:
+                if body_path:
+                    await loop.sock_sendall(sock, header)
+                    with open(body_path, 'rb') as f:
+                        for block in iter_upload_body(f):
+                            await loop.sock_sendall(sock, block)
+                    await loop.sock_sendall(sock, TERMINATOR)
+                else:
+                    await loop.sock_sendall(sock, header + TERMINATOR)
+            except (BrokenPipeError, ConnectionResetError):
+                # Server bisa membalas BUSY lalu menutup koneksi sebelum upload selesai
+                logging.debug("Server closed connection while sending, reading reply")
+            # Response dibaca dengan sock_recv_into ke buffer yang tumbuh
+            reader = AsyncBufferedReader(sock, loop, recv_size=self.read_size)
+            if receive:
+                return await receive(reader)
+            message = await reader.read_until()
+            if message is None:
+                return {'status': 'ERROR', 'message': 'No response received'}
+            with message:
+                return decode_response(message)
+        finally:
+            sock.close()
+
+    async def request(self, header, body_path=None, timeout=None, receive=None):
+        """Send one request (retrying as needed) and return the response dict.
+
+        receive: coroutine function(reader) yang membaca response menggantikan read_until.
+        """
+        timeout = timeout or self.timeout
+        attempt = 0
+        busy_retries = 0
+        while True:
+            try:
+                result = await asyncio.wait_for(self._exchange(header, body_path, receive), timeout)
+            except asyncio.TimeoutError:
+                error = 'Connection timeout'
+            except OSError as e:
+                error = str(e) or e.__class__.__name__
+            else:
+                delay = busy_delay(result)
+                if delay is not None and busy_retries < self.max_busy_retries:
+                    busy_retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+                return result
+            attempt += 1
+            logging.debug(f"Attempt {attempt} to {self.server_address} failed: {error}")
+            if attempt >= self.max_retries:
+                return {'status': 'ERROR', 'message': error}
+            await asyncio.sleep(self.backoff_delay(attempt))
+
+    async def list(self):
+        return await self.request(encode_list(), timeout=min(self.timeout, 30))
+
+    async def stats(self):
+        return await self.request(encode_stats(), timeout=min(self.timeout, 30))
+
+    async def delete(self, filename):
+        return await self.request(encode_delete(filename))
+
+    async def copy(self, source, target):
+        """Server-side copy; no file content goes over the connection"""
+        return await self.request(encode_copy(source, target))
+
+    async def move(self, source, target):
+        return await self.request(encode_move(source, target))
+
+    async def get(self, filename, save_to=None):
+        """GET; with save_to the decoded file is written there (directory or file path).
+
+        Body di-stream per potongan recv (receive_download_async), jadi memory
+        per client kecil berapa pun ukuran file. Tanpa save_to body hanya
+        didecode lalu dibuang; result berisi size, bukan data_file.
+        """
+        if save_to and os.path.isdir(save_to):
+            save_to = os.path.join(save_to, os.path.basename(filename))
+        return await self.request(encode_get(filename),
+                                  receive=lambda reader: receive_download_async(reader, save_to))
+
+    async def upload(self, file_path, filename=None):
+        filename = filename or os.path.basename(file_path)
+        file_size = os.path.getsize(file_path)
+        # Sama dengan client blocking: 10 detik per MB, minimal timeout default
+        timeout = max(self.timeout, file_size // (1024 * 1024) * 10)
+        return await self.request(upload_header(filename), body_path=file_path, timeout=timeout)
+
+
+async def gather_limited(coroutines, concurrency=None):
+    """Run coroutines concurrently, at most `concurrency` at a time (None = all at once)"""
+    if not concurrency:
+        return await asyncio.gather(*coroutines)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(limited(c) for c in coroutines))
+
+
+async def _run_cli(args):
+    client = AsyncFileClient((args.host, args.port), timeout=args.timeout)
+    if args.operation == 'list':
+        make = client.list
+    elif args.operation == 'get':
+        make = lambda: client.get(args.target)
+    else:
+        make = lambda: client.upload(args.target)
+
+    async def one():
+        started = time.perf_counter()
+        result = await make()
+        return result.get('status'), time.perf_counter() - started
+
+    started = time.perf_counter()
+    outcomes = await gather_limited([one() for _ in range(args.clients)], args.concurrency)
+    elapsed = time.perf_counter() - started
+    counts = {}
+    for status, _ in outcomes:
+        counts[status] = counts.get(status, 0) + 1
+    latencies = sorted(t for status, t in outcomes if status == 'OK')
+    print(f"{args.clients} {args.operation} requests in {elapsed:.2f}s: {counts}")
+    if latencies:
+        print(f"latency min={latencies[0]:.3f}s median={latencies[len(latencies) // 2]:.3f}s "
+              f"max={latencies[-1]:.3f}s")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Banyak request bersamaan dari satu event loop asyncio")
+    parser.add_argument('operation', choices=['list', 'get', 'upload'])
+    parser.add_argument('target', nargs='?', help="Nama file (get) atau path file (upload)")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6666)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=None, help="Batas koneksi bersamaan (default semua)")
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+    if args.operation != 'list' and not args.target:
+        parser.error(f"{args.operation} needs a file name")
+    raise_fd_limit(min(args.clients, args.concurrency or args.clients) + 64)
+    asyncio.run(_run_cli(args))
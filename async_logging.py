@@ -0,0 +1,174 @@
+import logging
+import logging.handlers
+import multiprocessing as mp
+import queue
+import threading
+import time
+
+# Logger untuk pesan per-request / per-chunk yang boleh di-sample
+hot_log = logging.getLogger('fileserver.hotpath')
+# Satu baris terstruktur per request
+access_log = logging.getLogger('fileserver.access')
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DEFAULT_SAMPLE_RATES = {logging.DEBUG: 1000, logging.INFO: 100}
+
+
+class SamplingFilter(logging.Filter):
+    """Keep 1 of every N records per level. WARNING and above are never sampled.
+
+    Dipasang di logger hot path sehingga record yang dibuang tidak pernah
+    masuk queue sama sekali.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(DEFAULT_SAMPLE_RATES if rates is None else rates)
+        self._counters = {}
+        self.dropped = 0
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno, 1)
+        if rate <= 1:
+            return True
+        # Counter tanpa lock: kalau dua thread bentrok paling-paling rasio sampling sedikit meleset
+        count = self._counters.get(record.levelno, 0) + 1
+        self._counters[record.levelno] = count
+        if count % rate == 1:
+            return True
+        self.dropped += 1
+        return False
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    QueueHandler bawaan memformat pesan di thread pemanggil. Untuk queue
+    antar-thread record cukup dikirim apa adanya; untuk queue antar-process
+    record harus tetap di-prepare supaya bisa di-pickle.
+    """
+
+    def __init__(self, log_queue, cross_process=False):
+        super().__init__(log_queue)
+        self.cross_process = cross_process
+
+    def prepare(self, record):
+        if self.cross_process or record.exc_info:
+            return super().prepare(record)
+        return record
+
+
+class _AccessOnly(logging.Filter):
+    def filter(self, record):
+        return record.name == access_log.name
+
+
+class _NotAccess(logging.Filter):
+    def filter(self, record):
+        return record.name != access_log.name
+
+
+_listener = None
+
+
+def setup_async_logging(level=logging.INFO, access_log_path=None, sample_rates=None, multiprocess=False):
+    """Route all logging through a queue to a single writer thread.
+
+    Semua handler root diganti dengan satu queue handler. Dengan multiprocess=True
+    queue-nya multiprocessing.Queue sehingga child process (fork) menulis lewat
+    listener yang sama di parent. Mengembalikan QueueListener yang sudah jalan.
+    """
+    global _listener
+    stop_async_logging()
+
+    log_queue = mp.Queue(-1) if multiprocess else queue.SimpleQueue()
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers = [console]
+    if access_log_path:
+        access_file = logging.FileHandler(access_log_path)
+        access_file.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        access_file.addFilter(_AccessOnly())
+        console.addFilter(_NotAccess())
+        handlers.append(access_file)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(DeferredQueueHandler(log_queue, cross_process=multiprocess))
+    root.setLevel(level)
+
+    for f in hot_log.filters[:]:
+        hot_log.removeFilter(f)
+    hot_log.addFilter(SamplingFilter(sample_rates))
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_async_logging():
+    """Flush the queue and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_access(client, command_str, response, bytes_in, bytes_out, started):
+    """Write one structured access log line for a finished request"""
+    if not access_log.isEnabledFor(logging.INFO):
+        return
+    head = command_str[:256].split(None, 2)
+    command = head[0].upper() if head else '-'
+    target = head[1] if len(head) > 1 else '-'
+    # Response selalu diawali {"status": "...", cukup cek prefix tanpa json.loads
+    status = 'OK' if response.startswith('{"status": "OK"') else (
+        'BUSY' if response.startswith('{"status": "BUSY"') else 'ERROR')
+    duration_ms = (time.time() - started) * 1000
+    access_log.info(f"client={client[0]}:{client[1]} cmd={command} target={target} status={status} "
+                    f"bytes_in={bytes_in} bytes_out={bytes_out} duration_ms={duration_ms:.1f}")
+
+
+def measure_logging_overhead(iterations=20000, threads=8):
+    """Compare the caller-side cost of hot-path logging: sync handler vs async pipeline"""
+    import os
+
+    def run(label):
+        def worker():
+            for i in range(iterations // threads):
+                hot_log.info(f"Processing command: GET test_{i}.txt")
+        start = time.perf_counter()
+        ts = [threading.Thread(target=worker) for _ in range(threads)]
+        for t in ts:
+            t.start()
+        for t in ts:
+            t.join()
+        per_call = (time.perf_counter() - start) / iterations * 1e6
+        print(f"{label:<28} {per_call:.2f} us/call")
+
+    root = logging.getLogger()
+    # Tulis ke devnull: tetap ada syscall write + flush per record seperti stderr
+    sink = logging.StreamHandler(open(os.devnull, 'w'))
+    sink.setFormatter(logging.Formatter(LOG_FORMAT))
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(sink)
+    root.setLevel(logging.INFO)
+    run("sync StreamHandler")
+
+    listener = setup_async_logging(sample_rates={})
+    listener.handlers = (sink,)
+    run("async queue (no sampling)")
+
+    listener = setup_async_logging()
+    listener.handlers = (sink,)
+    run("async queue (sampled 1/100)")
+    stop_async_logging()
+
+
+if __name__ == '__main__':
+    print("Measuring logging overhead on the request path:")
+    measure_logging_overhead()
@@ -0,0 +1,57 @@
+import binascii
+
+# Kelipatan 3 byte (encode) dan menghasilkan kelipatan 4 karakter (decode)
+BLOCK_SIZE = 3 * 65536
+
+# Byte di luar alfabet base64 (newline dari encodebytes, spasi) diabaikan oleh b64decode,
+# jadi juga dibuang di sini sebelum menghitung kelompok 4 karakter
+_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+_NOISE = bytes(sorted(set(range(256)) - set(_ALPHABET)))
+
+
+def strip_noise(data):
+    """data without the bytes outside the base64 alphabet"""
+    return bytes(data).translate(None, _NOISE)
+
+
+class Base64StreamDecoder:
+    """Decode base64 that arrives in arbitrary pieces.
+
+    Hanya kelipatan 4 karakter yang didecode, sisa (maksimal 3 karakter)
+    disimpan untuk potongan berikutnya, jadi memory yang dipakai sebesar
+    satu potongan, bukan seluruh body.
+    """
+
+    def __init__(self):
+        self.pending = b""
+        self.decoded = 0
+
+    def feed(self, data):
+        """Decoded bytes for all complete 4-character groups seen so far"""
+        data = strip_noise(data)
+        if self.pending:
+            data = self.pending + data
+        usable = len(data) - len(data) % 4
+        self.pending = data[usable:]
+        if not usable:
+            return b""
+        out = binascii.a2b_base64(data[:usable])
+        self.decoded += len(out)
+        return out
+
+    def finish(self):
+        """Raise binascii.Error if the stream ended in the middle of a group"""
+        if self.pending:
+            raise binascii.Error(f"base64 stream ends with {len(self.pending)} stray character(s)")
+        return b""
+
+
+def iter_base64_file(fp, block_size=BLOCK_SIZE):
+    """Base64 of an open binary file, one block at a time; blocks are 3-byte aligned so pieces concatenate"""
+    if block_size % 3:
+        raise ValueError("block_size must be a multiple of 3")
+    while True:
+        block = fp.read(block_size)
+        if not block:
+            return
+        yield binascii.b2a_base64(block, newline=False)
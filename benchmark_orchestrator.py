@@ -0,0 +1,534 @@
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmark_results import environment_metadata, save_results_json
+from durability import DURABILITY_LEVELS
+from shard_ring import node_name
+from stress_test import (ComprehensiveStressTest, FileClient, ReplicatedFileClient, ShardedFileClient,
+                         run_all_combinations, print_results_table, save_results_to_csv, generate_analysis_report,
+                         percentile)
+
+# Setup logging
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Nama engine sama dengan info 'engine' yang dilaporkan STATS. file_server memakai
+# thread per koneksi sehingga tidak punya pool size, cukup dijalankan sekali.
+ENGINES = {
+    'file_server': dict(script='file_server.py', pooled=False),
+    'thread_pool': dict(script='server_thread_pool.py', pooled=True),
+    # Jumlah worker diatur autoscaler, tidak perlu dicoba per pool size
+    'thread_pool_adaptive': dict(script='server_thread_pool.py', pooled=False, args=['--autoscale']),
+    'process_pool': dict(script='server_process_pool.py', pooled=True),
+    # pool size = jumlah encoder process, koneksi dilayani satu event loop
+    'hybrid': dict(script='server_hybrid.py', pooled=True),
+}
+
+
+def free_port(host='127.0.0.1'):
+    """Ask the kernel for a port nobody is listening on"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+def start_server(engine, port, pool_size, log_file, cwd=BASE_DIR, extra_args=(), memory_budget_mb=None):
+    """Start one server configuration as a subprocess; it serves `cwd`/files"""
+    spec = ENGINES[engine]
+    cmd = [sys.executable, os.path.join(BASE_DIR, spec['script']), '--host', '127.0.0.1', '--port', str(port)]
+    if spec['pooled']:
+        cmd += ['--pool-size', str(pool_size)]
+    if memory_budget_mb:
+        cmd += ['--memory-budget-mb', str(memory_budget_mb)]
+    cmd += spec.get('args', []) + list(extra_args)
+    env = dict(os.environ, PYTHONUNBUFFERED='1')
+    return subprocess.Popen(cmd, cwd=cwd, stdout=log_file, stderr=subprocess.STDOUT, env=env)
+
+
+def wait_ready(process, address, timeout=30):
+    """Poll until the server answers STATS. Returns the first snapshot."""
+    deadline = time.time() + timeout
+    client = FileClient(address)
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode} before becoming ready")
+        try:
+            # Cek port dulu supaya tidak menunggu retry/backoff send_command_robust
+            with socket.create_connection(address, timeout=1):
+                pass
+        except OSError:
+            time.sleep(0.2)
+            continue
+        stats = client.server_stats()
+        if stats:
+            return stats
+        time.sleep(0.2)
+    raise RuntimeError(f"server on {address} not ready after {timeout}s")
+
+
+def warm_up(test, volume_mb, rounds=3):
+    """A few LIST requests and one upload/download so the first matrix row is not a cold start"""
+    for _ in range(rounds):
+        test.client.list_files()
+    test_file = test.test_files.get(volume_mb)
+    if test_file:
+        test.client.upload_file(test_file)
+        test.client.download_file(os.path.basename(test_file))
+
+
+def stop_server(process, timeout=30):
+    """SIGINT (sama seperti Ctrl-C) lalu tunggu; kill kalau server tidak berhenti"""
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logging.warning(f"Server pid {process.pid} did not stop after {timeout}s, killing")
+            process.kill()
+            process.wait()
+    return process.returncode
+
+
+def run_configuration(engine, pool_size, args, output_dir):
+    """Start one server, run the client matrix against it and stop it again"""
+    port = free_port()
+    address = ('127.0.0.1', port)
+    label = f"{engine}_{pool_size}" if ENGINES[engine]['pooled'] else engine
+    print(f"\n{'#' * 100}\n# {label}: starting server on port {port}\n{'#' * 100}")
+
+    with open(os.path.join(output_dir, f"server_{label}.log"), 'w') as log_file:
+        process = start_server(engine, port, pool_size, log_file, memory_budget_mb=args.memory_budget_mb)
+        try:
+            stats = wait_ready(process, address, timeout=args.ready_timeout)
+            info = stats.get('info', {})
+            if info.get('engine') != engine:
+                raise RuntimeError(f"expected engine {engine}, server reports {info.get('engine')}")
+
+            test = ComprehensiveStressTest(server_address=address)
+            if not test.create_test_files():
+                raise RuntimeError("failed to create test files")
+            warm_up(test, min(args.volumes))
+
+            results = run_all_combinations(server_address=address, operations=args.operations,
+                                           volumes=args.volumes, client_workers=args.client_workers,
+                                           server_workers=[pool_size if ENGINES[engine]['pooled'] else None],
+                                           client_models=args.client_models)
+
+            final_stats = test.wait_server_idle()
+            if final_stats:
+                with open(os.path.join(output_dir, f"stats_{label}.json"), 'w') as f:
+                    json.dump(final_stats, f, indent=2)
+            for result in results:
+                result['configuration'] = label
+            return results
+        except Exception as e:
+            logging.error(f"Configuration {label} failed: {e}")
+            return []
+        finally:
+            code = stop_server(process)
+            print(f"# {label}: server stopped (exit code {code})")
+
+
+def run_benchmark(args):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir = args.output_dir or os.path.join(BASE_DIR, f"benchmark_{timestamp}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    for engine in args.engines:
+        pool_sizes = args.pool_sizes if ENGINES[engine]['pooled'] else [None]
+        for pool_size in pool_sizes:
+            results.extend(run_configuration(engine, pool_size, args, output_dir))
+
+    # Satu tabel untuk semua engine dan pool size
+    for number, result in enumerate(results, start=1):
+        result['nomor'] = number
+
+    print_results_table(results)
+    save_results_to_csv(results, os.path.join(output_dir, "results.csv"))
+    metadata = environment_metadata(engines=args.engines, pool_sizes=args.pool_sizes,
+                                    client_models=args.client_models, operations=args.operations,
+                                    volumes=args.volumes, client_workers=args.client_workers)
+    save_results_json(results, os.path.join(output_dir, "results.json"), metadata)
+    generate_analysis_report(results)
+    print(f"\nServer logs and STATS snapshots in {output_dir}")
+    return results
+
+
+def _shard_client_loop(nodes, filenames, duration, offset):
+    """One client process of the shard benchmark: download files round-robin until `duration` is over"""
+    client = ShardedFileClient(nodes)
+    deadline = time.time() + duration
+    completed = failed = 0
+    n = offset
+    while time.time() < deadline:
+        if client.download_file(filenames[n % len(filenames)]):
+            completed += 1
+        else:
+            failed += 1
+        n += 1
+    return completed, failed
+
+
+def run_shard_configuration(node_count, args, test_file, output_dir):
+    """Start `node_count` servers, each with its own files/ directory, and measure aggregate GET throughput"""
+    label = f"shards_{node_count}"
+    print(f"\n{'#' * 100}\n# {label}: {node_count} x {args.shard_engine} nodes\n{'#' * 100}")
+    nodes, processes, logs = [], [], []
+    try:
+        for i in range(node_count):
+            # Setiap node punya folder files/ sendiri = shard-nya
+            node_dir = os.path.join(output_dir, label, f"node{i}")
+            os.makedirs(node_dir, exist_ok=True)
+            port = free_port()
+            log_file = open(os.path.join(node_dir, "server.log"), 'w')
+            logs.append(log_file)
+            processes.append(start_server(args.shard_engine, port, args.shard_pool_size, log_file, cwd=node_dir,
+                                          memory_budget_mb=args.memory_budget_mb))
+            nodes.append(('127.0.0.1', port))
+        for process, node in zip(processes, nodes):
+            wait_ready(process, node, timeout=args.ready_timeout)
+
+        client = ShardedFileClient(nodes)
+        filenames = [f"shard_{i:03d}.bin" for i in range(args.shard_files)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            uploaded = list(executor.map(lambda name: client.upload_file(test_file, name), filenames))
+        if not all(uploaded):
+            raise RuntimeError(f"{uploaded.count(False)} of {len(filenames)} uploads failed")
+        spread = client.ring.distribution(filenames)
+        print("  Files per node: " + ", ".join(f"{node_name(n)}={c}" for n, c in spread.items()))
+
+        started = time.time()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.shard_clients) as executor:
+            futures = [executor.submit(_shard_client_loop, nodes, filenames, args.duration, i * 7)
+                       for i in range(args.shard_clients)]
+            outcomes = [f.result() for f in futures]
+        elapsed = time.time() - started
+        completed = sum(c for c, _ in outcomes)
+        failed = sum(f for _, f in outcomes)
+        throughput = completed * os.path.getsize(test_file) / elapsed
+        print(f"  {completed} downloads OK, {failed} failed in {elapsed:.1f}s: "
+              f"{throughput / (1024 * 1024):.1f} MB/s aggregate")
+        return dict(configuration=label, nodes=node_count, engine=args.shard_engine,
+                    clients=args.shard_clients, completed=completed, failed=failed, elapsed=elapsed,
+                    throughput=throughput, files_per_node=list(spread.values()))
+    except Exception as e:
+        logging.error(f"Configuration {label} failed: {e}")
+        return None
+    finally:
+        for process in processes:
+            stop_server(process)
+        for log_file in logs:
+            log_file.close()
+
+
+def run_shard_benchmark(args):
+    """Aggregate throughput for each node count in --shards, all nodes on this machine"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir = args.output_dir or os.path.join(BASE_DIR, f"benchmark_shards_{timestamp}")
+    os.makedirs(output_dir, exist_ok=True)
+    test = ComprehensiveStressTest()
+    if not test.create_test_files():
+        raise RuntimeError("failed to create test files")
+    test_file = test.test_files[min(args.volumes)]
+
+    results = []
+    for node_count in args.shards:
+        result = run_shard_configuration(node_count, args, os.path.abspath(test_file), output_dir)
+        if result:
+            results.append(result)
+
+    # Speedup relatif terhadap konfigurasi pertama (biasanya 1 node)
+    base = results[0]['throughput'] if results else 0
+    print(f"\n{'nodes':>5} | {'downloads':>9} | {'failed':>6} | {'MB/s':>8} | {'speedup':>7}")
+    for result in results:
+        speedup = result['throughput'] / base if base else 0
+        result['speedup'] = speedup
+        print(f"{result['nodes']:>5} | {result['completed']:>9} | {result['failed']:>6} | "
+              f"{result['throughput'] / (1024 * 1024):>8.1f} | {speedup:>6.2f}x")
+    metadata = environment_metadata(shards=args.shards, engine=args.shard_engine, pool_size=args.shard_pool_size,
+                                    clients=args.shard_clients, volume_mb=min(args.volumes), duration=args.duration)
+    save_results_json(results, os.path.join(output_dir, "results.json"), metadata)
+    print(f"\nServer logs in {output_dir}")
+    return results
+
+
+def _replica_client_loop(primary, replicas, filename, duration):
+    """One client process of the replica benchmark: download the hot file until `duration` is over"""
+    client = ReplicatedFileClient(primary, replicas)
+    deadline = time.time() + duration
+    completed = failed = 0
+    while time.time() < deadline:
+        if client.download_file(filename):
+            completed += 1
+        else:
+            failed += 1
+    return completed, failed, client.stale_reads
+
+
+def wait_replicated(primary, replicas, filename, timeout):
+    """Wait until every replica serves the primary's current version of `filename`; seconds it took"""
+    started = time.time()
+    version = FileClient(primary).file_version(filename)
+    pending = list(replicas)
+    while pending:
+        if time.time() - started > timeout:
+            raise RuntimeError(f"{filename} not replicated to {', '.join(node_name(n) for n in pending)}")
+        pending = [n for n in pending if FileClient(n).file_version(filename) != version]
+        time.sleep(0.1)
+    return time.time() - started
+
+
+def run_replica_configuration(replica_count, args, test_file, output_dir):
+    """Start a primary with `replica_count` read replicas and measure aggregate GET throughput of one hot file"""
+    label = f"replicas_{replica_count}"
+    print(f"\n{'#' * 100}\n# {label}: primary + {replica_count} x {args.shard_engine} replicas\n{'#' * 100}")
+    processes, logs = [], []
+
+    def start(name, extra_args=()):
+        node_dir = os.path.join(output_dir, label, name)
+        os.makedirs(node_dir, exist_ok=True)
+        port = free_port()
+        log_file = open(os.path.join(node_dir, "server.log"), 'w')
+        logs.append(log_file)
+        process = start_server(args.shard_engine, port, args.shard_pool_size, log_file, cwd=node_dir,
+                               extra_args=extra_args, memory_budget_mb=args.memory_budget_mb)
+        processes.append(process)
+        wait_ready(process, ('127.0.0.1', port), timeout=args.ready_timeout)
+        return ('127.0.0.1', port)
+
+    try:
+        # Replica dulu supaya primary bisa langsung mereplikasi
+        replicas = [start(f"replica{i}") for i in range(replica_count)]
+        primary = start("primary", ['--replicas', ','.join(node_name(n) for n in replicas)] if replicas else [])
+
+        filename = "hot.bin"
+        if not FileClient(primary).upload_file(test_file, filename):
+            raise RuntimeError("upload to primary failed")
+        lag = wait_replicated(primary, replicas, filename, args.ready_timeout)
+        print(f"  Replicated to {replica_count} replicas in {lag:.2f}s")
+
+        started = time.time()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.shard_clients) as executor:
+            futures = [executor.submit(_replica_client_loop, primary, replicas, filename, args.duration)
+                       for _ in range(args.shard_clients)]
+            outcomes = [f.result() for f in futures]
+        elapsed = time.time() - started
+        completed = sum(c for c, _, _ in outcomes)
+        failed = sum(f for _, f, _ in outcomes)
+        stale = sum(s for _, _, s in outcomes)
+        throughput = completed * os.path.getsize(test_file) / elapsed
+        print(f"  {completed} downloads OK, {failed} failed, {stale} stale replica reads in {elapsed:.1f}s: "
+              f"{throughput / (1024 * 1024):.1f} MB/s aggregate")
+        return dict(configuration=label, replicas=replica_count, engine=args.shard_engine,
+                    clients=args.shard_clients, completed=completed, failed=failed, stale_reads=stale,
+                    replication_s=lag, elapsed=elapsed, throughput=throughput)
+    except Exception as e:
+        logging.error(f"Configuration {label} failed: {e}")
+        return None
+    finally:
+        for process in processes:
+            stop_server(process)
+        for log_file in logs:
+            log_file.close()
+
+
+def run_replica_benchmark(args):
+    """Aggregate throughput of one hot file for each replica count in --replicas"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir = args.output_dir or os.path.join(BASE_DIR, f"benchmark_replicas_{timestamp}")
+    os.makedirs(output_dir, exist_ok=True)
+    test = ComprehensiveStressTest()
+    if not test.create_test_files():
+        raise RuntimeError("failed to create test files")
+    test_file = test.test_files[min(args.volumes)]
+
+    results = []
+    for replica_count in args.replicas:
+        result = run_replica_configuration(replica_count, args, os.path.abspath(test_file), output_dir)
+        if result:
+            results.append(result)
+
+    base = results[0]['throughput'] if results else 0
+    print(f"\n{'replicas':>8} | {'downloads':>9} | {'failed':>6} | {'stale':>5} | {'MB/s':>8} | {'speedup':>7}")
+    for result in results:
+        speedup = result['throughput'] / base if base else 0
+        result['speedup'] = speedup
+        print(f"{result['replicas']:>8} | {result['completed']:>9} | {result['failed']:>6} | "
+              f"{result['stale_reads']:>5} | {result['throughput'] / (1024 * 1024):>8.1f} | {speedup:>6.2f}x")
+    metadata = environment_metadata(replicas=args.replicas, engine=args.shard_engine,
+                                    pool_size=args.shard_pool_size, clients=args.shard_clients,
+                                    volume_mb=min(args.volumes), duration=args.duration)
+    save_results_json(results, os.path.join(output_dir, "results.json"), metadata)
+    print(f"\nServer logs in {output_dir}")
+    return results
+
+
+def _upload_client_loop(address, file_path, duration, index):
+    """One client process of the durability benchmark: upload until `duration` is over; latencies in seconds"""
+    client = FileClient(address)
+    deadline = time.time() + duration
+    latencies, failed = [], 0
+    n = 0
+    while time.time() < deadline:
+        started = time.time()
+        if client.upload_file(file_path, f"durable_{index}_{n % 8}.bin"):
+            latencies.append(time.time() - started)
+        else:
+            failed += 1
+        n += 1
+    return latencies, failed
+
+
+def run_durability_configuration(level, args, test_file, output_dir):
+    """Start one server with --durability `level` and measure upload latency and throughput"""
+    label = f"durability_{level}"
+    print(f"\n{'#' * 100}\n# {label}: {args.shard_engine}, {args.shard_clients} uploading clients\n{'#' * 100}")
+    server_dir = os.path.join(output_dir, label)
+    os.makedirs(server_dir, exist_ok=True)
+    port = free_port()
+    address = ('127.0.0.1', port)
+    log_file = open(os.path.join(server_dir, "server.log"), 'w')
+    process = start_server(args.shard_engine, port, args.shard_pool_size, log_file, cwd=server_dir,
+                           extra_args=['--durability', level, '--group-commit-ms', str(args.group_commit_ms)],
+                           memory_budget_mb=args.memory_budget_mb)
+    try:
+        wait_ready(process, address, timeout=args.ready_timeout)
+        started = time.time()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.shard_clients) as executor:
+            futures = [executor.submit(_upload_client_loop, address, test_file, args.duration, i)
+                       for i in range(args.shard_clients)]
+            outcomes = [f.result() for f in futures]
+        elapsed = time.time() - started
+        latencies = [l for lat, _ in outcomes for l in lat]
+        failed = sum(f for _, f in outcomes)
+        stats = FileClient(address).server_stats() or {}
+        commit = stats.get('gauges', {}).get('durability')
+        throughput = len(latencies) * os.path.getsize(test_file) / elapsed
+        result = dict(configuration=label, durability=level, engine=args.shard_engine, clients=args.shard_clients,
+                      completed=len(latencies), failed=failed, elapsed=elapsed, throughput=throughput,
+                      uploads_per_s=len(latencies) / elapsed,
+                      latency_p50_ms=percentile(latencies, 50) * 1000,
+                      latency_p99_ms=percentile(latencies, 99) * 1000,
+                      group_commit=commit)
+        print(f"  {len(latencies)} uploads OK, {failed} failed in {elapsed:.1f}s: {result['uploads_per_s']:.1f}/s, "
+              f"p50 {result['latency_p50_ms']:.1f} ms, p99 {result['latency_p99_ms']:.1f} ms")
+        if commit and commit.get('batches'):
+            print(f"  Group commit: {commit['files']} files in {commit['batches']} batches "
+                  f"(avg {commit['avg_batch']}, largest {commit['largest_batch']})")
+        return result
+    except Exception as e:
+        logging.error(f"Configuration {label} failed: {e}")
+        return None
+    finally:
+        stop_server(process)
+        log_file.close()
+
+
+def run_durability_benchmark(args):
+    """Upload latency and throughput for each level in --durability, same engine and client load"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir = args.output_dir or os.path.join(BASE_DIR, f"benchmark_durability_{timestamp}")
+    os.makedirs(output_dir, exist_ok=True)
+    # File kecil: biaya fsync paling terasa saat banyak upload kecil bersamaan
+    test_file = os.path.join(output_dir, f"upload_{args.durability_file_kb}KB.bin")
+    with open(test_file, 'wb') as f:
+        f.write(os.urandom(args.durability_file_kb * 1024))
+
+    results = []
+    for level in args.durability:
+        result = run_durability_configuration(level, args, test_file, output_dir)
+        if result:
+            results.append(result)
+
+    print(f"\n{'level':>6} | {'uploads':>7} | {'failed':>6} | {'per s':>7} | {'MB/s':>7} | {'p50 ms':>7} | {'p99 ms':>7}")
+    for result in results:
+        print(f"{result['durability']:>6} | {result['completed']:>7} | {result['failed']:>6} | "
+              f"{result['uploads_per_s']:>7.1f} | {result['throughput'] / (1024 * 1024):>7.2f} | "
+              f"{result['latency_p50_ms']:>7.1f} | {result['latency_p99_ms']:>7.1f}")
+    metadata = environment_metadata(durability=args.durability, engine=args.shard_engine,
+                                    pool_size=args.shard_pool_size, clients=args.shard_clients,
+                                    file_kb=args.durability_file_kb, group_commit_ms=args.group_commit_ms,
+                                    duration=args.duration)
+    save_results_json(results, os.path.join(output_dir, "results.json"), metadata)
+    print(f"\nServer logs in {output_dir}")
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Jalankan setiap engine server untuk setiap pool size lalu jalankan matrix stress test")
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument('--pool-sizes', nargs='+', type=int, default=[1, 5, 50])
+    parser.add_argument('--operations', nargs='+', choices=['upload', 'download'], default=['upload', 'download'])
+    parser.add_argument('--volumes', nargs='+', type=int, choices=[10, 50, 100], default=[10, 50, 100])
+    parser.add_argument('--client-workers', nargs='+', type=int, default=[1, 5, 50])
+    parser.add_argument('--client-models', nargs='+', choices=['thread', 'process', 'async'], default=['thread', 'process'])
+    parser.add_argument('--ready-timeout', type=int, default=30, help="Detik menunggu server siap")
+    parser.add_argument('--memory-budget-mb', type=int,
+                        help="Memory budget transfer untuk setiap server yang dijalankan (default: default server)")
+    parser.add_argument('--output-dir', help="Default: benchmark_<timestamp>")
+    parser.add_argument('--shards', nargs='+', type=int,
+                        help="Benchmark sharding: jalankan N node (satu folder files/ per node) untuk setiap N, "
+                             "ukur throughput GET gabungan lewat consistent-hash ring, contoh --shards 1 2 4")
+    parser.add_argument('--replicas', nargs='+', type=int,
+                        help="Benchmark read replica: primary + N replica untuk setiap N, ukur throughput GET "
+                             "gabungan satu file populer, contoh --replicas 0 1 2")
+    parser.add_argument('--durability', nargs='+', choices=DURABILITY_LEVELS,
+                        help="Benchmark durability: latency dan throughput upload untuk setiap level, "
+                             "contoh --durability none fsync group")
+    parser.add_argument('--durability-file-kb', type=int, default=64,
+                        help="Ukuran file upload di benchmark durability")
+    parser.add_argument('--group-commit-ms', type=float, default=5.0,
+                        help="Jendela group commit server di benchmark durability")
+    parser.add_argument('--shard-engine', choices=list(ENGINES), default='thread_pool',
+                        help="Engine server di benchmark sharding/replica/durability")
+    parser.add_argument('--shard-pool-size', type=int, default=5)
+    parser.add_argument('--shard-clients', type=int, default=8,
+                        help="Jumlah client process di benchmark sharding/replica/durability")
+    parser.add_argument('--shard-files', type=int, default=32, help="Jumlah file yang disebar ke semua node")
+    parser.add_argument('--duration', type=int, default=20,
+                        help="Detik per konfigurasi di benchmark sharding/replica/durability")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print("BENCHMARK ORCHESTRATOR")
+    print(f"Start time: {datetime.now()}")
+    if args.shards:
+        print(f"Sharding: {args.shard_engine} nodes x {args.shards}, {args.shard_clients} clients")
+    elif args.replicas:
+        print(f"Read replicas: {args.shard_engine} primary + {args.replicas} replicas, {args.shard_clients} clients")
+    elif args.durability:
+        print(f"Durability: {args.shard_engine} x {args.durability}, {args.shard_clients} clients, "
+              f"{args.durability_file_kb} KB uploads")
+    else:
+        print(f"Engines: {', '.join(args.engines)}, pool sizes: {args.pool_sizes}")
+    print("=" * 80)
+    try:
+        if args.shards:
+            run_shard_benchmark(args)
+        elif args.replicas:
+            run_replica_benchmark(args)
+        elif args.durability:
+            run_durability_benchmark(args)
+        else:
+            run_benchmark(args)
+    except KeyboardInterrupt:
+        print("\nBenchmark interrupted by user")
+    print(f"\nBenchmark completed at: {datetime.now()}")
+
+
+if __name__ == '__main__':
+    main()
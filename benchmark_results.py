@@ -0,0 +1,271 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_VERSION = 1
+
+# Satu sel matrix diidentifikasi oleh kolom-kolom ini
+CELL_KEYS = ['engine', 'client_model', 'operasi', 'volume', 'jumlah_client_worker', 'jumlah_server_worker']
+# Sel dengan sampel terlalu sedikit untuk Mann-Whitney (misal 1 client) di-gate dengan perubahan median saja;
+# batasnya lebih longgar dari --threshold karena satu sampel membawa seluruh noise run-nya
+SMALL_SAMPLE_THRESHOLD = 0.25
+
+
+def git_revision():
+    """(commit, dirty) of the tree the benchmark ran from, (None, None) outside git"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_DIR,
+                                capture_output=True, text=True, timeout=10).stdout
+        return commit, bool(status.strip()) if commit else None
+    except (OSError, subprocess.SubprocessError):
+        return None, None
+
+
+def environment_metadata(**extra):
+    """Where and how a benchmark ran, stored next to the results"""
+    commit, dirty = git_revision()
+    metadata = dict(
+        timestamp=datetime.now().isoformat(timespec='seconds'),
+        hostname=socket.gethostname(),
+        platform=platform.platform(),
+        python=platform.python_version(),
+        python_implementation=platform.python_implementation(),
+        cpu_count=os.cpu_count(),
+        git_commit=commit,
+        git_dirty=dirty,
+        argv=sys.argv,
+    )
+    metadata.update(extra)
+    return metadata
+
+
+def save_results_json(results, filename, metadata=None):
+    """Write rows (including raw per-request samples) plus environment metadata"""
+    engines = sorted({r.get('engine') for r in results if r.get('engine')})
+    document = dict(version=RESULTS_VERSION,
+                    metadata=metadata or environment_metadata(engines=engines),
+                    results=results)
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=1, default=str)
+    print(f"Results (JSON) saved to {filename}")
+    return filename
+
+
+def load_results_json(filename):
+    with open(filename, encoding='utf-8') as f:
+        document = json.load(f)
+    if document.get('version') != RESULTS_VERSION:
+        raise ValueError(f"{filename}: unsupported results version {document.get('version')}")
+    return document
+
+
+def cell_key(row):
+    return tuple(row.get(k) for k in CELL_KEYS)
+
+
+def _ranks(values):
+    """1-based ranks, ties get the average rank"""
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2.0 + 1
+        i = j + 1
+    return ranks
+
+
+def mann_whitney_p(a, b, exact_limit=20000):
+    """Two-sided Mann-Whitney U p-value.
+
+    Tidak mengasumsikan distribusi normal (latency biasanya long-tailed).
+    Untuk sampel kecil p-value dihitung exact dengan enumerasi, selain itu
+    pakai aproksimasi normal dengan koreksi ties.
+    """
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        return 1.0
+    ranks = _ranks(list(a) + list(b))
+    mu = n1 * n2 / 2.0
+    u1 = sum(ranks[:n1]) - n1 * (n1 + 1) / 2.0
+    observed = abs(u1 - mu)
+
+    if math.comb(n1 + n2, n1) <= exact_limit:
+        offset = n1 * (n1 + 1) / 2.0
+        extreme = total = 0
+        for combo in itertools.combinations(ranks, n1):
+            total += 1
+            if abs(sum(combo) - offset - mu) >= observed - 1e-9:
+                extreme += 1
+        return extreme / total
+
+    n = n1 + n2
+    ties = {}
+    for r in ranks:
+        ties[r] = ties.get(r, 0) + 1
+    tie_term = sum(t ** 3 - t for t in ties.values()) / (n * (n - 1))
+    sigma = math.sqrt(n1 * n2 / 12.0 * ((n + 1) - tie_term))
+    if sigma == 0:
+        return 1.0
+    z = max(observed - 0.5, 0) / sigma
+    return math.erfc(z / math.sqrt(2))
+
+
+def mann_whitney_testable(n1, n2, alpha=0.05):
+    """True if samples of these sizes can reach p < alpha at all.
+
+    p-value terkecil yang mungkin (tanpa ties) adalah 2 / C(n1+n2, n1): dengan
+    1 vs 1 sampel p selalu 1.0, dengan 3 vs 3 minimal 0.1.
+    """
+    return n1 > 0 and n2 > 0 and 2.0 / math.comb(n1 + n2, n1) < alpha
+
+
+def _median(values):
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2.0
+
+
+def _successful(row, field):
+    return [s[field] for s in row.get('samples', []) if s.get('success')]
+
+
+def compare_cell(base, current, alpha=0.05, threshold=0.10, small_sample_threshold=SMALL_SAMPLE_THRESHOLD):
+    """Compare one matrix cell. Returns a list of finding dicts (metric, change, p, test, verdict).
+
+    test 'mann-whitney': perubahan harus signifikan (p < alpha) dan minimal
+    threshold. test 'threshold': sampel terlalu sedikit untuk diuji, perubahan
+    median minimal small_sample_threshold langsung dianggap regresi/perbaikan.
+    """
+    findings = []
+    # (metric, sample field, True kalau nilai lebih besar lebih baik)
+    for metric, field, higher_is_better in [('latency', 'time', False), ('throughput', 'throughput', True)]:
+        a, b = _successful(base, field), _successful(current, field)
+        if not a or not b:
+            continue
+        before, after = _median(a), _median(b)
+        change = (after - before) / before if before else 0.0
+        worse = change < 0 if higher_is_better else change > 0
+        if mann_whitney_testable(len(a), len(b), alpha):
+            test = 'mann-whitney'
+            p = mann_whitney_p(a, b)
+            significant = p < alpha and abs(change) >= threshold
+        else:
+            test = 'threshold'
+            p = None
+            significant = abs(change) >= small_sample_threshold
+        if significant:
+            verdict = 'regression' if worse else 'improvement'
+        else:
+            verdict = 'ok'
+        findings.append(dict(metric=metric, before=before, after=after, change=change, p=p, test=test,
+                             n=(len(a), len(b)), verdict=verdict))
+
+    # Client yang gagal tidak punya sampel latency, jadi dibandingkan terpisah
+    failed_before = base.get('worker_client_gagal', 0)
+    failed_after = current.get('worker_client_gagal', 0)
+    if failed_after != failed_before:
+        findings.append(dict(metric='failures', before=failed_before, after=failed_after,
+                             change=failed_after - failed_before, p=None, n=None,
+                             verdict='regression' if failed_after > failed_before else 'improvement'))
+    return findings
+
+
+def compare_runs(baseline, current, alpha=0.05, threshold=0.10, small_sample_threshold=SMALL_SAMPLE_THRESHOLD):
+    """Diff two result documents cell by cell. Returns (rows, number of regressed cells)
+
+    Throughput per sampel = size / time, jadi latency dan throughput biasanya
+    regresi bersamaan; yang dihitung adalah jumlah sel, bukan jumlah metric.
+    """
+    base_cells = {cell_key(r): r for r in baseline['results']}
+    current_cells = {cell_key(r): r for r in current['results']}
+    rows = []
+    regressions = 0
+    for key, base in base_cells.items():
+        if key not in current_cells:
+            rows.append((key, dict(metric='-', verdict='missing')))
+            continue
+        findings = compare_cell(base, current_cells[key], alpha, threshold, small_sample_threshold)
+        rows.extend((key, finding) for finding in findings)
+        if any(f['verdict'] == 'regression' for f in findings):
+            regressions += 1
+    return rows, regressions
+
+
+def _fmt(value):
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
+
+
+def print_comparison(rows, baseline, current):
+    for label, document in [('baseline', baseline), ('current', current)]:
+        m = document.get('metadata', {})
+        print(f"{label:<9}: {m.get('timestamp')} commit={m.get('git_commit')} dirty={m.get('git_dirty')} "
+              f"cpus={m.get('cpu_count')} python={m.get('python')}")
+    print()
+    headers = ["metric", "before", "after", "change", "p", "n", "verdict"]
+    print(" | ".join(f"{h:<12}" for h in headers) + " | cell (" + ", ".join(CELL_KEYS) + ")")
+    print("-" * 120)
+    for key, f in rows:
+        change = f.get('change')
+        if f.get('metric') in ('latency', 'throughput'):
+            change = f"{change:+.1%}"
+        n = f.get('n')
+        cells = [f.get('metric'), _fmt(f.get('before')), _fmt(f.get('after')), _fmt(change),
+                 _fmt(f.get('p')), f"{n[0]}/{n[1]}" if n else '-', f.get('verdict')]
+        print(" | ".join(f"{c:<12}" for c in cells) + " | " + " ".join(_fmt(k) for k in key))
+
+
+def compare_main(args):
+    baseline = load_results_json(args.baseline)
+    current = load_results_json(args.current)
+    rows, regressions = compare_runs(baseline, current, alpha=args.alpha, threshold=args.threshold,
+                                     small_sample_threshold=args.small_sample_threshold)
+    print_comparison(rows, baseline, current)
+    untested = sum(1 for _, f in rows if f.get('test') == 'threshold')
+    if untested:
+        print(f"\n{untested} finding(s) with too few samples for Mann-Whitney (p '-'): "
+              f"gated on median change >= {args.small_sample_threshold:.0%} instead")
+    if regressions:
+        print(f"\n{regressions} regressed cell(s) (alpha={args.alpha}, min change={args.threshold:.0%})")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Hasil benchmark dalam JSON dan perbandingan dengan baseline")
+    sub = parser.add_subparsers(dest='command', required=True)
+    compare = sub.add_parser('compare', help="Bandingkan dua run, exit code 1 kalau ada regresi")
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--alpha', type=float, default=0.05, help="Batas p-value (Mann-Whitney U)")
+    # Sampel dalam satu sel berasal dari client yang jalan bersamaan pada run yang sama, jadi
+    # noise antar-run tidak terlihat oleh uji statistik; threshold menyaring noise itu
+    compare.add_argument('--threshold', type=float, default=0.10,
+                         help="Perubahan median minimal (relatif) yang dianggap berarti")
+    compare.add_argument('--small-sample-threshold', type=float, default=SMALL_SAMPLE_THRESHOLD,
+                         help="Perubahan median minimal untuk sel yang sampelnya terlalu sedikit untuk "
+                              "Mann-Whitney (misal 1 client); sel itu tetap bisa menggagalkan compare")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    sys.exit(compare_main(args))
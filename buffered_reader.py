@@ -0,0 +1,343 @@
+import asyncio
+import select
+import socket
+import sys
+import threading
+import time
+
+# Request dan response sama-sama diakhiri "\r\n\r\n"
+TERMINATOR = b"\r\n\r\n"
+# Batas waktu client diam di tengah request, dipakai semua engine server
+REQUEST_TIMEOUT = 120
+# Client lama (PROTOKOL.txt) tidak mengirim terminator: command satu baris dianggap lengkap
+# di newline pertama atau di akhir recv yang pendek, kalau tidak ada data lagi selama jeda ini.
+# Terminator yang datang di segment berikutnya tetap terbaca dalam jeda tersebut.
+LEGACY_GRACE = 0.2
+# Body UPLOAD tanpa terminator selesai kalau client diam selama ini setelah kelompok base64 utuh
+UPLOAD_IDLE_END = 2.0
+
+
+class ReadAborted(Exception):
+    """The on_data callback refused more data (e.g. memory budget exhausted)"""
+
+
+class BufferedReader:
+    """Receive buffer for one socket: a growable bytearray filled with recv_into.
+
+    Tidak ada `data += chunk`: byte diterima langsung ke ruang kosong di
+    buffer, yang tumbuh geometris (amortized linear). Pencarian terminator
+    hanya memindai byte yang baru masuk, jadi total kerja linear terhadap
+    ukuran pesan. Pesan dikembalikan sebagai memoryview ke buffer, berlaku
+    sampai read berikutnya pada reader yang sama.
+    """
+
+    def __init__(self, sock, initial_size=65536, recv_size=65536):
+        self.sock = sock
+        self.recv_size = recv_size
+        self.buffer = bytearray(initial_size)
+        self.start = 0  # awal data yang belum dikonsumsi
+        self.end = 0  # akhir data yang sudah diterima
+        self.scanned = 0  # posisi sampai mana terminator sudah dicari
+        self.total_received = 0
+        self.last_recv = 0
+        self.eof = False
+
+    def _reserve(self):
+        """Make room for one recv of recv_size bytes at the end of the buffer"""
+        if len(self.buffer) - self.end >= self.recv_size:
+            return
+        pending = self.end - self.start
+        if self.start and pending + self.recv_size <= len(self.buffer):
+            # Cukup geser data yang belum dikonsumsi ke depan
+            self.buffer[:pending] = self.buffer[self.start:self.end]
+        else:
+            grown = bytearray(max(len(self.buffer) * 2, pending + self.recv_size))
+            with memoryview(self.buffer) as view:
+                grown[:pending] = view[self.start:self.end]
+            self.buffer = grown
+        self.scanned -= self.start
+        self.start = 0
+        self.end = pending
+
+    def _received(self, n):
+        self.end += n
+        self.total_received += n
+        self.last_recv = n
+        if n == 0:
+            self.eof = True
+        return n
+
+    def _recv(self):
+        self._reserve()
+        with memoryview(self.buffer) as view, view[self.end:] as free:
+            n = self.sock.recv_into(free, self.recv_size)
+        return self._received(n)
+
+    def _find(self, terminator):
+        idx = self.buffer.find(terminator, max(self.start, self.scanned - len(terminator) + 1), self.end)
+        self.scanned = self.end
+        return idx
+
+    def _take(self, end, skip=0):
+        message = memoryview(self.buffer)[self.start:end]
+        self.start = self.scanned = end + skip
+        return message
+
+    @property
+    def buffered(self):
+        return self.end - self.start
+
+    def take_pending(self):
+        """Everything received but not consumed yet (e.g. after a timeout), or None"""
+        return self._take(self.end) if self.buffered else None
+
+    def _legacy_end(self):
+        """The buffered bytes could be a whole unterminated command: they hold a newline or came in a short recv"""
+        return self.buffered and (self.buffer.find(b'\n', self.start, self.end) >= 0 or
+                                  self.last_recv < self.recv_size)
+
+    def take_line(self):
+        """First line of the buffered bytes (without line ending); everything buffered is consumed"""
+        end = self.buffer.find(b'\n', self.start, self.end)
+        if end < 0:
+            end = self.end
+        while end > self.start and self.buffer[end - 1] in b'\r\n':
+            end -= 1
+        message = memoryview(self.buffer)[self.start:end]
+        self.start = self.scanned = self.end
+        return message
+
+    def _check(self, n, on_data):
+        if n and on_data is not None and on_data(n) is False:
+            raise ReadAborted(f"aborted after {self.total_received} bytes")
+
+    def read_until(self, terminator=TERMINATOR, on_data=None):
+        """Message up to (without) the terminator; at EOF whatever arrived, or None if nothing.
+
+        on_data(n) dipanggil untuk setiap recv; return False membatalkan pembacaan (ReadAborted).
+        socket.timeout diteruskan ke pemanggil, data parsial tetap bisa diambil dengan take_pending().
+        """
+        while True:
+            idx = self._find(terminator)
+            if idx >= 0:
+                return self._take(idx, len(terminator))
+            n = self._recv()
+            if n == 0:
+                return self.take_pending()
+            self._check(n, on_data)
+
+    def read_command(self, on_data=None, grace=LEGACY_GRACE):
+        """Request up to the terminator; from a client without terminator, its first line (see LEGACY_GRACE)"""
+        while True:
+            idx = self._find(TERMINATOR)
+            if idx >= 0:
+                return self._take(idx, len(TERMINATOR))
+            if self.eof:
+                return self.take_pending()
+            if self._legacy_end():
+                if not self.wait_data(grace, on_data):
+                    return self.take_line()
+            else:
+                self._check(self._recv(), on_data)
+
+    def wait_data(self, timeout, on_data=None):
+        """Receive once if data (or EOF) arrives within `timeout` seconds; False if the peer stayed silent"""
+        if self.eof:
+            return True
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        if not readable:
+            return False
+        self._check(self._recv(), on_data)
+        return True
+
+    def finish_terminator(self, tail, on_data=None):
+        """Consume the rest of a terminator whose start (`tail`) ended a streamed body.
+
+        Response dikirim setelah terminator habis terbaca: socket yang ditutup
+        dengan data belum terbaca mengirim RST, yang bisa menghapus response
+        sebelum dibaca client.
+        """
+        tail = bytes(tail[:len(TERMINATOR)])
+        while len(tail) < len(TERMINATOR) and TERMINATOR.startswith(tail):
+            if not self.buffered and not self.wait_data(LEGACY_GRACE, on_data):
+                return
+            chunk = self.read_some(on_data)
+            if chunk is None:
+                return
+            with chunk:
+                tail += chunk[:len(TERMINATOR) - len(tail)].tobytes()
+
+    def peek(self):
+        """View of the buffered, unconsumed bytes (not consumed); release it before the next read"""
+        return memoryview(self.buffer)[self.start:self.end]
+
+    def fill(self, on_data=None):
+        """Receive once more into the buffer; returns the number of bytes (0 at EOF)"""
+        n = self._recv()
+        self._check(n, on_data)
+        return n
+
+    def read_some(self, on_data=None):
+        """Whatever is buffered (receiving once if nothing is), None at EOF; for streaming bodies"""
+        if not self.buffered:
+            n = self._recv()
+            if n == 0:
+                return None
+            self._check(n, on_data)
+        return self._take(self.end)
+
+    def read_exact(self, size, on_data=None):
+        """Exactly `size` bytes (length-prefixed body); ConnectionError if the peer closes first"""
+        while self.buffered < size:
+            n = self._recv()
+            if n == 0:
+                raise ConnectionError(f"connection closed after {self.buffered} of {size} bytes")
+            self._check(n, on_data)
+        return self._take(self.start + size)
+
+
+class AsyncBufferedReader(BufferedReader):
+    """Same buffer over a non-blocking socket, filled with loop.sock_recv_into"""
+
+    def __init__(self, sock, loop, **kwargs):
+        super().__init__(sock, **kwargs)
+        self.loop = loop
+
+    async def _recv_async(self):
+        self._reserve()
+        with memoryview(self.buffer) as view, view[self.end:] as free:
+            n = await self.loop.sock_recv_into(self.sock, free)
+        return self._received(n)
+
+    async def read_until(self, terminator=TERMINATOR, on_data=None):
+        while True:
+            idx = self._find(terminator)
+            if idx >= 0:
+                return self._take(idx, len(terminator))
+            n = await self._recv_async()
+            if n == 0:
+                return self.take_pending()
+            self._check(n, on_data)
+
+    async def read_command(self, on_data=None, grace=LEGACY_GRACE):
+        while True:
+            idx = self._find(TERMINATOR)
+            if idx >= 0:
+                return self._take(idx, len(TERMINATOR))
+            if self.eof:
+                return self.take_pending()
+            if self._legacy_end():
+                if not await self.wait_data(grace, on_data):
+                    return self.take_line()
+            else:
+                self._check(await self._recv_async(), on_data)
+
+    async def wait_data(self, timeout, on_data=None):
+        if self.eof:
+            return True
+        try:
+            # sock_recv_into yang dibatalkan belum mengambil byte apa pun dari socket
+            n = await asyncio.wait_for(self._recv_async(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._check(n, on_data)
+        return True
+
+    async def finish_terminator(self, tail, on_data=None):
+        tail = bytes(tail[:len(TERMINATOR)])
+        while len(tail) < len(TERMINATOR) and TERMINATOR.startswith(tail):
+            if not self.buffered and not await self.wait_data(LEGACY_GRACE, on_data):
+                return
+            chunk = await self.read_some(on_data)
+            if chunk is None:
+                return
+            with chunk:
+                tail += chunk[:len(TERMINATOR) - len(tail)].tobytes()
+
+    async def fill(self, on_data=None):
+        n = await self._recv_async()
+        self._check(n, on_data)
+        return n
+
+    async def read_some(self, on_data=None):
+        if not self.buffered:
+            n = await self._recv_async()
+            if n == 0:
+                return None
+            self._check(n, on_data)
+        return self._take(self.end)
+
+    async def read_exact(self, size, on_data=None):
+        while self.buffered < size:
+            n = await self._recv_async()
+            if n == 0:
+                raise ConnectionError(f"connection closed after {self.buffered} of {size} bytes")
+            self._check(n, on_data)
+        return self._take(self.start + size)
+
+
+def read_request(sock, on_data=None, reader=None):
+    """Server side: one request as (str, bytes received), (None, 0) if the client sent nothing.
+
+    Request diakhiri terminator atau EOF; command satu baris dari client lama
+    tanpa terminator langsung dilayani (read_command). Yang masih tersisa
+    setelah timeout socket tetap dilayani, kecuali UPLOAD: upload yang
+    terpotong ditolak daripada disimpan sebagian.
+    """
+    reader = reader or BufferedReader(sock)
+    try:
+        message = reader.read_command(on_data)
+    except socket.timeout:
+        message = reader.take_pending()
+        if message is None or message[:9].tobytes().upper().startswith((b'UPLOAD', b'REPLICATE')):
+            raise
+    if message is None:
+        return None, 0
+    with message:
+        return str(message, 'utf-8'), reader.total_received
+
+
+def _concat_receive(sock):
+    """The old receive loop, kept only as the microbenchmark baseline"""
+    data = b""
+    while True:
+        chunk = sock.recv(32768)
+        if not chunk:
+            return data
+        data += chunk
+        if TERMINATOR in data:
+            return data
+
+
+def _reader_receive(sock):
+    with BufferedReader(sock).read_until() as message:
+        return len(message)
+
+
+def benchmark(sizes_mb=(1, 2, 4, 8, 16, 32), legacy_limit_mb=16):
+    """Receive one message of each size over a socketpair; time per MB should stay flat"""
+    print(f"{'size_mb':>8} | {'concat_s':>9} | {'concat_ms/MB':>12} | {'reader_s':>9} | {'reader_ms/MB':>12}")
+    for size_mb in sizes_mb:
+        payload = b"A" * (size_mb * 1024 * 1024) + TERMINATOR
+        row = [f"{size_mb:>8}"]
+        for name, receive in [('concat', _concat_receive), ('reader', _reader_receive)]:
+            if name == 'concat' and size_mb > legacy_limit_mb:
+                row += [f"{'-':>9}", f"{'-':>12}"]
+                continue
+            a, b = socket.socketpair()
+            sender = threading.Thread(target=a.sendall, args=(payload,))
+            started = time.perf_counter()
+            sender.start()
+            receive(b)
+            elapsed = time.perf_counter() - started
+            sender.join()
+            a.close()
+            b.close()
+            row += [f"{elapsed:>9.3f}", f"{elapsed * 1000 / size_mb:>12.2f}"]
+        print(" | ".join(row))
+
+
+if __name__ == '__main__':
+    # python buffered_reader.py [ukuran MB ...]
+    sizes = [int(s) for s in sys.argv[1:]] or [1, 2, 4, 8, 16, 32, 64, 128]
+    benchmark(sizes)
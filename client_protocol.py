@@ -0,0 +1,227 @@
+import base64
+import json
+import os
+import uuid
+
+from base64_stream import BLOCK_SIZE, Base64StreamDecoder, iter_base64_file
+from buffered_reader import TERMINATOR
+
+# Kode encode/decode protokol yang dipakai bersama oleh file_client_cli (blocking)
+# dan async_client (asyncio)
+
+
+
+def encode_list():
+    return b"LIST"
+
+
+def encode_get(filename):
+    return f"GET {filename}".encode('utf-8')
+
+
+def encode_delete(filename):
+    return f"DELETE {filename}".encode('utf-8')
+
+
+def encode_copy(source, target):
+    return f"COPY {source} {target}".encode('utf-8')
+
+
+def encode_move(source, target):
+    return f"MOVE {source} {target}".encode('utf-8')
+
+
+def encode_stat(filename):
+    return f"STAT {filename}".encode('utf-8')
+
+
+def encode_stats():
+    return b"STATS"
+
+
+def encode_upload(filename, content):
+    """Full UPLOAD request for content already in memory"""
+    return f"UPLOAD {filename} ".encode('utf-8') + base64.b64encode(content)
+
+
+def upload_header(filename):
+    return f"UPLOAD {filename} ".encode('utf-8')
+
+
+def iter_upload_body(fileobj, block_size=BLOCK_SIZE):
+    """Base64 body of an upload, produced block by block from an open binary file"""
+    return iter_base64_file(fileobj, block_size)
+
+
+def decode_response(data):
+    """Response body (bytes or memoryview from BufferedReader, without terminator) -> dict.
+
+    Error protokol menjadi status ERROR.
+    """
+    try:
+        text = str(data, 'utf-8')
+        if not text.strip():
+            return {'status': 'ERROR', 'message': 'Empty response'}
+        return json.loads(text)
+    except ValueError as e:
+        return {'status': 'ERROR', 'message': f'Invalid response format: {e}'}
+
+
+def busy_delay(result, default_ms=1000):
+    """Seconds to wait before retrying when the server answered BUSY, else None"""
+    if result.get('status') != 'BUSY':
+        return None
+    return result.get('retry_after_ms', default_ms) / 1000.0
+
+
+def decode_file(result):
+    """(filename, bytes) of a successful GET response"""
+    return result['data_namafile'], base64.b64decode(result['data_file'])
+
+
+# Body GET di response: {"status": "OK", "data_namafile": "...", "data_file": "<base64>"}.
+# Base64 tidak pernah berisi '"', jadi akhir body adalah tanda kutip pertama setelah marker.
+DATA_FILE_MARKER = b'"data_file": "'
+
+
+def download_header(head, eof):
+    """(result, complete) from a GET response read up to DATA_FILE_MARKER.
+
+    complete=True berarti marker tidak ada (ERROR/BUSY): head berisi seluruh
+    response dan tidak ada body yang perlu dibaca.
+    """
+    with head:
+        if eof:
+            end = head.tobytes().find(TERMINATOR)
+            return decode_response(head[:end] if end >= 0 else head), True
+        # Lengkapi header menjadi JSON valid untuk membaca field selain data_file
+        return decode_response(head.tobytes() + DATA_FILE_MARKER + b'"}'), False
+
+
+class DownloadWriter:
+    """Decodes the base64 body of a GET response piece by piece into dest_path.
+
+    Body ditulis ke file sementara di folder tujuan dan di-rename setelah
+    lengkap; dest_path None berarti body hanya didecode (divalidasi) lalu
+    dibuang. Tidak melakukan I/O socket sendiri, jadi dipakai bersama oleh
+    receive_download (blocking) dan receive_download_async (asyncio).
+    """
+
+    def __init__(self, dest_path=None):
+        self.dest_path = dest_path
+        self.decoder = Base64StreamDecoder()
+        # Sisa JSON setelah tanda kutip penutup data_file, None selama body belum selesai
+        self.tail = None
+        self.temp_path = None
+        self.fp = None
+        if dest_path:
+            # File sementara di folder yang sama supaya rename-nya atomic; permission mengikuti umask
+            directory = os.path.dirname(os.path.abspath(dest_path))
+            self.temp_path = os.path.join(directory,
+                                          f".{os.path.basename(dest_path)}.{uuid.uuid4().hex[:8]}.part")
+            self.fp = open(self.temp_path, 'xb')
+
+    @property
+    def decoded(self):
+        return self.decoder.decoded
+
+    def feed(self, chunk):
+        """Consume one chunk from the reader; returns True once the body is complete"""
+        with chunk:
+            data = chunk.tobytes()
+        # Base64 tidak pernah berisi '"', jadi akhir body adalah tanda kutip pertama
+        quote = data.find(b'"')
+        if quote >= 0:
+            data, self.tail = data[:quote], data[quote + 1:]
+        block = self.decoder.feed(data)
+        if self.fp:
+            self.fp.write(block)
+        return self.tail is not None
+
+    def needs_rest(self):
+        """True if the terminator after the body has not been read yet"""
+        return TERMINATOR not in self.tail
+
+    def complete(self, result, rest=None):
+        """Finish the file and merge the JSON after the body into result"""
+        self.decoder.finish()
+        tail = self.tail
+        end = tail.find(TERMINATOR)
+        if end >= 0:
+            tail = tail[:end]
+        elif rest is not None:
+            with rest:
+                tail += rest.tobytes()
+        result.update(decode_response(b'{"data_file": ""' + tail))
+        result.pop('data_file', None)
+        if self.fp:
+            self.fp.close()
+            os.replace(self.temp_path, self.dest_path)
+            result['path'] = self.dest_path
+        result['size'] = self.decoded
+        return result
+
+    def abort(self):
+        if self.fp:
+            self.fp.close()
+            try:
+                os.remove(self.temp_path)
+            except OSError:
+                pass
+
+
+def receive_download(reader, dest_path, progress=None):
+    """Stream a GET response from `reader` into dest_path; returns the response dict without data_file.
+
+    Header JSON di-parse dulu, lalu body base64 didecode per potongan ke file
+    sementara di folder tujuan dan di-rename setelah lengkap. Memory client
+    sebesar satu potongan recv, bukan seluruh file. Response selain OK (ERROR,
+    BUSY) dikembalikan apa adanya tanpa menyentuh dest_path.
+    progress(bytes_written) dipanggil setiap potongan.
+    """
+    head = reader.read_until(DATA_FILE_MARKER)
+    if head is None:
+        return {'status': 'ERROR', 'message': 'No response received'}
+    result, complete = download_header(head, reader.eof)
+    if complete:
+        return result
+    writer = DownloadWriter(dest_path)
+    try:
+        done = False
+        while not done:
+            chunk = reader.read_some()
+            if chunk is None:
+                raise ConnectionError(f"connection closed after {writer.decoded} bytes of file data")
+            done = writer.feed(chunk)
+            if progress:
+                progress(writer.decoded)
+        rest = reader.read_until() if writer.needs_rest() else None
+        return writer.complete(result, rest)
+    except BaseException:
+        writer.abort()
+        raise
+
+
+async def receive_download_async(reader, dest_path=None, progress=None):
+    """receive_download over an AsyncBufferedReader; dest_path None decodes and discards the body"""
+    head = await reader.read_until(DATA_FILE_MARKER)
+    if head is None:
+        return {'status': 'ERROR', 'message': 'No response received'}
+    result, complete = download_header(head, reader.eof)
+    if complete:
+        return result
+    writer = DownloadWriter(dest_path)
+    try:
+        done = False
+        while not done:
+            chunk = await reader.read_some()
+            if chunk is None:
+                raise ConnectionError(f"connection closed after {writer.decoded} bytes of file data")
+            done = writer.feed(chunk)
+            if progress:
+                progress(writer.decoded)
+        rest = await reader.read_until() if writer.needs_rest() else None
+        return writer.complete(result, rest)
+    except BaseException:
+        writer.abort()
+        raise
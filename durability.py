@@ -0,0 +1,300 @@
+import json
+import logging
+import multiprocessing as mp
+import os
+import threading
+import time
+
+# none: tanpa fsync (cepat, upload yang sudah OK bisa hilang kalau mesin mati)
+# fsync: fsync file + folder per upload sebelum OK
+# group: fsync beberapa upload yang selesai berdekatan sekaligus, OK setelah batch-nya di-flush
+DURABILITY_LEVELS = ('none', 'fsync', 'group')
+# Upload yang selesai dalam jendela ini ikut batch yang sama
+GROUP_COMMIT_WINDOW = 0.005
+MAX_BATCH = 64
+# Ukuran shared memory untuk status GroupCommit supervisor yang dibaca worker (GroupCommitFeed)
+FEED_STATUS_SIZE = 1024
+
+
+def fsync_path(path):
+    """fsync a file another process (or an already closed fp) has written"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_dir(path):
+    """Make a rename in `path` durable; folder tidak bisa di-fsync di Windows, dilewati"""
+    if os.name == 'nt':
+        return
+    fd = os.open(path or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class NoSync:
+    """Durability 'none': rename the finished upload into place, the OS writes it back later.
+
+    begin()/end() menandai upload yang sedang berjalan; commit() memindahkan
+    file sementara yang sudah lengkap ke nama tujuan. Semua level dipakai
+    bersama oleh thread-thread satu process.
+    """
+    level = 'none'
+
+    def begin(self):
+        pass
+
+    def end(self):
+        pass
+
+    def commit(self, fp, temp_path, final_path):
+        fp.close()
+        os.replace(temp_path, final_path)
+
+    def move(self, source_path, final_path):
+        """Rename an existing file (MOVE); atomic, replaces final_path if it exists"""
+        os.replace(source_path, final_path)
+
+    def stop(self):
+        pass
+
+    def status(self):
+        return dict(level=self.level)
+
+
+class FsyncEach(NoSync):
+    """Durability 'fsync': data file di-fsync sebelum rename, lalu folder-nya, untuk setiap upload"""
+    level = 'fsync'
+
+    def commit(self, fp, temp_path, final_path):
+        fp.flush()
+        os.fsync(fp.fileno())
+        fp.close()
+        os.replace(temp_path, final_path)
+        fsync_dir(os.path.dirname(final_path))
+
+    def move(self, source_path, final_path):
+        os.replace(source_path, final_path)
+        fsync_dir(os.path.dirname(final_path))
+
+
+class _Commit:
+    def __init__(self, fp, temp_path, final_path, callback=None):
+        # fp None: file sudah ditutup oleh process lain, di-fsync lewat path-nya
+        self.fp = fp
+        self.temp_path = temp_path
+        self.final_path = final_path
+        self.callback = callback
+        self.done = False
+        self.error = None
+
+
+class GroupCommit(NoSync):
+    """Durability 'group': one thread fsyncs batches of finished uploads and their folders.
+
+    commit() menunggu sampai batch-nya selesai, jadi client tetap baru
+    menerima OK setelah datanya di disk. Batch ditutup setelah `window` detik,
+    atau lebih cepat kalau semua upload yang sedang berjalan di process ini
+    sudah ikut antri (tidak ada yang perlu ditunggu lagi). Urutannya sama
+    dengan fsync per upload: data, rename, lalu satu fsync per folder.
+    """
+    level = 'group'
+    # Rename tidak membawa data baru, cukup fsync folder seperti level fsync
+    move = FsyncEach.move
+
+    def __init__(self, window=GROUP_COMMIT_WINDOW, max_batch=MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.files = 0
+        self.largest_batch = 0
+        self._queue = []
+        self._open = 0  # upload yang sudah begin() tapi belum commit/end
+        self._running = True
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def begin(self):
+        with self._cond:
+            self._open += 1
+
+    def end(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify_all()
+
+    def commit(self, fp, temp_path, final_path):
+        self.end()
+        fp.flush()
+        entry = _Commit(fp, temp_path, final_path)
+        with self._cond:
+            queued = self._running
+            if queued:
+                self._queue.append(entry)
+                self._cond.notify_all()
+                while not entry.done:
+                    self._cond.wait()
+        if not queued:
+            # Sudah stop(): tidak ada thread yang mem-flush antrian, commit langsung seperti level fsync
+            FsyncEach.commit(self, fp, temp_path, final_path)
+            return
+        if entry.error:
+            raise entry.error
+
+    def submit(self, temp_path, final_path, callback):
+        """commit() for a file written and closed by another process, without waiting.
+
+        callback(error) dipanggil dari thread group commit setelah batch-nya
+        di disk (error None kalau berhasil). Dipakai supervisor process pool,
+        yang tidak boleh diblok selama batch dikumpulkan.
+        """
+        self.end()
+        entry = _Commit(None, temp_path, final_path, callback)
+        with self._cond:
+            queued = self._running
+            if queued:
+                self._queue.append(entry)
+                self._cond.notify_all()
+        if queued:
+            return
+        try:
+            fsync_path(temp_path)
+            os.replace(temp_path, final_path)
+            fsync_dir(os.path.dirname(final_path))
+        except OSError as e:
+            callback(e)
+            return
+        callback(None)
+
+    def stop(self, timeout=10.0):
+        """Flush what is queued; commit() after this fsyncs inline instead of queueing"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def status(self):
+        with self._cond:
+            return dict(level=self.level, window_ms=self.window * 1000, batches=self.batches, files=self.files,
+                        avg_batch=round(self.files / self.batches, 2) if self.batches else 0.0,
+                        largest_batch=self.largest_batch)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                deadline = time.monotonic() + self.window
+                while self._open > 0 and len(self._queue) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            self._flush(batch)
+            with self._cond:
+                self.batches += 1
+                self.files += len(batch)
+                self.largest_batch = max(self.largest_batch, len(batch))
+                for entry in batch:
+                    entry.done = True
+                self._cond.notify_all()
+            for entry in batch:
+                if entry.callback:
+                    entry.callback(entry.error)
+
+    def _flush(self, batch):
+        for entry in batch:
+            try:
+                if entry.fp is None:
+                    fsync_path(entry.temp_path)
+                else:
+                    os.fsync(entry.fp.fileno())
+            except OSError as e:
+                entry.error = e
+            finally:
+                if entry.fp is not None:
+                    entry.fp.close()
+        folders = {}
+        for entry in batch:
+            if entry.error:
+                continue
+            try:
+                os.replace(entry.temp_path, entry.final_path)
+                folders.setdefault(os.path.dirname(entry.final_path), []).append(entry)
+            except OSError as e:
+                entry.error = e
+        for folder, entries in folders.items():
+            try:
+                fsync_dir(folder)
+            except OSError as e:
+                logging.error(f"fsync of folder {folder!r} failed: {e}")
+                for entry in entries:
+                    entry.error = e
+
+
+class GroupCommitFeed(NoSync):
+    """GroupCommit stand-in for worker processes; the batches are flushed by the supervisor.
+
+    Worker process pool melayani satu koneksi sekaligus, jadi GroupCommit per
+    worker tidak pernah berisi lebih dari satu upload. Worker cukup menutup
+    file sementaranya dan mengirim path-nya lewat pipe control, satu
+    GroupCommit di supervisor mengumpulkan upload dari semua worker ke batch
+    yang sama dan membalas setelah batch-nya di disk. Status untuk STATS
+    ditulis supervisor ke shared memory.
+    """
+    level = 'group'
+    move = FsyncEach.move
+
+    def __init__(self, status_size=FEED_STATUS_SIZE):
+        self._status = mp.Array('c', status_size)
+        self._control = None
+
+    def connect(self, control):
+        """Worker side: send commits over this worker's control pipe"""
+        self._control = control
+
+    def begin(self):
+        self._control.send(('durability', 'begin'))
+
+    def end(self):
+        self._control.send(('durability', 'end'))
+
+    def commit(self, fp, temp_path, final_path):
+        # Data tetap di page cache sampai supervisor mem-fsync file-nya lewat path
+        fp.close()
+        self._control.send(('durability', 'commit', temp_path, final_path))
+        try:
+            _, error = self._control.recv()
+        except EOFError:
+            raise OSError(f"supervisor exited before {final_path} was committed")
+        if error:
+            raise OSError(error)
+
+    def publish(self, status):
+        """Supervisor side: make the GroupCommit status visible to the workers"""
+        data = json.dumps(status).encode('utf-8')
+        if len(data) >= len(self._status):
+            data = json.dumps({'level': self.level, 'error': 'status too large'}).encode('utf-8')
+        self._status.value = data
+
+    def status(self):
+        return json.loads(self._status.value or b'{}') or dict(level=self.level)
+
+
+def make_durability(level='none', window=GROUP_COMMIT_WINDOW):
+    """Durability policy for one server process, by name (see DURABILITY_LEVELS)"""
+    if level == 'fsync':
+        return FsyncEach()
+    if level == 'group':
+        return GroupCommit(window)
+    if level == 'none':
+        return NoSync()
+    raise ValueError(f"unknown durability level {level!r}, expected one of {', '.join(DURABILITY_LEVELS)}")
@@ -1,20 +1,45 @@
+import argparse
 import socket
-import json
-import base64
 import logging
 import os
+import tempfile
 import time
+import zlib
+
+from buffered_reader import BufferedReader, TERMINATOR
+from client_protocol import (encode_list, encode_get, encode_upload, encode_delete, encode_stat, encode_copy,
+                             encode_move, upload_header, iter_upload_body, decode_response, busy_delay,
+                             decode_file, receive_download)
+from replication import LeastOutstanding
+from shard_ring import HashRing, node_name, parse_nodes, plan_rebalance
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 server_address = ('localhost', 6666)
+# Mode sharding: beberapa server node, file dirutekan ke pemiliknya di hash ring (None = satu server)
+ring = None
+# Mode read replica: GET disebar ke primary (server_address) dan replica-nya (None = tanpa replica)
+balancer = None
+
+def address_for(filename):
+    """Server that owns `filename`: its node on the hash ring, or the single server_address"""
+    return ring.node_for(filename) if ring else server_address
+
+def send_command(command_str="", download_to=None, progress=None, address=None, upload_from=None):
+    """Send one request; with download_to the GET body is streamed into that file.
 
-def send_command(command_str=""):
-    global server_address
+    address: node tujuan (default server_address). upload_from: path file yang
+    body base64-nya di-stream setelah command_str ('UPLOAD <nama> '), dibaca
+    ulang di setiap retry.
+    """
+    address = address or server_address
     max_retries = 3
+    max_busy_retries = 10
+    busy_retries = 0
+    attempt = 0
     
-    for attempt in range(max_retries):
+    while attempt < max_retries:
         sock = None
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -24,59 +49,62 @@ def send_command(command_str=""):
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
             sock.settimeout(120)  # 2 menit timeout
             
-            sock.connect(server_address)
-            logging.info(f"Connected to {server_address} (attempt {attempt + 1})")
+            sock.connect(address)
+            logging.info(f"Connected to {address} (attempt {attempt + 1})")
             
             # Send command
-            command_bytes = command_str.encode('utf-8')
+            command_bytes = command_str.encode('utf-8') if isinstance(command_str, str) else command_str
             total_sent = 0
             chunk_size = 32768
             
-            # Send in chunks untuk command besar
-            for i in range(0, len(command_bytes), chunk_size):
-                chunk = command_bytes[i:i + chunk_size]
-                sock.sendall(chunk)
-                total_sent += len(chunk)
-                
-                # Progress untuk upload besar
-                if total_sent % (1024 * 1024) == 0:
-                    logging.info(f"Sent {total_sent // (1024*1024)}MB")
-            
-            logging.info(f"Command sent successfully ({total_sent} bytes)")
+            # Send in chunks untuk command besar (memoryview: potongan tanpa copy)
+            try:
+                with memoryview(command_bytes) as view:
+                    for i in range(0, len(view), chunk_size):
+                        chunk = view[i:i + chunk_size]
+                        sock.sendall(chunk)
+                        total_sent += len(chunk)
+                        
+                        # Progress untuk upload besar
+                        if total_sent % (1024 * 1024) == 0:
+                            logging.info(f"Sent {total_sent // (1024*1024)}MB")
+                if upload_from:
+                    with open(upload_from, 'rb') as fp:
+                        for piece in iter_upload_body(fp):
+                            sock.sendall(piece)
+                            total_sent += len(piece)
+                sock.sendall(TERMINATOR)
+                logging.info(f"Command sent successfully ({total_sent} bytes)")
+            except (BrokenPipeError, ConnectionResetError):
+                # Server bisa membalas BUSY lalu menutup koneksi sebelum upload selesai
+                logging.warning(f"Server closed connection after {total_sent} bytes, reading reply")
             
-            # Receive response
-            data_received = b""
-            while True:
+            # Receive response ke buffer yang tumbuh, terminator hanya dicari di byte baru
+            reader = BufferedReader(sock)
+            if download_to:
+                # Body langsung ke file, memory tetap kecil; timeout di tengah body di-retry
+                hasil = receive_download(reader, download_to, progress)
+            else:
                 try:
-                    chunk = sock.recv(32768)
-                    if chunk:
-                        data_received += chunk
-                        # Check for protocol terminator
-                        if b"\r\n\r\n" in data_received:
-                            break
-                    else:
-                        break
+                    message = reader.read_until()
                 except socket.timeout:
                     logging.warning("Timeout receiving response")
-                    break
-            
-            # Process response
-            if data_received:
-                response_str = data_received.decode('utf-8', errors='ignore')
-                response_str = response_str.replace("\r\n\r\n", "")
+                    message = reader.take_pending()
                 
-                if response_str.strip():
-                    try:
-                        hasil = json.loads(response_str)
-                        logging.info("Response received successfully")
-                        return hasil
-                    except json.JSONDecodeError as e:
-                        logging.error(f"JSON decode error: {e}")
-                        return {'status': 'ERROR', 'message': f'Invalid response format: {e}'}
-                else:
-                    return {'status': 'ERROR', 'message': 'Empty response'}
-            else:
-                return {'status': 'ERROR', 'message': 'No response received'}
+                # Process response
+                if message is None:
+                    return {'status': 'ERROR', 'message': 'No response received'}
+                hasil = decode_response(message)
+                message.release()
+            retry_after = busy_delay(hasil)
+            if retry_after is not None and busy_retries < max_busy_retries:
+                # Server sibuk: retry setelah waktu yang disarankan server
+                busy_retries += 1
+                logging.warning(f"Server busy, retrying after {retry_after * 1000:.0f} ms")
+                time.sleep(retry_after)
+                continue
+            logging.info(f"Response received (status {hasil.get('status')})")
+            return hasil
             
         except socket.timeout:
             logging.warning(f"Timeout on attempt {attempt + 1}")
@@ -97,13 +125,35 @@ def send_command(command_str=""):
                 except:
                     pass
         
+        attempt += 1
         time.sleep(1)  # Wait before retry
     
     return {'status': 'ERROR', 'message': 'Max retries exceeded'}
 
+def list_nodes(nodes):
+    """LIST on every node: ({node: [files]}, {node: error message}) for the nodes that failed"""
+    files, errors = {}, {}
+    for node in nodes:
+        hasil = send_command(encode_list(), address=node)
+        if hasil and hasil.get('status') == 'OK':
+            files[node] = hasil['data']
+        else:
+            errors[node] = hasil.get('message', 'Unknown error') if hasil else 'Connection failed'
+    return files, errors
+
 def remote_list():
-    command_str = "LIST"
-    hasil = send_command(command_str)
+    if ring:
+        # Sharding: LIST ke semua node lalu digabung
+        files, errors = list_nodes(ring.nodes)
+        for node, error_msg in errors.items():
+            print(f"Node {node_name(node)} tidak bisa di-LIST: {error_msg}")
+        if not files:
+            return False
+        print(f"\nDaftar file di {len(files)}/{len(ring)} node:")
+        for nmfile in sorted(set(name for names in files.values() for name in names)):
+            print(f"- {nmfile}")
+        return True
+    hasil = send_command(encode_list())
     if hasil and hasil.get('status') == 'OK':
         print("\nDaftar file di server:")
         for nmfile in hasil['data']:
@@ -114,13 +164,59 @@ def remote_list():
         print(f"Gagal mendapatkan daftar file: {error_msg}")
         return False
 
-def remote_get(filename=""):
-    command_str = f"GET {filename}"
-    hasil = send_command(command_str)
+def download_progress():
+    """Progress callback for streaming downloads: MB received and rate on one line"""
+    started = time.time()
+    last = [0.0]
+    
+    def show(nbytes):
+        now = time.time()
+        if now - last[0] < 0.2:
+            return
+        last[0] = now
+        rate = nbytes / (now - started) / (1024 * 1024) if now > started else 0
+        print(f"\r  {nbytes / (1024 * 1024):.1f} MB diterima ({rate:.1f} MB/s)", end='', flush=True)
+    
+    return show
+
+def replica_get(filename, download_to):
+    """GET from the least busy of primary and replicas; re-read from the primary if the replica is stale.
+
+    Versi file di primary diambil dulu dengan STAT; replica yang belum
+    menerima versi itu (replikasi masih tertinggal) tidak dipakai.
+    """
+    stat = send_command(encode_stat(filename))
+    if stat.get('status') != 'OK':
+        return stat
+    with balancer.use() as node:
+        hasil = send_command(encode_get(filename), download_to=download_to, progress=download_progress(),
+                             address=node)
+    if node == server_address or (hasil.get('status') == 'OK' and hasil.get('version') == stat['version']):
+        return hasil
+    print(f"\nReplica {node_name(node)} belum punya versi terbaru, download ulang dari primary")
+    return send_command(encode_get(filename), download_to=download_to, progress=download_progress())
+
+def remote_get(filename="", stream=True):
+    """Download a file; stream=True writes the body to disk as it arrives (bounded memory)"""
+    if stream:
+        safe_filename = os.path.basename(filename)
+        if balancer and not ring:
+            hasil = replica_get(filename, safe_filename)
+        else:
+            hasil = send_command(encode_get(filename), download_to=safe_filename, progress=download_progress(),
+                                 address=address_for(filename))
+        print()
+        if hasil and hasil.get('status') == 'OK':
+            print(f"File {safe_filename} berhasil didownload ({hasil['size']} bytes)")
+            return True
+        error_msg = hasil.get('message', 'Unknown error') if hasil else 'Connection failed'
+        print(f"Gagal download file {filename}: {error_msg}")
+        return False
+    
+    hasil = send_command(encode_get(filename), address=address_for(filename))
     if hasil and hasil.get('status') == 'OK':
         try:
-            namafile = hasil['data_namafile']
-            isifile = base64.b64decode(hasil['data_file'])
+            namafile, isifile = decode_file(hasil)
             
             safe_filename = os.path.basename(namafile)
             with open(safe_filename, 'wb') as fp:
@@ -153,16 +249,20 @@ def remote_upload(filename=""):
         print(f"Uploading file {filename} ({file_size} bytes)...")
         
         # Read and encode file
-        with open(filename, 'rb') as fp:
-            file_content = base64.b64encode(fp.read()).decode('utf-8')
-        
         filename_only = os.path.basename(filename)
-        command_str = f"UPLOAD {filename_only} {file_content}"
+        with open(filename, 'rb') as fp:
+            content = fp.read()
+        command = encode_upload(filename_only, content)
         
-        print(f"Sending command ({len(command_str)} chars)...")
-        hasil = send_command(command_str)
+        print(f"Sending command ({len(command)} bytes)...")
+        hasil = send_command(command, address=address_for(filename_only))
         
         if hasil and hasil.get('status') == 'OK':
+            # Server mengembalikan CRC32 isi yang disimpan; bandingkan dengan yang dikirim
+            expected = f'{zlib.crc32(content):08x}'
+            if hasil.get('crc32', expected) != expected:
+                print(f"Gagal upload file: checksum tidak cocok (server {hasil['crc32']}, lokal {expected})")
+                return False
             print(f"File {filename_only} berhasil diupload")
             return True
         else:
@@ -178,8 +278,7 @@ def remote_upload(filename=""):
         return False
 
 def remote_delete(filename=""):
-    command_str = f"DELETE {filename}"
-    hasil = send_command(command_str)
+    hasil = send_command(encode_delete(filename), address=address_for(filename))
     if hasil and hasil.get('status') == 'OK':
         print(f"File {filename} berhasil dihapus")
         return True
@@ -188,22 +287,136 @@ def remote_delete(filename=""):
         print(f"Gagal menghapus file: {error_msg}")
         return False
 
+def remote_copy(source, target, move=False):
+    """COPY/MOVE on the server: the file content never passes through this client.
+
+    Dengan sharding, kalau nama tujuan dimiliki node lain file dipindah
+    lewat client (GET + UPLOAD) karena kedua node tidak saling terhubung.
+    """
+    verb = "dipindah" if move else "disalin"
+    source_node, target_node = address_for(source), address_for(target)
+    if source_node == target_node:
+        hasil = send_command((encode_move if move else encode_copy)(source, target), address=source_node)
+    else:
+        print(f"{target} ada di node lain ({node_name(target_node)}), {verb} lewat client")
+        with tempfile.TemporaryDirectory() as workdir:
+            hasil = transfer_file(source, source_node, target_node, workdir, target_name=target, keep_source=not move)
+    if hasil and hasil.get('status') == 'OK':
+        print(f"File {source} berhasil {verb} ke {target}")
+        return True
+    error_msg = hasil.get('message', 'Unknown error') if hasil else 'Connection failed'
+    print(f"Gagal: {error_msg}")
+    return False
+
+def transfer_file(filename, source, target, workdir, target_name=None, keep_source=False):
+    """Copy one file from node `source` to node `target` through a local temp file, then delete it on source.
+
+    target_name: nama di node tujuan (default sama), keep_source: jangan hapus file di node sumber.
+    """
+    local_path = os.path.join(workdir, os.path.basename(filename))
+    hasil = send_command(encode_get(filename), download_to=local_path, address=source)
+    if not hasil or hasil.get('status') != 'OK':
+        return hasil
+    try:
+        hasil = send_command(upload_header(target_name or filename), address=target, upload_from=local_path)
+    finally:
+        os.remove(local_path)
+    if hasil and hasil.get('status') == 'OK' and not keep_source:
+        hasil = send_command(encode_delete(filename), address=source)
+    return hasil
+
+def rebalance(new_nodes):
+    """Move files so each one sits on its owner in a ring of `new_nodes`, then route with that ring.
+
+    Node lama yang tidak ada di new_nodes dikosongkan. Kalau file sudah ada di
+    node tujuan, versi (STAT) yang lebih baru yang dipertahankan. Kalau ada
+    yang gagal, ring lama tetap dipakai dan rebalance bisa diulang.
+    Jalankan saat tidak ada client lain yang upload: selama rebalance client
+    lain masih memakai ring lama. Returns (files moved, files failed).
+    """
+    global ring
+    old_nodes = ring.nodes if ring else [server_address]
+    new_ring = HashRing(new_nodes)
+    nodes = old_nodes + [n for n in new_ring.nodes if n not in old_nodes]
+    files, errors = list_nodes(nodes)
+    if errors:
+        # Tanpa LIST dari semua node, rencana pemindahan bisa menimpa atau kehilangan file
+        for node, error_msg in errors.items():
+            print(f"Node {node_name(node)} tidak bisa di-LIST: {error_msg}")
+        print("Rebalance dibatalkan")
+        return 0, 0
+    moves = plan_rebalance(new_ring, files)
+    print(f"Rebalance ke {len(new_ring)} node: {len(moves)} file dipindahkan")
+    moved = failed = 0
+    with tempfile.TemporaryDirectory(prefix='rebalance-') as workdir:
+        for filename, source, target in moves:
+            if filename in files.get(target, []):
+                hasil = resolve_duplicate(filename, source, target, workdir)
+            else:
+                hasil = transfer_file(filename, source, target, workdir)
+            if hasil and hasil.get('status') == 'OK':
+                moved += 1
+                logging.info(f"Moved {filename}: {node_name(source)} -> {node_name(target)}")
+            else:
+                failed += 1
+                error_msg = hasil.get('message', 'Unknown error') if hasil else 'Connection failed'
+                print(f"Gagal memindahkan {filename} dari {node_name(source)} ke {node_name(target)}: {error_msg}")
+    print(f"Rebalance selesai: {moved} dipindahkan, {failed} gagal")
+    if failed:
+        print("Ring lama tetap dipakai; ulangi rebalance setelah node yang gagal bisa dihubungi")
+    else:
+        ring = new_ring
+    return moved, failed
+
+def resolve_duplicate(filename, source, target, workdir):
+    """`filename` is on both nodes: keep the newer version on `target` and delete the one on `source`"""
+    versions = []
+    for node in (source, target):
+        stat = send_command(encode_stat(filename), address=node)
+        if not stat or stat.get('status') != 'OK':
+            return stat
+        versions.append(stat['version'])
+    if versions[0] > versions[1]:
+        # Salinan di node lama lebih baru: timpa node tujuan dengan salinan itu
+        return transfer_file(filename, source, target, workdir)
+    return send_command(encode_delete(filename), address=source)
+
 def show_menu():
     print("\n=== FILE SERVER MENU ===")
     print("1. List File")
     print("2. Download File")
     print("3. Upload File")
     print("4. Delete File")
+    print("5. Ubah Node (rebalance)")
+    print("6. Copy File")
+    print("7. Rename/Move File")
     print("0. Exit")
     print("----------------------")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Client file server (menu interaktif)")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6666)
+    parser.add_argument('--nodes', help="Mode sharding: daftar node host:port,host:port; setiap file "
+                                        "disimpan di node pemiliknya pada consistent-hash ring")
+    parser.add_argument('--replicas', help="Read replica dari server --host/--port (host:port,host:port); "
+                                           "download disebar ke primary dan replica")
+    return parser.parse_args()
+
 if __name__ == '__main__':
-    server_address = ('localhost', 6666)
+    args = parse_args()
+    server_address = (args.host, args.port)
+    if args.nodes:
+        ring = HashRing(args.nodes)
+        print(f"Sharding ke {len(ring)} node: {', '.join(node_name(n) for n in ring.nodes)}")
+    elif args.replicas:
+        balancer = LeastOutstanding([server_address] + parse_nodes(args.replicas))
+        print(f"Download disebar ke primary dan {len(balancer.nodes) - 1} replica")
     
     while True:
         show_menu()
         try:
-            choice = input("Pilih menu (0-4): ").strip()
+            choice = input("Pilih menu (0-7): ").strip()
             
             if choice == "1":
                 remote_list()
@@ -225,6 +438,18 @@ if __name__ == '__main__':
                     if filename:
                         remote_delete(filename)
             
+            elif choice == "5":
+                nodes = input("Masukkan daftar node (host:port,host:port): ").strip()
+                if nodes:
+                    rebalance(parse_nodes(nodes))
+            
+            elif choice in ("6", "7"):
+                if remote_list():
+                    source = input("Masukkan nama file sumber: ").strip()
+                    target = input("Masukkan nama file tujuan: ").strip()
+                    if source and target:
+                        remote_copy(source, target, move=choice == "7")
+            
             elif choice == "0":
                 print("Terima kasih telah menggunakan layanan file server")
                 break
@@ -1,20 +1,79 @@
 import os
 import json
 import base64
+import binascii
+import shutil
+import uuid
+import zlib
 from glob import glob
 import logging
+from async_logging import hot_log
+from base64_stream import Base64StreamDecoder, iter_base64_file
+from durability import NoSync
+from replication import file_version, new_version
+
+MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB limit
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+# ioctl reflink Linux (btrfs, xfs, ...): file baru berbagi blok data dengan file sumber
+FICLONE = 0x40049409
+
+
+def copy_file_data(source, target):
+    """Copy all of open file `source` into open file `target` without passing the data through Python.
+
+    Dicoba berurutan: reflink (instan, blok data dipakai bersama sampai
+    salah satu diubah), os.copy_file_range dan os.sendfile (disalin di
+    kernel), lalu read/write biasa. Returns (bytes copied, method).
+    """
+    size = os.fstat(source.fileno()).st_size
+    src_fd, dst_fd = source.fileno(), target.fileno()
+    if fcntl is not None:
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            return size, 'reflink'
+        except OSError:
+            pass  # filesystem tanpa reflink (ext4, tmpfs) atau beda filesystem
+    offset = 0
+    for method in ('copy_file_range', 'sendfile'):
+        if not hasattr(os, method):
+            continue
+        try:
+            while offset < size:
+                if method == 'copy_file_range':
+                    n = os.copy_file_range(src_fd, dst_fd, size - offset, offset, offset)
+                else:
+                    os.lseek(dst_fd, offset, os.SEEK_SET)
+                    n = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                if n == 0:
+                    break
+                offset += n
+            return offset, method
+        except OSError:
+            continue  # tidak didukung untuk pasangan file ini, lanjut dari offset yang sudah tersalin
+    source.seek(offset)
+    target.seek(offset)
+    shutil.copyfileobj(source, target)
+    return target.tell(), 'read/write'
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 
 class FileInterface:
-    def __init__(self, base_path='files'):
+    def __init__(self, base_path='files', replicator=None, durability=None):
         try:
             self.base_path = base_path
+            # Primary dengan read replica: setiap file yang selesai ditulis/dihapus dikirim ke replica
+            self.replicator = replicator
+            # Kapan upload dianggap aman di disk sebelum client menerima OK (lihat durability.py)
+            self.durability = durability or NoSync()
             # Pastikan folder files ada tapi JANGAN ubah working directory
             if not os.path.exists(self.base_path):
                 os.makedirs(self.base_path)
-            logging.info(f"FileInterface initialized, base path: {self.base_path}")
+            hot_log.info("FileInterface initialized, base path: %s", self.base_path)
         except Exception as e:
             logging.error(f"Error initializing FileInterface: {e}")
             raise
@@ -23,6 +82,10 @@ class FileInterface:
         """Get full path for file in base directory"""
         return os.path.join(self.base_path, filename)
 
+    def _changed(self, filename):
+        if self.replicator is not None:
+            self.replicator.file_changed(filename)
+
     def list(self, params=[]):
         try:
             # Gunakan glob dengan path lengkap
@@ -30,7 +93,7 @@ class FileInterface:
             full_paths = glob(pattern)
             # Ambil hanya nama file saja
             filelist = [os.path.basename(path) for path in full_paths]
-            logging.info(f"Listed {len(filelist)} files from {self.base_path}")
+            hot_log.info("Listed %d files from %s", len(filelist), self.base_path)
             return dict(status='OK', data=filelist)
         except Exception as e:
             logging.error(f"Error listing files: {e}")
@@ -44,22 +107,23 @@ class FileInterface:
             filename = params[0]
             filepath = self._get_file_path(filename)
             
-            if not os.path.exists(filepath):
+            try:
+                fp = open(filepath, 'rb')
+            except FileNotFoundError:
                 return dict(status='ERROR', message='File not found')
             
-            # Check file size
-            file_size = os.path.getsize(filepath)
-            max_size = 100 * 1024 * 1024  # 100MB limit
-            
-            if file_size > max_size:
-                return dict(status='ERROR', message=f'File too large ({file_size} bytes)')
-            
-            with open(filepath, 'rb') as fp:
+            # Ukuran, versi dan isi dari versi yang sama (file yang sudah dibuka), walau ditimpa upload lain
+            with fp:
+                stat = os.fstat(fp.fileno())
+                file_size = stat.st_size
+                if file_size > MAX_FILE_SIZE:
+                    return dict(status='ERROR', message=f'File too large ({file_size} bytes)')
+                version = file_version(stat)
                 file_content = fp.read()
                 isifile = base64.b64encode(file_content).decode()
             
-            logging.info(f"File {filename} retrieved ({file_size} bytes)")
-            return dict(status='OK', data_namafile=filename, data_file=isifile)
+            hot_log.info("File %s retrieved (%d bytes)", filename, file_size)
+            return dict(status='OK', data_namafile=filename, version=version, data_file=isifile)
             
         except Exception as e:
             logging.error(f"Error getting file: {e}")
@@ -86,22 +150,132 @@ class FileInterface:
                 return dict(status='ERROR', message=f'Invalid base64 encoding: {str(e)}')
             
             # Check decoded size
-            max_size = 100 * 1024 * 1024  # 100MB limit
-            if len(file_content) > max_size:
+            if len(file_content) > MAX_FILE_SIZE:
                 return dict(status='ERROR', message=f'File too large ({len(file_content)} bytes)')
             
-            # Write file dengan path lengkap
-            filepath = self._get_file_path(filename)
-            with open(filepath, 'wb') as fp:
-                fp.write(file_content)
-            
-            logging.info(f"File {filename} uploaded ({len(file_content)} bytes)")
-            return dict(status='OK', data_namafile=filename, message='File uploaded successfully')
+            # Lewat file sementara + rename seperti upload streaming, dengan level durability yang sama
+            upload = self.upload_stream(filename)
+            upload.store(file_content)
+            return upload.finish()
             
         except Exception as e:
             logging.error(f"Error uploading file: {e}")
             return dict(status='ERROR', message=str(e))
 
+    def get_stream(self, params=[]):
+        """GET without the whole file in memory: (header dict, iterator of base64 pieces).
+
+        Kalau gagal iterator-nya None dan dict berisi status ERROR.
+        """
+        header, fp = self.open_for_get(params)
+        if fp is None:
+            return header, None
+        filename = header['data_namafile']
+
+        def body():
+            with fp:
+                yield from iter_base64_file(fp)
+            hot_log.info("File %s streamed", filename)
+
+        return header, body()
+
+    def open_for_get(self, params=[]):
+        """(header dict, open binary file) for a GET; the file is None and the dict an ERROR on failure"""
+        if not params or params[0] == '':
+            return dict(status='ERROR', message='Filename required'), None
+        filename = params[0]
+        filepath = self._get_file_path(filename)
+        try:
+            fp = open(filepath, 'rb')
+        except FileNotFoundError:
+            return dict(status='ERROR', message='File not found'), None
+        except OSError as e:
+            logging.error(f"Error getting file: {e}")
+            return dict(status='ERROR', message=str(e)), None
+        stat = os.fstat(fp.fileno())
+        if stat.st_size > MAX_FILE_SIZE:
+            fp.close()
+            return dict(status='ERROR', message=f'File too large ({stat.st_size} bytes)'), None
+        return dict(status='OK', data_namafile=filename, version=file_version(stat)), fp
+
+    def upload_stream(self, filename, version=None):
+        """Start an upload whose base64 body arrives in pieces, see UploadStream"""
+        return UploadStream(self, filename, version)
+
+    def stat(self, params=[]):
+        """Size and version of a file without its content; client membandingkan versi replica dengan primary"""
+        if not params or params[0] == '':
+            return dict(status='ERROR', message='Filename required')
+        filename = params[0]
+        try:
+            stat = os.stat(self._get_file_path(filename))
+        except FileNotFoundError:
+            return dict(status='ERROR', message='File not found')
+        except OSError as e:
+            logging.error(f"Error reading file status: {e}")
+            return dict(status='ERROR', message=str(e))
+        return dict(status='OK', data_namafile=filename, size=stat.st_size, version=file_version(stat))
+
+    def copy(self, params=[]):
+        """COPY <source> <target>: duplicate a file on the server, as a new version of `target`"""
+        if len(params) < 2 or not params[0] or not params[1]:
+            return dict(status='ERROR', message='Source and target filename required')
+        source_name, target_name = params[0], params[1]
+        try:
+            source = open(self._get_file_path(source_name), 'rb')
+        except FileNotFoundError:
+            return dict(status='ERROR', message='File not found')
+        except OSError as e:
+            logging.error(f"Error copying file: {e}")
+            return dict(status='ERROR', message=str(e))
+        # Versi sumber yang sudah dibuka yang disalin, walau sumber ditimpa upload lain di tengah jalan
+        with source:
+            try:
+                upload = self.upload_stream(target_name)
+            except OSError as e:
+                logging.error(f"Error copying file: {e}")
+                return dict(status='ERROR', message=str(e))
+            upload.copy_from(source)
+        result = upload.finish()
+        if result['status'] == 'OK':
+            result['message'] = 'File copied successfully'
+            hot_log.info("File %s copied to %s (%d bytes, %s)", source_name, target_name, upload.size,
+                         upload.copy_method)
+        return result
+
+    def move(self, params=[]):
+        """MOVE <source> <target>: atomic rename; the file keeps its content and gets a new version"""
+        if len(params) < 2 or not params[0] or not params[1]:
+            return dict(status='ERROR', message='Source and target filename required')
+        source_name, target_name = params[0], params[1]
+        source_path = self._get_file_path(source_name)
+        target_path = self._get_file_path(target_name)
+        try:
+            # Versi baru untuk nama tujuan: replica mengabaikan versi yang tidak lebih baru dari miliknya
+            original = os.stat(source_path)
+            version = new_version()
+            os.utime(source_path, ns=(version, version))
+            try:
+                self.durability.move(source_path, target_path)
+            except OSError:
+                # Rename gagal: source tidak boleh tetap membawa versi baru yang tidak pernah dipakai
+                try:
+                    os.utime(source_path, ns=(original.st_atime_ns, original.st_mtime_ns))
+                except OSError:
+                    pass
+                raise
+            stat = os.stat(target_path)
+        except FileNotFoundError:
+            return dict(status='ERROR', message='File not found')
+        except OSError as e:
+            logging.error(f"Error moving file: {e}")
+            return dict(status='ERROR', message=str(e))
+        self._changed(source_name)
+        self._changed(target_name)
+        hot_log.info("File %s moved to %s", source_name, target_name)
+        return dict(status='OK', data_namafile=target_name, version=file_version(stat),
+                    message='File moved successfully')
+
     def delete(self, params=[]):
         try:
             if not params or params[0] == '':
@@ -114,13 +288,148 @@ class FileInterface:
                 return dict(status='ERROR', message='File not found')
             
             os.remove(filepath)
-            logging.info(f"File {filename} deleted")
+            self._changed(filename)
+            hot_log.info("File %s deleted", filename)
             return dict(status='OK', message='File deleted successfully')
             
         except Exception as e:
             logging.error(f"Error deleting file: {e}")
             return dict(status='ERROR', message=str(e))
 
+class UploadStream:
+    """Upload decoded piece by piece into a temporary file, renamed on finish().
+
+    Body base64 tidak pernah utuh di memory; file tujuan baru diganti setelah
+    seluruh body valid, jadi upload yang putus tidak meninggalkan file terpotong.
+
+    Setiap upload adalah versi baru (file baru) yang tidak pernah diubah lagi,
+    dipublikasikan dengan rename atomik ke nama tujuan. GET yang sudah membuka
+    versi lama tetap membaca versi itu sampai selesai tanpa lock, dan kernel
+    membebaskan versi lama setelah reader terakhirnya menutup file. Versi
+    (new_version, atau version dari REPLICATE primary) dipasang sebagai mtime
+    sebelum rename, jadi isi dan versi selalu berganti bersamaan. Rename (dan
+    fsync-nya) dilakukan oleh durability policy milik interface.
+
+    CRC32 isi file ikut dihitung selama upload dan dikembalikan sebagai
+    `crc32` (hex) supaya client bisa mencocokkan dengan data yang dikirim.
+    """
+
+    def __init__(self, interface, filename, version=None):
+        self.interface = interface
+        self.filename = filename
+        self.version = version
+        self.filepath = interface._get_file_path(filename)
+        self.temp_path = interface._get_file_path(f".{filename}.{uuid.uuid4().hex[:8]}.part")
+        self.decoder = Base64StreamDecoder()
+        self.size = 0
+        self.crc32 = 0
+        self.copy_method = None
+        self.error = None
+        self.fp = open(self.temp_path, 'wb')
+        self.durability = interface.durability
+        self.durability.begin()
+        self.ended = False
+
+    def write(self, piece):
+        if self.error:
+            return  # tetap konsumsi body supaya client bisa membaca response
+        try:
+            data = self.decoder.feed(piece)
+        except binascii.Error as e:
+            self.fail(f'Invalid base64 encoding: {e}')
+            return
+        self.store(data)
+
+    def store(self, data, checksum=True):
+        """Write bytes that were already decoded elsewhere (e.g. in a worker process).
+
+        checksum=False kalau pemanggil menghitung crc32 sendiri (server hybrid
+        melakukannya di encoder process) dan memasangnya ke self.crc32.
+        """
+        if self.error:
+            return
+        self.size += len(data)
+        if self.size > MAX_FILE_SIZE:
+            self.fail(f'File too large ({self.size} bytes)')
+            return
+        if checksum:
+            self.crc32 = zlib.crc32(data, self.crc32)
+        self.fp.write(data)
+
+    def copy_from(self, source):
+        """Fill the new version from an open file on the server instead of a base64 body"""
+        if self.error:
+            return
+        try:
+            self.fp.flush()
+            self.size, self.copy_method = copy_file_data(source, self.fp)
+            self.crc32 = None  # isi disalin di kernel, tidak pernah lewat Python
+        except OSError as e:
+            self.fail(str(e))
+            return
+        if self.size > MAX_FILE_SIZE:
+            self.fail(f'File too large ({self.size} bytes)')
+
+    def fail(self, message):
+        """Reject the upload; the first error is the one reported by finish()"""
+        self.error = self.error or message
+
+    def _end(self):
+        if not self.ended:
+            self.ended = True
+            self.durability.end()
+
+    def abort(self):
+        self._end()
+        if not self.fp.closed:
+            self.fp.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+    def finish(self):
+        """Result dict, same as upload(); the file only appears if the whole body was valid"""
+        try:
+            self.decoder.finish()
+        except binascii.Error as e:
+            self.error = self.error or f'Invalid base64 encoding: {e}'
+        if not self.error and self.size == 0:
+            self.error = 'File content required'
+        if self.error:
+            self.abort()
+            return dict(status='ERROR', message=self.error)
+        if self.version is not None:
+            # REPLICATE yang datang terlambat tidak boleh menimpa versi yang lebih baru
+            try:
+                current = file_version(os.stat(self.filepath))
+            except FileNotFoundError:
+                current = None
+            if current is not None and current >= self.version:
+                self.abort()
+                hot_log.info("Ignored version %d of %s, have %d", self.version, self.filename, current)
+                return dict(status='OK', data_namafile=self.filename, version=current,
+                            message='Newer version already stored')
+        try:
+            self.fp.flush()
+            if self.version is None:
+                self.version = new_version()
+            os.utime(self.temp_path, ns=(self.version, self.version))
+            # commit() sendiri yang menutup hitungan upload berjalan di durability policy
+            self.ended = True
+            self.durability.commit(self.fp, self.temp_path, self.filepath)
+        except OSError as e:
+            logging.error(f"Error uploading file: {e}")
+            self.abort()
+            return dict(status='ERROR', message=str(e))
+        self.interface._changed(self.filename)
+        hot_log.info("File %s uploaded (%d bytes)", self.filename, self.size)
+        result = dict(status='OK', data_namafile=self.filename, version=self.version,
+                      message='File uploaded successfully')
+        if self.crc32 is not None:
+            result['crc32'] = f'{self.crc32:08x}'
+        return result
+
 if __name__ == '__main__':
     f = FileInterface()
     print("Testing FileInterface:")
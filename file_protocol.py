@@ -3,25 +3,144 @@ import logging
 import shlex
 import threading
 import base64
+import os
+import time
 
 from file_interface import FileInterface
+from async_logging import hot_log
+
+# Method FileInterface untuk server sendiri, tidak boleh dipanggil sebagai command dari client
+INTERNAL_METHODS = ('get_stream', 'open_for_get', 'upload_stream')
+
+# Response GET yang di-stream: envelope_head(header) + potongan base64 + ENVELOPE_TAIL
+ENVELOPE_TAIL = b'"}'
+
+def envelope_head(header):
+    """Start of the GET response JSON up to the opening quote of data_file"""
+    return json.dumps(header)[:-1].encode('utf-8') + b', "data_file": "'
 
 class FileProtocol:
-    def __init__(self):
+    def __init__(self, stats=None, profiler=None, replicator=None, durability=None):
         # Create thread-local storage for FileInterface untuk thread safety
         self._local = threading.local()
+        # Replicator milik server primary, diteruskan ke setiap FileInterface
+        self.replicator = replicator
+        # Durability policy milik server (satu per process supaya group commit bisa mengumpulkan upload)
+        self.durability = durability
+        # ServerStats milik server, dipakai untuk command STATS
+        self.stats = stats
+        # ServerProfiler milik server, dipakai untuk command PROFILE
+        self.profiler = profiler
     
     def get_file_interface(self):
         """Get thread-local FileInterface instance"""
         if not hasattr(self._local, 'file'):
             # Pastikan FileInterface menggunakan folder files untuk server
-            self._local.file = FileInterface('files')
+            self._local.file = FileInterface('files', replicator=self.replicator, durability=self.durability)
         return self._local.file
-    
+
+    def estimate_response_size(self, string_datamasuk=''):
+        """Perkiraan ukuran response (bytes) untuk admission control sebelum command dijalankan"""
+        head = string_datamasuk[:300].strip().split()
+        if len(head) >= 2 and head[0].upper() == 'GET':
+            filepath = self.get_file_interface()._get_file_path(head[1])
+            try:
+                # base64 membesar 4/3 dari ukuran file asli
+                return os.path.getsize(filepath) * 4 // 3 + 256
+            except OSError:
+                return 256
+        return 256
+
+    def last_request_info(self):
+        """Command name and phase timings (seconds) of the last request on this thread"""
+        return getattr(self._local, 'command', 'other'), getattr(self._local, 'timings', {})
+
+    def split_command(self, string_datamasuk):
+        """(command lowercased, params) of a non-UPLOAD request"""
+        try:
+            # Gunakan shlex, hanya nama command yang di-lowercase, nama file case-sensitive
+            c = shlex.split(string_datamasuk)
+            c_request = c[0].strip().lower() if c else ''
+            params = [x.strip() for x in c[1:]] if len(c) > 1 else []
+        except ValueError as e:
+            # Jika shlex gagal (misalnya quote tidak seimbang), fallback ke split biasa
+            logging.warning(f"shlex parse failed, using simple split: {e}")
+            parts = string_datamasuk.split()
+            c_request = parts[0].lower() if parts else ''
+            params = parts[1:] if len(parts) > 1 else []
+        return c_request, params
+
+    def _start_request(self, command):
+        timings = {}
+        self._local.timings = timings
+        self._local.command = command
+        return timings
+
+    def response_stream(self, string_datamasuk=''):
+        """GET as an iterator of response pieces (bytes, without terminator); None for other commands.
+
+        Envelope JSON ditulis manual di sekitar potongan base64 (3-byte aligned),
+        hasilnya byte-per-byte sama dengan json.dumps versi proses_string, tapi
+        file tidak pernah utuh di memory.
+        """
+        head = string_datamasuk.strip()
+        if head[:4].upper() != 'GET ':
+            return None
+        timings = self._start_request('get')
+        phase_start = time.perf_counter()
+        _, params = self.split_command(head)
+        now = time.perf_counter()
+        timings['parse'] = now - phase_start
+        header, body = self.get_file_interface().get_stream(params)
+        timings['disk'] = time.perf_counter() - now
+        if body is None:
+            return iter([json.dumps(header).encode('utf-8')])
+        return self._stream_envelope(header, body, timings)
+
+    def _stream_envelope(self, header, body, timings):
+        yield envelope_head(header)
+        encode_time = 0.0
+        while True:
+            phase_start = time.perf_counter()
+            piece = next(body, None)
+            encode_time += time.perf_counter() - phase_start
+            if piece is None:
+                break
+            yield piece
+        # Baca disk + base64 per potongan, terjadi bergantian dengan send
+        timings['encode'] = encode_time
+        yield ENVELOPE_TAIL
+
+    def begin_upload(self, head):
+        """Streaming upload from its 'UPLOAD <filename>' or 'REPLICATE <filename> <version>' head.
+
+        Returns (UploadStream, None) or (None, error JSON). REPLICATE dikirim
+        primary ke read replica, dicatat di STATS sebagai upload.
+        """
+        self._start_request('upload')
+        parts = head.split(' ')
+        filename = parts[1].strip() if len(parts) > 1 else ''
+        if not filename:
+            return None, json.dumps(dict(status='ERROR', message='Filename required'))
+        version = None
+        if parts[0].upper() == 'REPLICATE':
+            try:
+                version = int(parts[2])
+            except (IndexError, ValueError):
+                return None, json.dumps(dict(status='ERROR', message='Version required'))
+        try:
+            return self.get_file_interface().upload_stream(filename, version), None
+        except OSError as e:
+            logging.error(f"Error uploading file: {e}")
+            return None, json.dumps(dict(status='ERROR', message=str(e)))
+
     def proses_string(self, string_datamasuk=''):
         # Limit log untuk file besar - hanya tampilkan awal command
         command_preview = string_datamasuk[:50] + "..." if len(string_datamasuk) > 50 else string_datamasuk
-        logging.info(f"Processing command: {command_preview}")
+        hot_log.info("Processing command: %s", command_preview)
+        
+        timings = self._start_request('other')
+        phase_start = time.perf_counter()
         
         try:
             # Clean input string
@@ -53,32 +172,49 @@ class FileProtocol:
                 else:
                     return json.dumps(dict(status='ERROR', message='UPLOAD command incomplete'))
             else:
-                # Gunakan shlex untuk command lainnya
-                try:
-                    c = shlex.split(string_datamasuk.lower())
-                    c_request = c[0].strip() if c else ''
-                    params = [x.strip() for x in c[1:]] if len(c) > 1 else []
-                except ValueError as e:
-                    # Jika shlex gagal (misalnya quote tidak seimbang), fallback ke split biasa
-                    logging.warning(f"shlex parse failed, using simple split: {e}")
-                    parts = string_datamasuk.split()
-                    c_request = parts[0].lower() if parts else ''
-                    params = parts[1:] if len(parts) > 1 else []
+                c_request, params = self.split_command(string_datamasuk)
             
             if not c_request:
                 return json.dumps(dict(status='ERROR', message='Empty command'))
             
-            logging.info(f"Executing command: {c_request}")
+            hot_log.info("Executing command: %s", c_request)
+            self._local.command = c_request
+            now = time.perf_counter()
+            timings['parse'] = now - phase_start
+            phase_start = now
+            
+            # STATS: metrik live server, ditangani di protocol karena bukan operasi file
+            if c_request == 'stats':
+                if self.stats is None:
+                    return json.dumps(dict(status='ERROR', message='Stats not available'))
+                return json.dumps(dict(status='OK', data=self.stats.snapshot()))
+            
+            # PROFILE <detik> [cpu|cprofile|memory]: profiling request path selama N detik
+            if c_request == 'profile':
+                if self.profiler is None:
+                    return json.dumps(dict(status='ERROR', message='Profiling not available'))
+                if not params:
+                    return json.dumps(dict(status='ERROR', message='Usage: PROFILE <seconds> [cpu|cprofile|memory]'))
+                try:
+                    data = self.profiler.start(params[0], params[1].lower() if len(params) > 1 else 'cpu')
+                except (ValueError, RuntimeError) as e:
+                    return json.dumps(dict(status='ERROR', message=str(e)))
+                logging.info(f"Profiling ({data['mode']}) started for {data['seconds']}s")
+                return json.dumps(dict(status='OK', data=data))
             
             # Get thread-local file interface
             file_interface = self.get_file_interface()
             
             # Execute command
-            if hasattr(file_interface, c_request):
+            if hasattr(file_interface, c_request) and not c_request.startswith('_') and c_request not in INTERNAL_METHODS:
                 method = getattr(file_interface, c_request)
                 try:
                     cl = method(params)
-                    return json.dumps(cl)
+                    now = time.perf_counter()
+                    timings['disk'] = now - phase_start
+                    hasil = json.dumps(cl)
+                    timings['encode'] = time.perf_counter() - now
+                    return hasil
                 except Exception as e:
                     logging.error(f"Error executing {c_request}: {e}")
                     return json.dumps(dict(status='ERROR', message=f'Error executing command: {str(e)}'))
@@ -107,4 +243,5 @@ if __name__ == '__main__':
     print(fp.proses_string("DELETE test.txt"))
     
     print("\n4. UPLOAD command:")
-    print(fp.proses_string("UPLOAD test.txt dGVzdCBkYXRh"))  # "test data" in base64
\ No newline at end of file
+    print(fp.proses_string("UPLOAD test.txt dGVzdCBkYXRh"))  # "test data" in base64
+    print("   phase timings:", fp.last_request_info())
\ No newline at end of file
@@ -5,168 +5,199 @@ import logging
 import time
 import sys
 import os
+import argparse
 
 from file_protocol import FileProtocol
+from admission_control import DEFAULT_MEMORY_BUDGET, AdmissionController
+from rate_limiter import RateLimiter, add_rate_limit_arguments, rate_limits_from_args
+from async_logging import hot_log, setup_async_logging, stop_async_logging
+from server_stats import ServerStats
+from profiler import ServerProfiler
+from request_handler import handle_request
+from buffered_reader import REQUEST_TIMEOUT
+from durability import DURABILITY_LEVELS, GROUP_COMMIT_WINDOW, make_durability
+from replication import Replicator
+from graceful_restart import DRAIN_TIMEOUT, DrainController, notify_ready, open_listener
 
 # Setup logging yang lebih baik
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class ProcessTheClient(threading.Thread):
-    def __init__(self, connection, address):
+    def __init__(self, connection, address, admission=None, rate_limiter=None, stats=None, profiler=None,
+                 drain=None, replicator=None, durability=None):
         self.connection = connection
+        self.drain = drain
+        self.replicator = replicator
+        self.durability = durability
         self.address = address
+        self.admission = admission or AdmissionController()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.stats = stats or ServerStats()
+        self.profiler = profiler or ServerProfiler()
         threading.Thread.__init__(self)
 
     def run(self):
-        try:
-            fp = FileProtocol()
-            logging.info(f"Thread {self.name} handling client {self.address}")
+        reservation = self.admission.reservation()
+        started = time.time()
+        self.stats.connection_opened()
+        with self.profiler.request():
+            try:
+                fp = FileProtocol(stats=self.stats, profiler=self.profiler, replicator=self.replicator,
+                                  durability=self.durability)
+                hot_log.info("Thread %s handling client %s", self.name, self.address)
             
-            # Set socket options untuk performa yang lebih baik
-            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
-            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
-            self.connection.settimeout(120)  # 2 menit timeout
+                # Set socket options untuk performa yang lebih baik
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
+                self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+                self.connection.settimeout(REQUEST_TIMEOUT)  # 2 menit timeout
             
-            # Receive data dengan handling yang lebih baik untuk file besar
-            data_received = b""
-            total_received = 0
+                # Batasi jumlah request per detik per alamat client
+                self.rate_limiter.acquire_request(self.address)
             
-            while True:
-                try:
-                    chunk = self.connection.recv(32768)  # 32KB chunks
-                    if not chunk:
-                        break
-                    
-                    data_received += chunk
-                    total_received += len(chunk)
-                    
-                    # Log progress untuk file besar
-                    if total_received % (1024 * 1024) == 0:  # Every 1MB
-                        logging.info(f"Received {total_received // (1024*1024)}MB from {self.address}")
-                    
-                    # Check if we might have received complete command
-                    # For small commands, break early
-                    if len(chunk) < 32768 and not data_received.startswith(b'UPLOAD'):
-                        break
-                    
-                    # For UPLOAD, we need to be more careful
-                    if data_received.startswith(b'UPLOAD'):
-                        # Look for the pattern: UPLOAD filename base64data
-                        try:
-                            decoded_so_far = data_received.decode('utf-8', errors='ignore')
-                            parts = decoded_so_far.split(' ', 2)
-                            if len(parts) >= 3:
-                                # We have command, filename, and some data
-                                # Check if base64 data looks complete (ends with proper padding)
-                                base64_data = parts[2]
-                                if len(base64_data) > 100 and (
-                                    base64_data.endswith('=') or 
-                                    base64_data.endswith('==') or
-                                    len(chunk) < 32768  # Last chunk was smaller
-                                ):
-                                    break
-                        except:
-                            pass  # Keep receiving
-                    
-                except socket.timeout:
-                    logging.warning(f"Timeout receiving from {self.address}, processing what we have")
-                    break
-                except Exception as e:
-                    logging.error(f"Error receiving from {self.address}: {e}")
-                    break
+                # Terima, proses dan kirim; GET/UPLOAD di-stream per potongan base64
+                handle_request(self.connection, self.address, fp, reservation, self.admission,
+                               self.rate_limiter, self.stats, started)
             
-            if data_received:
+            except Exception as e:
+                logging.error(f"Fatal error handling client {self.address}: {e}")
+            finally:
+                reservation.release()
+                self.stats.connection_closed()
+                if self.drain is not None:
+                    self.drain.untrack(self.connection)
                 try:
-                    # Decode received data
-                    command_str = data_received.decode('utf-8')
-                    logging.info(f"Processing {len(command_str)} characters from {self.address}")
-                    
-                    # Process command
-                    result = fp.proses_string(command_str)
-                    
-                    # Send response
-                    response = result + "\r\n\r\n"
-                    response_bytes = response.encode('utf-8')
-                    
-                    # Send in chunks for large responses
-                    chunk_size = 32768
-                    total_sent = 0
-                    
-                    for i in range(0, len(response_bytes), chunk_size):
-                        chunk = response_bytes[i:i + chunk_size]
-                        self.connection.sendall(chunk)
-                        total_sent += len(chunk)
-                    
-                    logging.info(f"Sent {total_sent} bytes response to {self.address}")
-                    
-                except UnicodeDecodeError as e:
-                    logging.error(f"Unicode decode error from {self.address}: {e}")
-                    error_response = '{"status": "ERROR", "message": "Invalid character encoding"}\r\n\r\n'
-                    self.connection.sendall(error_response.encode('utf-8'))
-                except Exception as e:
-                    logging.error(f"Error processing request from {self.address}: {e}")
-                    error_response = f'{{"status": "ERROR", "message": "Server processing error"}}\r\n\r\n'
-                    self.connection.sendall(error_response.encode('utf-8'))
-            
-        except Exception as e:
-            logging.error(f"Fatal error handling client {self.address}: {e}")
-        finally:
-            try:
-                self.connection.close()
-            except:
-                pass
-            logging.info(f"Connection with {self.address} closed")
+                    self.connection.close()
+                except:
+                    pass
+                hot_log.info("Connection with %s closed", self.address)
 
 class Server(threading.Thread):
-    def __init__(self, ipaddress='0.0.0.0', port=6666):
+    def __init__(self, ipaddress='0.0.0.0', port=6666, memory_budget=None, rate_limits=None,
+                 drain_timeout=DRAIN_TIMEOUT, replicas=None, durability='none',
+                 group_commit_window=GROUP_COMMIT_WINDOW):
         self.ipinfo = (ipaddress, port)
         self.the_clients = []
-        self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
-        self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+        if memory_budget:
+            self.admission = AdmissionController(memory_budget=memory_budget)
+        else:
+            self.admission = AdmissionController()
+        # rate_limits: argumen untuk RateLimiter, contoh dict(bytes_per_sec=..., per_client={...})
+        self.rate_limiter = RateLimiter(**(rate_limits or {}))
+        self.stats = ServerStats()
+        self.stats.set_info('engine', 'file_server')
+        self.stats.add_gauge_provider('workers', lambda: sum(1 for t in self.the_clients if t.is_alive()))
+        # Profiling on-demand lewat command PROFILE atau kill -USR1
+        self.profiler = ServerProfiler()
+        # Primary dengan read replica: upload/delete yang selesai dikirim ke replica di background
+        self.replicator = Replicator(replicas).start() if replicas else None
+        if self.replicator:
+            self.stats.add_gauge_provider('replication', self.replicator.status)
+        self.durability = make_durability(durability, group_commit_window)
+        self.stats.add_gauge_provider('durability', self.durability.status)
+        self.my_socket = None
+        # SIGTERM/SIGINT: drain, SIGHUP: hot restart (signal handler dipasang dari main thread)
+        self.drain = DrainController(drain_timeout)
         threading.Thread.__init__(self)
 
     def run(self):
         try:
             logging.info(f"Multithreading server running on {self.ipinfo}")
-            self.my_socket.bind(self.ipinfo)
-            self.my_socket.listen(100)  # Increased backlog
+            self.my_socket = open_listener(self.ipinfo, 100)  # Increased backlog
+            self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
+            self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+            notify_ready()
             
-            while True:
-                self.connection, self.client_address = self.my_socket.accept()
-                logging.info(f"New connection from {self.client_address}")
+            while self.drain.check(self.my_socket):
+                try:
+                    self.connection, self.client_address = self.my_socket.accept()
+                except socket.timeout:
+                    continue
+                hot_log.info("New connection from %s", self.client_address)
+                self.drain.track(self.connection)
 
-                clt = ProcessTheClient(self.connection, self.client_address)
+                # Clean up finished threads, nomor worker yang sudah selesai dipakai ulang
+                self.the_clients = [t for t in self.the_clients if t.is_alive()]
+                
+                clt = ProcessTheClient(self.connection, self.client_address, self.admission, self.rate_limiter,
+                                       self.stats, self.profiler, self.drain, self.replicator,
+                                       self.durability)
+                clt.name = f"worker-{self.free_worker_index()}"
                 clt.start()
                 self.the_clients.append(clt)
-                
-                # Clean up finished threads more frequently
-                if len(self.the_clients) > 50:
-                    self.the_clients = [t for t in self.the_clients if t.is_alive()]
+
+            # Koneksi baru ditangani server pengganti (hot restart) atau ditolak
+            self.my_socket.close()
+            if not self.drain.wait():
+                self.drain.abort_remaining()
                 
         except KeyboardInterrupt:
             logging.info("Server shutdown requested")
             sys.exit(0)
         except Exception as e:
-            logging.error(f"Server error: {e}")
+            if not self.drain.draining:
+                logging.error(f"Server error: {e}")
         finally:
             self.cleanup()
 
+    def stop(self):
+        """Stop accepting and drain; accept() memakai timeout, jadi loop server melihatnya dalam DRAIN_POLL.
+
+        Jangan shutdown() listening socket: setelah hot restart socket yang sama dipakai server pengganti.
+        """
+        self.drain.request_stop()
+
+    def free_worker_index(self):
+        """Lowest worker number not used by a live handler thread"""
+        used = {t.name for t in self.the_clients}
+        index = 0
+        while f"worker-{index}" in used:
+            index += 1
+        return index
+
     def cleanup(self):
         for client in self.the_clients:
             if client.is_alive():
                 client.join(timeout=1)
-        self.my_socket.close()
+        if self.replicator:
+            self.replicator.stop()
+        self.durability.stop()
+        if self.my_socket is not None:
+            self.my_socket.close()
         logging.info("Multithreading server cleaned up")
 
 def main():
+    parser = argparse.ArgumentParser(description="Multithreading file server (thread per connection)")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=6666)
+    parser.add_argument('--memory-budget-mb', type=int, default=DEFAULT_MEMORY_BUDGET // (1024 * 1024),
+                        help="Memory untuk transfer yang sedang berjalan; request yang melebihinya dijawab BUSY")
+    parser.add_argument('--drain-timeout', type=float, default=DRAIN_TIMEOUT,
+                        help="Detik menunggu transfer aktif selesai saat SIGTERM/SIGHUP sebelum koneksi diputus")
+    parser.add_argument('--replicas', help="Jalankan sebagai primary: upload/delete dikirim ke read replica "
+                                           "host:port,host:port")
+    parser.add_argument('--durability', choices=DURABILITY_LEVELS, default='none',
+                        help="none: tanpa fsync; fsync: fsync per upload; group: fsync upload yang selesai "
+                             "berdekatan sekaligus. OK dikirim setelah data di disk (kecuali none)")
+    parser.add_argument('--group-commit-ms', type=float, default=GROUP_COMMIT_WINDOW * 1000,
+                        help="Jendela pengumpulan batch untuk --durability group")
+    add_rate_limit_arguments(parser)
+    args = parser.parse_args()
+
+    # Semua log lewat satu writer thread, access log satu baris per request
+    setup_async_logging(access_log_path='access.log')
+    
     # Pastikan folder files ada
     if not os.path.exists('files'):
         os.makedirs('files')
         print("Created 'files' directory")
     
-    svr = Server(ipaddress='0.0.0.0', port=6666)
+    svr = Server(ipaddress=args.host, port=args.port, memory_budget=args.memory_budget_mb * 1024 * 1024,
+                 drain_timeout=args.drain_timeout, replicas=args.replicas,
+                 durability=args.durability, group_commit_window=args.group_commit_ms / 1000,
+                 rate_limits=rate_limits_from_args(args))
+    # Signal handler harus dipasang dari main thread
+    svr.profiler.install_signal_handler()
+    svr.drain.install_signal_handlers()
     svr.start()
     
     try:
@@ -175,7 +206,10 @@ def main():
             time.sleep(1)
     except KeyboardInterrupt:
         print("Shutting down server...")
-        sys.exit(0)
+        svr.stop()
+        svr.join()
+    finally:
+        stop_async_logging()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
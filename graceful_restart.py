@@ -0,0 +1,208 @@
+import logging
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+# Hot restart: server baru mewarisi listening socket lewat fd, bukan bind ulang
+LISTEN_FD_ENV = 'FILE_SERVER_LISTEN_FD'
+# Pipe tempat server baru memberi tahu server lama bahwa ia sudah siap accept
+READY_FD_ENV = 'FILE_SERVER_READY_FD'
+# Batas waktu transfer yang sedang berjalan untuk selesai setelah drain dimulai
+DRAIN_TIMEOUT = 60.0
+# Batas waktu server baru untuk siap sebelum restart dibatalkan
+SUCCESSOR_TIMEOUT = 30.0
+# Interval accept loop mengecek signal drain/restart
+DRAIN_POLL = 0.5
+
+
+def open_listener(ipinfo, backlog):
+    """Listening socket: the one inherited from the previous server on a hot restart, else a new bind.
+
+    Socket selalu non-blocking dengan timeout DRAIN_POLL: flag O_NONBLOCK
+    dipakai bersama server lama dan baru, dan accept() tidak boleh menggantung
+    kalau koneksinya sudah diambil process lain. Timeout juga membuat accept
+    loop sempat melihat signal drain/restart.
+    """
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if fd is not None:
+        listener = socket.socket(fileno=int(fd))
+        logging.info(f"Using listening socket inherited from the previous server (fd {fd})")
+    else:
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(ipinfo)
+        listener.listen(backlog)
+    listener.settimeout(DRAIN_POLL)
+    return listener
+
+
+def notify_ready():
+    """Tell the previous server that this one is accepting (hot restart only)"""
+    fd = os.environ.pop(READY_FD_ENV, None)
+    if fd is None:
+        return
+    try:
+        os.write(int(fd), b'1')
+    except OSError:
+        pass
+    finally:
+        os.close(int(fd))
+
+
+def spawn_successor(listener, timeout=SUCCESSOR_TIMEOUT):
+    """Start a new copy of this server on the same listening socket; the process once it accepts, else None.
+
+    Argumen command line sama dengan process ini. Selama server baru start,
+    koneksi baru antri di backlog socket yang sama, jadi tidak ada yang ditolak.
+    Kalau server baru gagal start, server lama tetap melayani.
+    """
+    fd = listener.fileno()
+    read_fd, write_fd = os.pipe()
+    env = dict(os.environ, **{LISTEN_FD_ENV: str(fd), READY_FD_ENV: str(write_fd)})
+    try:
+        process = subprocess.Popen([sys.executable] + sys.argv, env=env, pass_fds=(fd, write_fd))
+    except OSError as e:
+        logging.error(f"Failed to start replacement server: {e}")
+        os.close(read_fd)
+        return None
+    finally:
+        os.close(write_fd)
+
+    deadline = time.time() + timeout
+    try:
+        while time.time() < deadline:
+            ready, _, _ = select.select([read_fd], [], [], 0.2)
+            if ready:
+                if os.read(read_fd, 1):
+                    logging.info(f"Replacement server (pid {process.pid}) is accepting")
+                    return process
+                break  # pipe ditutup tanpa sinyal siap
+            if process.poll() is not None:
+                break
+    finally:
+        os.close(read_fd)
+    logging.error(f"Replacement server (pid {process.pid}) did not become ready, keep serving")
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+    return None
+
+
+class DrainController:
+    """Drain and hot-restart state, set by signals and acted on by the server's accept loop.
+
+    SIGTERM/SIGINT: berhenti accept, transfer yang sedang berjalan diberi waktu
+    sampai drain_timeout untuk selesai, lalu server keluar. SIGHUP: jalankan
+    server baru di listening socket yang sama, setelah ia siap server lama
+    drain. Signal stop kedua saat drain memutus koneksi yang tersisa sekarang.
+    """
+
+    def __init__(self, drain_timeout=DRAIN_TIMEOUT):
+        self.drain_timeout = drain_timeout
+        self.draining = False
+        self.deadline = None
+        self.received_signal = None
+        self._stop_requested = False
+        self._restart_requested = False
+        self._force = False
+        # Koneksi yang sedang dilayani, diputus kalau deadline drain lewat
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    def install_signal_handlers(self, loop=None):
+        """Handle SIGTERM/SIGINT (drain) and SIGHUP (hot restart); via loop.add_signal_handler for asyncio"""
+        handlers = [(signal.SIGINT, self._on_stop), (signal.SIGTERM, self._on_stop)]
+        if hasattr(signal, 'SIGHUP'):
+            handlers.append((signal.SIGHUP, self._on_restart))
+        for signum, handler in handlers:
+            try:
+                if loop is not None:
+                    loop.add_signal_handler(signum, handler, signum, None)
+                else:
+                    signal.signal(signum, handler)
+            except (NotImplementedError, AttributeError, RuntimeError, ValueError):
+                pass  # Windows atau bukan main thread: berhenti lewat KeyboardInterrupt
+
+    # Jangan logging di signal handler: bisa datang saat thread utama memegang lock queue logging
+    def _on_stop(self, signum, frame):
+        self.received_signal = signum
+        if self.draining or self._stop_requested:
+            self._force = True
+        self._stop_requested = True
+
+    def _on_restart(self, signum, frame):
+        self.received_signal = signum
+        self._restart_requested = True
+
+    def request_stop(self):
+        self._stop_requested = True
+
+    def check(self, listener):
+        """Called by the accept loop between accepts; False once the server stopped accepting"""
+        if self.draining:
+            return False
+        if self._restart_requested:
+            self._restart_requested = False
+            logging.info("Hot restart requested, starting replacement server")
+            if spawn_successor(listener):
+                self._start_drain("hot restart")
+                return False
+        if self._stop_requested:
+            self._start_drain(f"signal {self.received_signal}" if self.received_signal else "shutdown")
+            return False
+        return True
+
+    def _start_drain(self, reason):
+        self.draining = True
+        self.deadline = time.time() + self.drain_timeout
+        logging.info(f"Draining ({reason}): no new connections, waiting up to {self.drain_timeout:.0f}s "
+                     f"for active transfers")
+
+    def expired(self):
+        """Drain deadline passed, or a second stop signal arrived"""
+        return self._force or (self.deadline is not None and time.time() >= self.deadline)
+
+    def track(self, connection):
+        with self._lock:
+            self._connections.add(connection)
+
+    def untrack(self, connection):
+        with self._lock:
+            self._connections.discard(connection)
+
+    @property
+    def active(self):
+        return len(self._connections)
+
+    def wait(self, active=None):
+        """Block until no connection is active or the deadline passes; True if everything finished.
+
+        active: callable jumlah koneksi yang masih dilayani, default koneksi dari track().
+        """
+        active = active or (lambda: self.active)
+        while active() and not self.expired():
+            time.sleep(0.1)
+        return self.report(active())
+
+    def report(self, remaining):
+        """Log the outcome of the drain; True if no connection was left unfinished"""
+        if remaining:
+            logging.warning(f"Drain deadline reached, closing {remaining} unfinished connections")
+            return False
+        logging.info("Drain complete, all transfers finished")
+        return True
+
+    def abort_remaining(self):
+        """Cut tracked connections still open after the deadline so their handlers end quickly"""
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,189 @@
+import base64
+import concurrent.futures
+import logging
+import os
+import random
+import socket
+import threading
+import time
+
+from buffered_reader import BufferedReader, TERMINATOR
+from client_protocol import decode_response
+from server_stats import HIST_BUCKETS, bucket_index, histogram_summary
+
+# Hasil satu request
+OK = 'ok'
+ERROR = 'error'
+BUSY = 'busy'
+TIMEOUT = 'timeout'
+
+
+def build_command(operation, filename=None):
+    """Protocol string for one open-loop request: list, download or upload"""
+    if operation == 'list':
+        return "LIST"
+    if operation == 'download':
+        return f"GET {os.path.basename(filename)}"
+    if operation == 'upload':
+        with open(filename, 'rb') as f:
+            content = base64.b64encode(f.read()).decode()
+        return f"UPLOAD {os.path.basename(filename)} {content}"
+    raise ValueError(f"unknown operation {operation}")
+
+
+def send_once(server_address, command_bytes, timeout):
+    """One attempt, no retries: open loop must not hide failures behind a retry.
+
+    command_bytes sudah termasuk terminator request.
+    """
+    try:
+        with socket.create_connection(server_address, timeout=timeout) as sock:
+            sock.sendall(command_bytes)
+            response = BufferedReader(sock).read_until()
+            if response is None:
+                return ERROR
+            # Cukup cek prefix status, body GET bisa besar
+            head = response[:32].tobytes()
+    except socket.timeout:
+        return TIMEOUT
+    except OSError as e:
+        logging.debug(f"Open-loop request error: {e}")
+        return ERROR
+    if head.startswith(b'{"status": "OK"'):
+        return OK
+    if head.startswith(b'{"status": "BUSY"'):
+        return BUSY
+    try:
+        status = decode_response(response).get('status')
+    finally:
+        response.release()
+    return OK if status == 'OK' else ERROR
+
+
+class OpenLoopLoadGenerator:
+    """Issue requests at a fixed offered rate, independent of how fast the server answers.
+
+    Berbeda dengan stress test closed-loop, request berikutnya tidak menunggu
+    response sebelumnya: jadwal kedatangan (poisson atau fixed) ditentukan di
+    depan. Latency dihitung dari waktu terjadwal, bukan waktu kirim, sehingga
+    antrian di sisi client (coordinated omission) ikut terukur.
+    """
+
+    def __init__(self, server_address=('localhost', 6666), operation='list', filename=None,
+                 arrival='poisson', timeout=10, max_outstanding=1000, seed=None):
+        self.server_address = server_address
+        self.operation = operation
+        self.filename = filename
+        self.arrival = arrival
+        self.timeout = timeout
+        self.max_outstanding = max_outstanding
+        self.random = random.Random(seed)
+        self.command_bytes = build_command(operation, filename).encode('utf-8') + TERMINATOR
+
+    def schedule(self, rate, duration):
+        """Offsets (seconds from start) of every request in the run"""
+        offsets = []
+        t = 0.0
+        while True:
+            t += self.random.expovariate(rate) if self.arrival == 'poisson' else 1.0 / rate
+            if t >= duration:
+                return offsets
+            offsets.append(t)
+
+    def run(self, rate, duration=30):
+        """Run one offered rate (requests/second) for `duration` seconds"""
+        offsets = self.schedule(rate, duration)
+        buckets = [0] * HIST_BUCKETS
+        total_us = [0.0]
+        outcomes = {OK: 0, ERROR: 0, BUSY: 0, TIMEOUT: 0}
+        lock = threading.Lock()
+        max_lag = 0.0
+
+        def one_request(scheduled):
+            outcome = send_once(self.server_address, self.command_bytes, self.timeout)
+            latency_us = (time.perf_counter() - scheduled) * 1e6
+            with lock:
+                outcomes[outcome] += 1
+                # Histogram hanya untuk request sukses; error/timeout dilaporkan sebagai rate
+                if outcome == OK:
+                    buckets[bucket_index(latency_us)] += 1
+                    total_us[0] += latency_us
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_outstanding)
+        start = time.perf_counter()
+        for offset in offsets:
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+            executor.submit(one_request, scheduled)
+        send_window = time.perf_counter() - start
+        executor.shutdown(wait=True)
+        elapsed = time.perf_counter() - start
+
+        sent = len(offsets)
+        return {
+            'operation': self.operation,
+            'arrival': self.arrival,
+            'offered_rps': rate,
+            'sent': sent,
+            'actual_offered_rps': sent / send_window if send_window > 0 else 0,
+            'achieved_rps': outcomes[OK] / elapsed if elapsed > 0 else 0,
+            'ok': outcomes[OK],
+            'errors': outcomes[ERROR] + outcomes[BUSY],
+            'busy': outcomes[BUSY],
+            'timeouts': outcomes[TIMEOUT],
+            'error_rate': (outcomes[ERROR] + outcomes[BUSY]) / sent if sent else 0,
+            'timeout_rate': outcomes[TIMEOUT] / sent if sent else 0,
+            'generator_lag_ms': max_lag * 1000,
+            'latency_ms': histogram_summary(buckets, total_us[0]),
+        }
+
+    def sweep(self, rates, duration=30, pause=2):
+        """Run several offered rates to find where achieved throughput stops following offered"""
+        results = []
+        for rate in rates:
+            print(f"Open loop {self.operation} at {rate} req/s for {duration}s ({self.arrival})...")
+            result = self.run(rate, duration)
+            print_open_loop_row(result)
+            results.append(result)
+            time.sleep(pause)
+        return results
+
+
+def _fmt_ms(summary, key):
+    return f"{summary[key]:.1f}" if key in summary else '-'
+
+
+def print_open_loop_row(result):
+    latency = result['latency_ms']
+    print(f"  offered={result['offered_rps']:.1f}/s achieved={result['achieved_rps']:.1f}/s "
+          f"p50={_fmt_ms(latency, 'p50')}ms p90={_fmt_ms(latency, 'p90')}ms p99={_fmt_ms(latency, 'p99')}ms "
+          f"p99.9={_fmt_ms(latency, 'p999')}ms errors={result['error_rate']:.1%} "
+          f"timeouts={result['timeout_rate']:.1%}")
+
+
+def print_open_loop_table(results):
+    """Offered vs achieved throughput and latency percentiles per rate"""
+    headers = ["offered_rps", "achieved_rps", "p50_ms", "p90_ms", "p99_ms", "p999_ms", "max_ms",
+               "error_rate", "timeout_rate", "sent"]
+    print("\n" + " | ".join(f"{h:<12}" for h in headers))
+    print("-" * (15 * len(headers)))
+    for r in results:
+        latency = r['latency_ms']
+        row = [f"{r['offered_rps']:.1f}", f"{r['achieved_rps']:.1f}", _fmt_ms(latency, 'p50'),
+               _fmt_ms(latency, 'p90'), _fmt_ms(latency, 'p99'), _fmt_ms(latency, 'p999'),
+               _fmt_ms(latency, 'max'), f"{r['error_rate']:.1%}", f"{r['timeout_rate']:.1%}", str(r['sent'])]
+        print(" | ".join(f"{c:<12}" for c in row))
+
+
+def find_knee(results, efficiency=0.9, max_failure_rate=0.01):
+    """First offered rate the server can no longer keep up with, or None"""
+    for r in results:
+        # Bandingkan dengan rate yang benar-benar dikirim, jadwal poisson tidak persis offered_rps
+        if (r['achieved_rps'] < efficiency * r['actual_offered_rps']
+                or r['error_rate'] + r['timeout_rate'] > max_failure_rate):
+            return r['offered_rps']
+    return None
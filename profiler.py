@@ -0,0 +1,318 @@
+import contextlib
+import cProfile
+import glob
+import logging
+import multiprocessing as mp
+import os
+import pstats
+import re
+import shutil
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+import types
+
+# cpu: stack sampler semua thread -> collapsed stacks (flamegraph.pl / speedscope)
+# cprofile: cProfile per request -> pstats
+# memory: tracemalloc snapshot -> top alokasi per baris + file snapshot
+MODES = ['cpu', 'cprofile', 'memory']
+MAX_SECONDS = 600
+_NULL = contextlib.nullcontext()
+
+
+def collapse_stack(frame):
+    """frame -> 'outer;...;inner' with one 'function (file:line)' entry per frame"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+
+class StackSampler(threading.Thread):
+    """Wall-clock sampler: snapshot the stack of every thread each `interval` seconds"""
+
+    def __init__(self, interval=0.005, thread_ids=None):
+        super().__init__(name='profiler-sampler', daemon=True)
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.counts = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        # Sampel pertama langsung, supaya request yang lebih pendek dari interval tetap tercatat
+        while True:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (self.thread_ids and ident not in self.thread_ids):
+                    continue
+                # worker-0..worker-N digabung jadi satu root 'worker'
+                name = re.sub(r'[-_]?\d+$', '', names.get(ident, 'thread'))
+                key = f"{name};{collapse_stack(frame)}"
+                self.counts[key] = self.counts.get(key, 0) + 1
+            if self._stop_event.wait(self.interval):
+                return
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.counts
+
+
+def write_collapsed(counts, path):
+    with open(path, 'w') as f:
+        for stack, n in sorted(counts.items()):
+            f.write(f"{stack} {n}\n")
+
+
+def write_memory_report(snapshots, path, limit=30):
+    """Top allocation sites (summed over snapshots) as text, largest snapshot dumped next to it"""
+    totals = {}
+    for snapshot in snapshots:
+        for stat in snapshot.statistics('lineno'):
+            key = str(stat.traceback)
+            size, count = totals.get(key, (0, 0))
+            totals[key] = (size + stat.size, count + stat.count)
+    top = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+    with open(path, 'w') as f:
+        f.write(f"Top {len(top)} allocation sites over {len(snapshots)} snapshot(s)\n")
+        for site, (size, count) in top:
+            f.write(f"{size / 1024:12.1f} KiB {count:8d} blocks  {site}\n")
+    if snapshots:
+        largest = max(snapshots, key=lambda s: sum(t.size for t in s.traces))
+        largest.dump(path.replace('-memory.txt', '.tracemalloc'))
+
+
+class ServerProfiler:
+    """On-demand profiling of the request path, started by PROFILE or SIGUSR1.
+
+    Ketika tidak aktif, request() hanya membandingkan satu float dengan jam,
+    tanpa thread atau hook tambahan.
+
+    Mode thread (file_server, ThreadPoolServer): sampler dan tracemalloc jalan
+    di process server, hasil ditulis oleh timer thread setelah N detik.
+    Mode shared (server_process_pool): state ada di shared memory, setiap
+    worker process memprofile request-nya sendiri dan menulis file parsial;
+    process utama menggabungkan lewat poll() setelah waktunya habis.
+    """
+
+    def __init__(self, output_dir='profiles', shared=False, interval=0.005):
+        self.output_dir = output_dir
+        self.shared = shared
+        self.interval = interval
+        if shared:
+            self._until = mp.Value('d', 0.0, lock=False)
+            self._mode = mp.Value('i', 0, lock=False)
+            self._session = mp.Value('d', 0.0, lock=False)
+            self._start_lock = mp.Lock()
+            self._merged_session = 0.0
+        else:
+            self._until = types.SimpleNamespace(value=0.0)
+            self._mode = types.SimpleNamespace(value=0)
+            self._session = types.SimpleNamespace(value=0.0)
+            self._start_lock = threading.Lock()
+            self._lock = threading.Lock()
+            self._sampler = None
+            self._stats = None
+            self._snapshot = None
+            self._snapshot_size = 0
+
+    @property
+    def active(self):
+        return self._until.value > time.time()
+
+    def output_path(self, mode, session):
+        stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(session))
+        base = os.path.join(self.output_dir, f"profile-{mode}-{stamp}")
+        return base + {'cpu': '.collapsed', 'cprofile': '.prof', 'memory': '-memory.txt'}[mode]
+
+    def _partial_dir(self, session):
+        return os.path.join(self.output_dir, f"partial-{int(session * 1000)}")
+
+    def start(self, seconds, mode='cpu'):
+        """Profile the next `seconds` of requests. Jangan logging di sini: dipanggil dari signal handler."""
+        if mode not in MODES:
+            raise ValueError(f"unknown profile mode {mode}, use one of {', '.join(MODES)}")
+        seconds = float(seconds)
+        if not 0 < seconds <= MAX_SECONDS:
+            raise ValueError(f"seconds must be between 0 and {MAX_SECONDS}")
+        with self._start_lock:
+            if self.active:
+                raise RuntimeError("profiling already running")
+            os.makedirs(self.output_dir, exist_ok=True)
+            session = time.time()
+            self._mode.value = MODES.index(mode)
+            self._session.value = session
+            if not self.shared:
+                self._start_local(mode, session + seconds)
+            self._until.value = session + seconds
+        return dict(mode=mode, seconds=seconds, output=self.output_path(mode, session))
+
+    def request(self):
+        """Context manager around one request; a shared no-op unless profiling is active"""
+        if self._until.value <= time.time():
+            return _NULL
+        mode = MODES[self._mode.value]
+        if self.shared:
+            return self._child_request(mode, self._session.value)
+        if mode == 'cprofile':
+            return self._cprofile_request()
+        if mode == 'memory':
+            return self._memory_request()
+        return _NULL  # cpu: sampler thread sudah melihat semua thread
+
+    # --- mode thread ---
+
+    def _start_local(self, mode, until):
+        self._stats = None
+        self._snapshot = None
+        self._snapshot_size = 0
+        if mode == 'cpu':
+            self._sampler = StackSampler(self.interval)
+            self._sampler.start()
+        elif mode == 'memory':
+            self._started_tracemalloc = not tracemalloc.is_tracing()
+            if self._started_tracemalloc:
+                tracemalloc.start(25)
+        timer = threading.Timer(until - time.time(), self._finish_local)
+        timer.daemon = True
+        timer.start()
+
+    @contextlib.contextmanager
+    def _cprofile_request(self):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(profile)
+                else:
+                    self._stats.add(profile)
+
+    @contextlib.contextmanager
+    def _memory_request(self):
+        try:
+            yield
+        finally:
+            # Snapshot saat buffer request masih hidup; simpan yang paling besar
+            if tracemalloc.is_tracing():
+                current = tracemalloc.get_traced_memory()[0]
+                with self._lock:
+                    if current > self._snapshot_size:
+                        self._snapshot_size = current
+                        self._snapshot = tracemalloc.take_snapshot()
+
+    def _finish_local(self):
+        mode = MODES[self._mode.value]
+        output = self.output_path(mode, self._session.value)
+        try:
+            if mode == 'cpu':
+                write_collapsed(self._sampler.stop(), output)
+                self._sampler = None
+            elif mode == 'cprofile':
+                if self._stats is None:
+                    logging.warning("Profiling finished without any samples")
+                    return
+                self._stats.dump_stats(output)
+            else:
+                snapshot = self._snapshot or tracemalloc.take_snapshot()
+                if self._started_tracemalloc:
+                    tracemalloc.stop()
+                write_memory_report([snapshot], output)
+            logging.info(f"Profile ({mode}) written to {output}")
+        except Exception as e:
+            logging.error(f"Error writing profile {output}: {e}")
+
+    # --- mode shared (worker process) ---
+
+    @contextlib.contextmanager
+    def _child_request(self, mode, session):
+        partial_dir = self._partial_dir(session)
+        os.makedirs(partial_dir, exist_ok=True)
+        name = os.path.join(partial_dir, f"{os.getpid()}-{time.monotonic_ns()}")
+        if mode == 'cprofile':
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                profile.dump_stats(name + '.prof')
+        elif mode == 'cpu':
+            sampler = StackSampler(self.interval, thread_ids={threading.get_ident()})
+            sampler.start()
+            try:
+                yield
+            finally:
+                write_collapsed(sampler.stop(), name + '.collapsed')
+        else:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start(25)
+            try:
+                yield
+            finally:
+                tracemalloc.take_snapshot().dump(name + '.tracemalloc')
+                if started:
+                    tracemalloc.stop()
+
+    def poll(self):
+        """Main process of the shared server: merge worker files once a session has ended"""
+        session = self._session.value
+        if not self.shared or not session or session == self._merged_session or self.active:
+            return None
+        self._merged_session = session
+        mode = MODES[self._mode.value]
+        output = self.output_path(mode, session)
+        partial_dir = self._partial_dir(session)
+        try:
+            if mode == 'cpu':
+                counts = {}
+                for path in glob.glob(os.path.join(partial_dir, '*.collapsed')):
+                    with open(path) as f:
+                        for line in f:
+                            stack, _, n = line.rstrip('\n').rpartition(' ')
+                            counts[stack] = counts.get(stack, 0) + int(n)
+                if not counts:
+                    logging.warning("Profiling finished without any samples")
+                    return None
+                write_collapsed(counts, output)
+            elif mode == 'cprofile':
+                files = glob.glob(os.path.join(partial_dir, '*.prof'))
+                if not files:
+                    logging.warning("Profiling finished without any samples")
+                    return None
+                pstats.Stats(*files).dump_stats(output)
+            else:
+                files = glob.glob(os.path.join(partial_dir, '*.tracemalloc'))
+                if not files:
+                    logging.warning("Profiling finished without any samples")
+                    return None
+                write_memory_report([tracemalloc.Snapshot.load(p) for p in files], output)
+            logging.info(f"Profile ({mode}) from worker processes written to {output}")
+            return output
+        except Exception as e:
+            logging.error(f"Error merging profile {output}: {e}")
+            return None
+        finally:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+
+    def install_signal_handler(self, seconds=30, mode='cpu', signum=getattr(signal, 'SIGUSR1', None)):
+        """kill -USR1 <pid> starts a profile of `seconds`. Must be called from the main thread."""
+        if signum is None or threading.current_thread() is not threading.main_thread():
+            return
+
+        def handler(signum, frame):
+            try:
+                self.start(seconds, mode)
+            except (RuntimeError, ValueError):
+                pass
+
+        signal.signal(signum, handler)
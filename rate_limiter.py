@@ -0,0 +1,156 @@
+import json
+import logging
+import multiprocessing as mp
+import threading
+import time
+import zlib
+
+_REQUESTS = 0
+_BYTES = 1
+# Seberapa sering bucket client yang sudah penuh lagi dibuang (mode thread, tanpa shared memory)
+EVICT_INTERVAL = 60.0
+
+
+class RateLimiter:
+    """Per-client-address token buckets for requests/second and bytes/second.
+
+    Bucket boleh "berhutang": request yang melebihi kuota tetap dilayani tapi
+    harus menunggu sampai hutangnya lunas. Dengan begitu transfer diperlambat
+    (paced), bukan diputus. None berarti tidak ada limit.
+
+    per_client memetakan IP client ke limit khusus, contoh:
+        {'10.0.0.5': {'requests_per_sec': 5, 'bytes_per_sec': 2 * 1024 * 1024}}
+
+    Dengan shared=True state bucket disimpan di shared memory (tabel slot
+    berdasarkan hash IP) supaya limit berlaku lintas worker process.
+    """
+
+    def __init__(self, requests_per_sec=None, bytes_per_sec=None, per_client=None,
+                 burst_seconds=1.0, shared=False, slots=256):
+        self.requests_per_sec = requests_per_sec
+        self.bytes_per_sec = bytes_per_sec
+        self.per_client = per_client or {}
+        self.burst_seconds = burst_seconds
+        self.shared = shared
+        self.slots = slots
+        if shared:
+            # Per slot: [tokens_req, last_req, tokens_bytes, last_bytes]
+            self._table = mp.Array('d', slots * 4, lock=False)
+            self._lock = mp.Lock()
+        else:
+            self._buckets = {}
+            self._lock = threading.Lock()
+            self._next_evict = time.monotonic() + EVICT_INTERVAL
+
+    @property
+    def enabled(self):
+        return bool(self.requests_per_sec or self.bytes_per_sec or self.per_client)
+
+    def limits_for(self, ip):
+        limits = self.per_client.get(ip, {})
+        return (limits.get('requests_per_sec', self.requests_per_sec),
+                limits.get('bytes_per_sec', self.bytes_per_sec))
+
+    def _state(self, ip, kind):
+        """Return (array, offset) holding [tokens, last_refill] for this bucket"""
+        if self.shared:
+            slot = zlib.crc32(ip.encode('utf-8')) % self.slots
+            return self._table, slot * 4 + kind * 2
+        key = (ip, kind)
+        if key not in self._buckets:
+            self._buckets[key] = [None, 0.0]
+        return self._buckets[key], 0
+
+    def _take(self, ip, kind, amount, rate):
+        """Take `amount` tokens and return how long the caller must sleep"""
+        burst = rate * self.burst_seconds
+        now = time.monotonic()
+        with self._lock:
+            state, i = self._state(ip, kind)
+            if not state[i + 1]:
+                # Bucket baru mulai penuh
+                tokens = burst
+            else:
+                tokens = min(burst, state[i] + (now - state[i + 1]) * rate)
+            tokens -= amount
+            state[i] = tokens
+            state[i + 1] = now
+            if not self.shared and now >= self._next_evict:
+                self._evict_idle(now)
+        return -tokens / rate if tokens < 0 else 0.0
+
+    def _evict_idle(self, now):
+        """Drop buckets that have refilled completely: a new bucket starts full, so nothing changes for the client"""
+        for key, state in list(self._buckets.items()):
+            ip, kind = key
+            rate = self.limits_for(ip)[kind]
+            if not rate or state[0] + (now - state[1]) * rate >= rate * self.burst_seconds:
+                del self._buckets[key]
+        self._next_evict = now + EVICT_INTERVAL
+
+    def request_delay(self, address):
+        """Take one request token; seconds the caller must wait (without sleeping, for event loops)"""
+        rate = self.limits_for(address[0])[0]
+        if not rate:
+            return 0.0
+        return self._take(address[0], _REQUESTS, 1, rate)
+
+    def bytes_delay(self, address, nbytes):
+        """Take nbytes tokens; seconds the caller must wait (without sleeping, for event loops)"""
+        rate = self.limits_for(address[0])[1]
+        if not rate or nbytes <= 0:
+            return 0.0
+        return self._take(address[0], _BYTES, nbytes, rate)
+
+    def acquire_request(self, address):
+        """Block until this client may start another request"""
+        wait = self.request_delay(address)
+        if wait > 0:
+            logging.debug(f"Request rate limit for {address[0]}, waiting {wait:.3f}s")
+            time.sleep(wait)
+        return wait
+
+    def acquire_bytes(self, address, nbytes):
+        """Pace a send or receive of nbytes for this client"""
+        wait = self.bytes_delay(address, nbytes)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def add_rate_limit_arguments(parser):
+    """--requests-per-sec, --bytes-per-sec and --client-limits for a server's argparse parser"""
+    parser.add_argument('--requests-per-sec', type=float,
+                        help="Limit request per detik per IP client (default: tanpa limit)")
+    parser.add_argument('--bytes-per-sec', type=float,
+                        help="Limit byte per detik per IP client, upload dan download (default: tanpa limit)")
+    parser.add_argument('--client-limits', metavar='JSON_FILE',
+                        help='Limit khusus per IP client, contoh isi file: '
+                             '{"10.0.0.5": {"requests_per_sec": 5, "bytes_per_sec": 2097152}}')
+
+
+def rate_limits_from_args(args):
+    """RateLimiter arguments (the servers' rate_limits) from add_rate_limit_arguments options"""
+    per_client = None
+    if args.client_limits:
+        with open(args.client_limits, encoding='utf-8') as f:
+            per_client = json.load(f)
+    return dict(requests_per_sec=args.requests_per_sec, bytes_per_sec=args.bytes_per_sec, per_client=per_client)
+
+
+if __name__ == '__main__':
+    limiter = RateLimiter(requests_per_sec=10, bytes_per_sec=1024 * 1024,
+                          per_client={'10.0.0.5': {'bytes_per_sec': 4 * 1024 * 1024}})
+    print("Testing RateLimiter:")
+    start = time.time()
+    for _ in range(30):
+        limiter.acquire_request(('127.0.0.1', 5000))
+    print(f"1. 30 requests at 10 req/s (burst 10): {time.time() - start:.2f}s")
+    start = time.time()
+    for _ in range(64):
+        limiter.acquire_bytes(('127.0.0.1', 5000), 32768)
+    print(f"2. 2MB at 1MB/s (burst 1MB): {time.time() - start:.2f}s")
+    start = time.time()
+    for _ in range(256):
+        limiter.acquire_bytes(('10.0.0.5', 5000), 32768)
+    print(f"3. 8MB for client with 4MB/s override: {time.time() - start:.2f}s")
@@ -0,0 +1,279 @@
+import collections
+import contextlib
+import json
+import logging
+import multiprocessing as mp
+import os
+import random
+import socket
+import threading
+import time
+
+from base64_stream import iter_base64_file
+from buffered_reader import BufferedReader, TERMINATOR
+from client_protocol import decode_response, encode_delete
+from shard_ring import node_name, parse_nodes
+
+# Timeout satu transfer ke replica
+REPLICATION_TIMEOUT = 120
+# Jeda sebelum mencoba lagi replica yang gagal, naik dua kali lipat sampai maksimal
+RETRY_INTERVAL = 1.0
+MAX_RETRY_INTERVAL = 30.0
+# Ruang shared memory untuk status replikasi (JSON) yang dibaca worker process
+FEED_STATUS_SIZE = 8192
+
+
+_version_lock = threading.Lock()
+_last_version = 0
+
+
+def file_version(stat_result):
+    """Version of a stored file: mtime in ns, sama di primary dan replica karena replica memakai mtime primary"""
+    return stat_result.st_mtime_ns
+
+
+def new_version():
+    """Version stamp for a new upload: the current time in ns, strictly increasing within this process.
+
+    mtime dari kernel memakai clock kasar (beberapa ms), dua upload ke nama
+    yang sama dalam satu tick bisa mendapat versi yang sama dan replica yang
+    tertinggal tidak terdeteksi. Stamp ini dipasang sendiri sebagai mtime.
+    """
+    global _last_version
+    with _version_lock:
+        _last_version = max(time.time_ns(), _last_version + 1)
+        return _last_version
+
+
+def send_replicate(node, filename, fp, version, timeout=REPLICATION_TIMEOUT):
+    """REPLICATE <filename> <version> + base64 body of open file `fp` to one replica; the response dict"""
+    with socket.create_connection(node, timeout=timeout) as sock:
+        sock.sendall(f"REPLICATE {filename} {version} ".encode('utf-8'))
+        for piece in iter_base64_file(fp):
+            sock.sendall(piece)
+        sock.sendall(TERMINATOR)
+        return _read_response(sock)
+
+
+def send_delete(node, filename, timeout=REPLICATION_TIMEOUT):
+    with socket.create_connection(node, timeout=timeout) as sock:
+        sock.sendall(encode_delete(filename) + TERMINATOR)
+        return _read_response(sock)
+
+
+def _read_response(sock):
+    message = BufferedReader(sock).read_until()
+    if message is None:
+        return {'status': 'ERROR', 'message': 'No response received'}
+    with message:
+        return decode_response(message)
+
+
+class _ReplicaQueue:
+    """Pending changes for one replica, one entry per file (a newer change replaces the queued one)"""
+
+    def __init__(self, node):
+        self.node = node
+        self.pending = collections.OrderedDict()  # filename -> waktu perubahan pertama yang belum terkirim
+        self.in_flight = None  # (filename, waktu) yang sedang dikirim
+        self.replicated = 0
+        self.failed = 0
+        self.last_error = None
+
+
+class Replicator:
+    """Push completed uploads and deletes from this (primary) server to its replica servers.
+
+    Dipanggil FileInterface setelah file selesai ditulis atau dihapus, lalu
+    dikirim di background oleh satu thread per replica, jadi response ke
+    client tidak menunggu replikasi. Yang dikirim selalu isi file saat ini
+    beserta versinya (mtime primary), replica menyimpannya dengan mtime yang
+    sama sehingga client bisa membandingkan versi dan menghindari baca basi.
+    Replica yang gagal dicoba lagi dengan backoff; lag = umur perubahan
+    tertua yang belum sampai.
+    """
+
+    def __init__(self, replicas, base_path='files', timeout=REPLICATION_TIMEOUT):
+        self.base_path = base_path
+        self.timeout = timeout
+        self.queues = [_ReplicaQueue(node) for node in parse_nodes(replicas)]
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+
+    def start(self):
+        self._running = True
+        for queue in self.queues:
+            thread = threading.Thread(target=self._run, args=(queue,), name=f"replicate-{node_name(queue.node)}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logging.info(f"Replicating to {', '.join(node_name(q.node) for q in self.queues)}")
+        return self
+
+    def stop(self, timeout=10.0):
+        """Give pending changes up to `timeout` seconds to reach the replicas, then stop the threads"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self.pending() and time.time() < deadline:
+                self._cond.wait(0.1)
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.time()))
+        if self.pending():
+            logging.warning(f"Stopped with {self.pending()} changes not replicated")
+
+    def file_changed(self, filename):
+        """A file was written (upload finished) or deleted; replicate its current state"""
+        now = time.time()
+        with self._cond:
+            for queue in self.queues:
+                # Perubahan yang masih antri cukup dikirim sekali, lag dihitung dari yang pertama
+                queue.pending.setdefault(filename, now)
+            self._cond.notify_all()
+
+    def pending(self):
+        return sum(len(q.pending) + (q.in_flight is not None) for q in self.queues)
+
+    def status(self):
+        """{replica: pending, lag_s, replicated, failed, last_error}; dipakai sebagai gauge STATS"""
+        now = time.time()
+        result = {}
+        with self._cond:
+            for queue in self.queues:
+                times = list(queue.pending.values())
+                if queue.in_flight:
+                    times.append(queue.in_flight[1])
+                result[node_name(queue.node)] = dict(
+                    pending=len(times), lag_s=round(now - min(times), 3) if times else 0.0,
+                    replicated=queue.replicated, failed=queue.failed, last_error=queue.last_error)
+        return result
+
+    def _run(self, queue):
+        retry = RETRY_INTERVAL
+        while True:
+            with self._cond:
+                while self._running and not queue.pending:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                filename, changed_at = queue.pending.popitem(last=False)
+                queue.in_flight = (filename, changed_at)
+            error = self._push(queue.node, filename)
+            with self._cond:
+                queue.in_flight = None
+                if error is None:
+                    queue.replicated += 1
+                    retry = RETRY_INTERVAL
+                else:
+                    queue.failed += 1
+                    queue.last_error = error
+                    # Coba lagi nanti, kecuali sudah ada perubahan baru untuk file yang sama
+                    if filename not in queue.pending:
+                        queue.pending[filename] = changed_at
+                        queue.pending.move_to_end(filename, last=False)
+                self._cond.notify_all()
+                if error is not None:
+                    logging.warning(f"Replication of {filename} to {node_name(queue.node)} failed: {error}, "
+                                    f"retrying in {retry:.0f}s")
+                    self._cond.wait(retry)
+                    retry = min(retry * 2, MAX_RETRY_INTERVAL)
+
+    def _push(self, node, filename):
+        """Send the current state of one file to one replica; None on success, else the error message"""
+        path = os.path.join(self.base_path, filename)
+        try:
+            try:
+                fp = open(path, 'rb')
+            except FileNotFoundError:
+                result = send_delete(node, filename, self.timeout)
+                # File yang memang belum pernah sampai ke replica juga dianggap beres
+                if result.get('status') == 'OK' or result.get('message') == 'File not found':
+                    return None
+            else:
+                with fp:
+                    # Versi dari file yang sama dengan isi yang dikirim, walaupun file ditimpa di tengah jalan
+                    result = send_replicate(node, filename, fp, file_version(os.fstat(fp.fileno())), self.timeout)
+                if result.get('status') == 'OK':
+                    return None
+            return result.get('message', 'Unknown error')
+        except OSError as e:
+            return str(e)
+
+
+class ReplicationFeed:
+    """Replicator stand-in for worker processes; the changes are replicated by the supervisor.
+
+    Replicator per worker bisa mengirim file yang sama ke replica bersamaan,
+    dan body versi lama bisa sampai paling akhir. Worker cukup melaporkan
+    nama file lewat pipe control-nya, satu Replicator di supervisor yang
+    mengirim, jadi perubahan satu file sampai di replica berurutan. Status
+    untuk STATS ditulis supervisor ke shared memory.
+    """
+
+    def __init__(self, status_size=FEED_STATUS_SIZE):
+        self._status = mp.Array('c', status_size)
+        self._control = None
+
+    def connect(self, control):
+        """Worker side: report changes over this worker's control pipe"""
+        self._control = control
+
+    def file_changed(self, filename):
+        self._control.send(('changed', filename))
+
+    def publish(self, status):
+        """Supervisor side: make the Replicator status visible to the workers"""
+        data = json.dumps(status).encode('utf-8')
+        if len(data) >= len(self._status):
+            data = json.dumps({'error': 'status too large'}).encode('utf-8')
+        self._status.value = data
+
+    def status(self):
+        return json.loads(self._status.value or b'{}')
+
+
+def feed_change(message, replicator):
+    """Pass a ('changed', filename) message from a worker to `replicator`; False for other messages"""
+    if not (isinstance(message, tuple) and message[0] == 'changed'):
+        return False
+    replicator.file_changed(message[1])
+    return True
+
+
+class LeastOutstanding:
+    """Pick the node with the fewest requests in flight from this client; ties are broken at random"""
+
+    def __init__(self, nodes):
+        self.nodes = parse_nodes(nodes)
+        self.outstanding = {node: 0 for node in self.nodes}
+        self._lock = threading.Lock()
+
+    def pick(self, exclude=()):
+        with self._lock:
+            candidates = [n for n in self.nodes if n not in exclude] or self.nodes
+            fewest = min(self.outstanding[n] for n in candidates)
+            node = random.choice([n for n in candidates if self.outstanding[n] == fewest])
+            self.outstanding[node] += 1
+            return node
+
+    def done(self, node):
+        with self._lock:
+            self.outstanding[node] -= 1
+
+    @contextlib.contextmanager
+    def use(self, exclude=()):
+        node = self.pick(exclude)
+        try:
+            yield node
+        finally:
+            self.done(node)
+
+
+if __name__ == '__main__':
+    balancer = LeastOutstanding('localhost:6666,localhost:6667,localhost:6668')
+    held = [balancer.pick() for _ in range(5)]
+    print("Outstanding after 5 picks:", {node_name(n): c for n, c in balancer.outstanding.items()})
+    for node in held:
+        balancer.done(node)
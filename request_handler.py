@@ -0,0 +1,211 @@
+import json
+import logging
+import socket
+import time
+
+from admission_control import send_busy
+from async_logging import hot_log, log_access
+from base64_stream import strip_noise
+from buffered_reader import (LEGACY_GRACE, TERMINATOR, UPLOAD_IDLE_END, BufferedReader, ReadAborted,
+                             read_request)
+
+# Dipakai semua engine server: terima satu request, jalankan, kirim response.
+# GET dan UPLOAD di-stream (base64 per potongan), jadi memory per koneksi
+# sebesar satu window, bukan sebesar file.
+
+SEND_CHUNK = 32768
+# Memory yang ditahan satu transfer streaming: buffer recv + satu blok base64
+STREAM_WINDOW = 512 * 1024
+UPLOAD_HEAD_LIMIT = 1024
+# Command dengan body base64 yang di-stream ke file, dengan jumlah parameter sebelum body:
+# UPLOAD <filename> <body>, REPLICATE <filename> <version> <body> (primary ke read replica)
+UPLOAD_COMMANDS = ((b'UPLOAD ', 1), (b'REPLICATE ', 2))
+
+
+def upload_head_length(data):
+    """Length of the 'UPLOAD <filename> ' (or 'REPLICATE <filename> <version> ') head at the start of data.
+
+    0 kalau bukan upload dengan body, None kalau perlu data lagi untuk memutuskan.
+    """
+    for prefix, params in UPLOAD_COMMANDS:
+        if not prefix.startswith(data[:len(prefix)].upper()):
+            continue
+        if len(data) < len(prefix):
+            return None
+        end = len(prefix) - 1
+        for _ in range(params):
+            end = data.find(b' ', end + 1)
+            if end < 0:
+                break
+        if end >= 0 and b'\r' not in data[:end]:
+            return end + 1
+        if b'\r' in data or len(data) >= UPLOAD_HEAD_LIMIT:
+            return 0  # upload tanpa body, biar proses_string yang menjawab
+        return None
+    return 0
+
+
+def read_upload_head(reader, on_data=None):
+    """'UPLOAD <filename>' if the request is an upload with a body, consuming it; None otherwise.
+
+    Tidak ada yang dikonsumsi kalau bukan UPLOAD, request tetap dibaca
+    utuh oleh read_request dari reader yang sama.
+    """
+    while True:
+        with reader.peek() as view:
+            data = view[:UPLOAD_HEAD_LIMIT].tobytes()
+        length = upload_head_length(data)
+        if length is None:
+            if not reader.buffered:
+                if reader.fill(on_data) == 0:
+                    return None
+            elif reader.eof or not reader.wait_data(LEGACY_GRACE, on_data):
+                return None  # 'UPLOAD <filename>' tanpa body dari client lama
+            continue
+        if not length:
+            return None
+        reader.read_exact(length).release()
+        return data[:length - 1].decode('utf-8', errors='replace')
+
+
+def send_pieces(connection, address, rate_limiter, pieces):
+    """Send response pieces plus terminator in paced chunks; returns (bytes sent, start of the response)"""
+    total_sent = 0
+    first = b""
+    for piece in pieces:
+        if not first:
+            first = bytes(piece[:32])
+        with memoryview(piece) as view:
+            for i in range(0, len(view), SEND_CHUNK):
+                chunk = view[i:i + SEND_CHUNK]
+                rate_limiter.acquire_bytes(address, len(chunk))
+                connection.sendall(chunk)
+                total_sent += len(chunk)
+    connection.sendall(TERMINATOR)
+    return total_sent + len(TERMINATOR), first.decode('utf-8', errors='replace')
+
+
+def _reject_busy(connection, address, admission, stats, needed):
+    logging.warning(f"Memory budget exhausted, sending BUSY to {address}")
+    send_busy(connection, admission.retry_after_ms(needed))
+    stats.request_rejected()
+
+
+def _handle_upload(connection, address, fp, head, reader, reservation, admission, rate_limiter, stats,
+                   started, receive_start):
+    """Decode the base64 body as it arrives into a temp file, answer once it is complete"""
+    if not reservation.grow(STREAM_WINDOW):
+        _reject_busy(connection, address, admission, stats, STREAM_WINDOW)
+        return
+    sink, error = fp.begin_upload(head)
+
+    def on_data(n):
+        rate_limiter.acquire_bytes(address, n)
+
+    body_length = 0
+    tail = None
+    try:
+        while True:
+            if (body_length and body_length % 4 == 0 and not reader.buffered
+                    and not reader.wait_data(UPLOAD_IDLE_END, on_data)):
+                break  # client lama tanpa terminator: diam setelah kelompok base64 utuh
+            chunk = reader.read_some(on_data)
+            if chunk is None:
+                break  # client menutup arah kirim tanpa terminator
+            with chunk:
+                data = chunk.tobytes()
+            # '\r' tidak ada di alfabet base64: awal terminator = akhir body
+            end = data.find(b'\r')
+            if end >= 0:
+                data, tail = data[:end], data[end:]
+            # Hanya karakter base64 yang dihitung: newline/spasi di body tidak menggeser kelompok 4 karakter
+            body_length += len(strip_noise(data))
+            if sink is not None:
+                sink.write(data)
+            if end >= 0:
+                break
+        if tail is not None:
+            reader.finish_terminator(tail, on_data)
+    except socket.timeout:
+        logging.warning(f"Timeout receiving incomplete upload from {address}")
+        if sink is not None:
+            sink.abort()
+        return
+    except BaseException:
+        if sink is not None:
+            sink.abort()
+        raise
+
+    receive_time = time.perf_counter() - receive_start
+    disk_start = time.perf_counter()
+    result = json.dumps(sink.finish()) if sink is not None else error
+    command, timings = fp.last_request_info()
+    timings = dict(timings, receive=receive_time, disk=time.perf_counter() - disk_start)
+
+    send_start = time.perf_counter()
+    total_sent, _ = send_pieces(connection, address, rate_limiter, [result.encode('utf-8')])
+    timings['send'] = time.perf_counter() - send_start
+    stats.record_request(command, result.startswith('{"status": "OK"'), reader.total_received, total_sent, timings)
+    log_access(address, head, result, reader.total_received, total_sent, started)
+
+
+def handle_request(connection, address, fp, reservation, admission, rate_limiter, stats, started):
+    """Receive one request from `connection`, run it on `fp` and send the response.
+
+    Memory budget: request yang di-buffer dihitung per recv, response GET dan
+    body UPLOAD yang di-stream hanya memesan STREAM_WINDOW. Semua byte masuk
+    dan keluar dibatasi rate_limiter.
+    """
+    receive_start = time.perf_counter()
+    reader = BufferedReader(connection)
+
+    def on_data(n):
+        # Setiap byte yang di-buffer dihitung terhadap memory budget
+        if not reservation.grow(n):
+            return False
+        rate_limiter.acquire_bytes(address, n)
+
+    try:
+        head = read_upload_head(reader, on_data)
+        if head is not None:
+            _handle_upload(connection, address, fp, head, reader, reservation, admission, rate_limiter,
+                           stats, started, receive_start)
+            return
+        command_str, received = read_request(connection, on_data, reader)
+    except ReadAborted:
+        _reject_busy(connection, address, admission, stats, reservation.reserved)
+        return
+    except socket.timeout:
+        logging.warning(f"Timeout receiving incomplete upload from {address}")
+        return
+    except UnicodeDecodeError as e:
+        logging.error(f"Unicode decode error from {address}: {e}")
+        connection.sendall(b'{"status": "ERROR", "message": "Invalid character encoding"}' + TERMINATOR)
+        return
+    if command_str is None:
+        return
+    receive_time = time.perf_counter() - receive_start
+    hot_log.info("Processing %d characters from %s", len(command_str), address)
+
+    # GET di-stream: cukup satu window; command lain dijawab dari memory
+    streamed = command_str.lstrip()[:4].upper() == 'GET '
+    needed = STREAM_WINDOW if streamed else fp.estimate_response_size(command_str)
+    if not reservation.grow(needed):
+        _reject_busy(connection, address, admission, stats, needed)
+        return
+
+    pieces = fp.response_stream(command_str) if streamed else None
+    if pieces is None:
+        pieces = [fp.proses_string(command_str).encode('utf-8')]
+    send_start = time.perf_counter()
+    total_sent, result = send_pieces(connection, address, rate_limiter, pieces)
+    send_time = time.perf_counter() - send_start
+    hot_log.info("Sent %d bytes response to %s", total_sent, address)
+
+    command, timings = fp.last_request_info()
+    timings = dict(timings, receive=receive_time, send=send_time)
+    if streamed:
+        # Encode berjalan bergantian dengan send, jangan dihitung dua kali
+        timings['send'] = max(0.0, send_time - timings.get('encode', 0.0))
+    stats.record_request(command, result.startswith('{"status": "OK"'), received, total_sent, timings)
+    log_access(address, command_str, result, received, total_sent, started)
@@ -0,0 +1,397 @@
+import collections
+import logging
+import select
+import selectors
+import socket
+import threading
+import time
+
+from request_handler import UPLOAD_COMMANDS
+
+# Request dengan perkiraan transfer di bawah ini masuk fast lane
+SMALL_REQUEST_THRESHOLD = 1024 * 1024  # 1MB
+
+LANE_SMALL = 'small'
+LANE_BULK = 'bulk'
+
+# Koneksi yang head request-nya belum datang ditahan HeadWaiter selama ini, lalu dianggap client lambat
+HEAD_WAIT_TIMEOUT = 1.0
+
+
+class SizeAwareScheduler:
+    """Worker pool with a small-request lane and a bulk-transfer lane.
+
+    `pool_size` general workers always take small requests first and only then
+    bulk transfers. `fast_lane_workers` extra workers only ever run small
+    requests, so LIST or a 1KB GET never waits behind 100MB transfers even when
+    every general worker is busy.
+    """
+
+    def __init__(self, pool_size=5, fast_lane_workers=1, name='worker'):
+        self.pool_size = pool_size
+        self.fast_lane_workers = fast_lane_workers
+        self.name = name
+        self._queues = {LANE_SMALL: collections.deque(), LANE_BULK: collections.deque()}
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._busy = 0
+        self._threads = []
+        # Worker umum yang harus berhenti (resize mengecil), diambil oleh worker yang sedang idle
+        self._retire = 0
+        self._next_id = pool_size
+        # Metrik untuk autoscaler, di-reset oleh take_metrics()
+        self._busy_general = 0
+        self._busy_seconds = 0.0
+        self._last_mark = self._metrics_since = time.time()
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._dequeued = 0
+
+        for i in range(pool_size):
+            self._start_worker(f"{name}-{i}", fast_lane_only=False)
+        for i in range(fast_lane_workers):
+            self._start_worker(f"{name}-fast-{i}", fast_lane_only=True)
+        logging.info(f"SizeAwareScheduler started: {pool_size} general + {fast_lane_workers} fast-lane workers")
+
+    def _start_worker(self, name, fast_lane_only):
+        t = threading.Thread(target=self._worker, args=(fast_lane_only,), name=name, daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def submit(self, fn, *args, lane=LANE_SMALL):
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new jobs after shutdown')
+            self._queues[lane].append((time.time(), fn, args))
+            self._cond.notify_all()
+
+    def _next_job(self, fast_lane_only):
+        if self._queues[LANE_SMALL]:
+            return self._queues[LANE_SMALL].popleft()
+        if not fast_lane_only and self._queues[LANE_BULK]:
+            return self._queues[LANE_BULK].popleft()
+        return None
+
+    def _mark(self, now):
+        # Integral jumlah worker umum yang sibuk terhadap waktu, untuk utilisasi
+        self._busy_seconds += self._busy_general * (now - self._last_mark)
+        self._last_mark = now
+
+    def _worker(self, fast_lane_only):
+        while True:
+            with self._cond:
+                job = None
+                while job is None:
+                    if not fast_lane_only and self._retire > 0:
+                        self._retire -= 1
+                        self._threads.remove(threading.current_thread())
+                        return
+                    job = self._next_job(fast_lane_only)
+                    if job is None:
+                        if self._shutdown:
+                            return
+                        self._cond.wait()
+                self._busy += 1
+                now = time.time()
+                wait = now - job[0]
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                self._dequeued += 1
+                if not fast_lane_only:
+                    self._mark(now)
+                    self._busy_general += 1
+
+            _, fn, args = job
+            try:
+                fn(*args)
+            except Exception as e:
+                logging.error(f"Scheduled job failed: {e}")
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    if not fast_lane_only:
+                        self._mark(time.time())
+                        self._busy_general -= 1
+
+    def resize(self, pool_size):
+        """Change the number of general workers; extra workers exit once they are idle"""
+        pool_size = max(1, pool_size)
+        with self._cond:
+            delta = pool_size - self.pool_size
+            self.pool_size = pool_size
+            if delta > 0:
+                # Batalkan dulu worker yang belum sempat berhenti
+                cancelled = min(self._retire, delta)
+                self._retire -= cancelled
+                for _ in range(delta - cancelled):
+                    self._start_worker(f"{self.name}-{self._next_id}", fast_lane_only=False)
+                    self._next_id += 1
+            elif delta < 0:
+                self._retire -= delta
+                self._cond.notify_all()
+
+    def take_metrics(self):
+        """Queue wait and utilization of the general workers since the previous call"""
+        with self._cond:
+            now = time.time()
+            self._mark(now)
+            elapsed = max(now - self._metrics_since, 1e-6)
+            queued = sum(len(q) for q in self._queues.values())
+            # Job yang masih antri juga sudah menunggu selama ini
+            oldest = min((q[0][0] for q in self._queues.values() if q), default=now)
+            metrics = dict(
+                workers=self.pool_size,
+                busy=self._busy_general,
+                queued=queued,
+                utilization=min(1.0, self._busy_seconds / (elapsed * self.pool_size)),
+                wait_avg=self._wait_total / self._dequeued if self._dequeued else 0.0,
+                wait_max=max(self._wait_max, now - oldest),
+            )
+            self._busy_seconds = self._wait_total = self._wait_max = 0.0
+            self._dequeued = 0
+            self._metrics_since = now
+            return metrics
+
+    def queue_depth(self):
+        with self._cond:
+            return {lane: len(q) for lane, q in self._queues.items()}
+
+    def shutdown(self, wait=True):
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            with self._cond:
+                threads = list(self._threads)
+            for t in threads:
+                t.join()
+
+
+class PoolAutoscaler(threading.Thread):
+    """Grow and shrink the general workers of a SizeAwareScheduler between min and max.
+
+    Setiap `interval` detik dilihat waktu tunggu di antrian, utilisasi worker
+    dan sisa memory budget AdmissionController:
+    - antrian menunggu lebih dari target_wait: tambah worker (maksimal dua kali lipat)
+    - transfer antri menunggu memory budget: tambah worker tidak membantu,
+      kurangi satu supaya transfer besar yang berjalan bersamaan berkurang
+    - utilisasi rendah selama idle_intervals: kurangi seperempat
+    Setiap keputusan ditulis ke log.
+    """
+
+    def __init__(self, scheduler, min_workers=1, max_workers=64, admission=None, interval=1.0,
+                 target_wait=0.05, low_utilization=0.3, min_headroom=0.1, idle_intervals=5):
+        super().__init__(name='autoscaler', daemon=True)
+        self.scheduler = scheduler
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.admission = admission
+        self.interval = interval
+        self.target_wait = target_wait
+        self.low_utilization = low_utilization
+        self.min_headroom = min_headroom
+        self.idle_intervals = idle_intervals
+        self._idle = 0
+        self._stop_event = threading.Event()
+        self.decisions = []  # (timestamp, dari, ke, alasan), untuk analisa setelah stress test
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.step()
+            except Exception as e:
+                logging.error(f"Autoscaler error: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+    def step(self):
+        metrics = self.scheduler.take_metrics()
+        current = self.scheduler.pool_size
+        target, reason = self.decide(metrics, current)
+        target = min(self.max_workers, max(self.min_workers, target))
+        if target != current:
+            logging.info(f"Autoscale {current} -> {target} workers: {reason}")
+            self.decisions.append((time.time(), current, target, reason))
+            self.scheduler.resize(target)
+            self._idle = 0
+        return target
+
+    def decide(self, metrics, current):
+        """(target worker count, reason) from one interval of metrics"""
+        headroom, waiting = 1.0, 0
+        if self.admission is not None:
+            snapshot = self.admission.snapshot()
+            headroom = 1.0 - snapshot['in_flight'] / max(snapshot['memory_budget'], 1)
+            waiting = snapshot['waiting']
+
+        summary = (f"queue wait max {metrics['wait_max'] * 1000:.0f}ms, {metrics['queued']} queued, "
+                   f"utilization {metrics['utilization']:.0%}, memory headroom {headroom:.0%}")
+        if waiting or headroom < self.min_headroom:
+            self._idle = 0
+            if waiting:
+                return current - 1, f"{waiting} transfers waiting for memory budget ({summary})"
+            return current, None
+
+        if metrics['wait_max'] > self.target_wait and metrics['queued']:
+            self._idle = 0
+            return current + max(1, min(metrics['queued'], current)), summary
+
+        if metrics['utilization'] < self.low_utilization and not metrics['queued']:
+            self._idle += 1
+            if self._idle >= self.idle_intervals:
+                return current - max(1, current // 4), f"idle for {self._idle} intervals ({summary})"
+        else:
+            self._idle = 0
+        return current, None
+
+
+def classify_connection(connection, fp, threshold=SMALL_REQUEST_THRESHOLD, peek_timeout=0.0):
+    """Peek at the request head (without consuming it) and pick a lane.
+
+    UPLOAD/REPLICATE and GET of a large file go to the bulk lane, everything else is small.
+    Returns None if the client has not sent anything yet: the caller hands the
+    connection to HeadWaiter instead of guessing a lane. Dipanggil di accept
+    thread, jadi secara default tidak menunggu sama sekali: setiap jeda di sini
+    menunda accept berikutnya.
+    """
+    try:
+        readable, _, _ = select.select([connection], [], [], peek_timeout)
+        if not readable:
+            return None
+        head = connection.recv(512, socket.MSG_PEEK)
+    except OSError:
+        return LANE_BULK
+
+    command = head[:16].lstrip().upper()
+    # Command dengan body yang di-stream (termasuk REPLICATE dari primary) selalu transfer besar
+    if command.startswith(tuple(prefix.strip() for prefix, _ in UPLOAD_COMMANDS)):
+        return LANE_BULK
+    if command.startswith(b'GET'):
+        estimate = fp.estimate_response_size(head.decode('utf-8', errors='ignore'))
+        return LANE_BULK if estimate >= threshold else LANE_SMALL
+    return LANE_SMALL
+
+
+class HeadWaiter(threading.Thread):
+    """Holds connections whose request has not arrived at accept time and queues them once it has.
+
+    Tanpa ini koneksi yang byte pertamanya terlambat beberapa mikrodetik harus
+    ditebak lane-nya: ditebak bulk berarti LIST antri di belakang transfer
+    100MB, ditebak small berarti client lambat bisa menduduki fast lane. Satu
+    thread dengan selector menunggu semua koneksi itu tanpa memakai worker;
+    begitu readable, koneksi diklasifikasi ulang dan di-submit ke lane-nya.
+    Koneksi yang tetap diam setelah `timeout` detik masuk bulk lane, di sana
+    worker menunggu dengan REQUEST_TIMEOUT seperti biasa.
+    """
+
+    def __init__(self, scheduler, fp, handler, threshold=SMALL_REQUEST_THRESHOLD, timeout=HEAD_WAIT_TIMEOUT):
+        super().__init__(name='head-waiter', daemon=True)
+        self.scheduler = scheduler
+        self.fp = fp
+        self.handler = handler
+        self.threshold = threshold
+        self.timeout = timeout
+        self._selector = selectors.DefaultSelector()
+        # socketpair untuk membangunkan select() saat ada koneksi baru atau stop()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._incoming = collections.deque()
+        self._running = True
+        # Jumlah koneksi yang pernah ditahan / yang akhirnya masuk bulk karena diam (untuk log)
+        self.held = 0
+        self.expired = 0
+
+    def add(self, connection, address):
+        self._incoming.append((connection, address))
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'x')
+        except OSError:
+            # Buffer penuh: select() sudah pasti terbangun
+            pass
+
+    def stop(self):
+        self._running = False
+        self._wake()
+
+    def _release(self, connection, address, lane):
+        self._selector.unregister(connection)
+        try:
+            self.scheduler.submit(self.handler, connection, address, lane=lane)
+        except RuntimeError:
+            # Scheduler sudah shutdown
+            connection.close()
+
+    def run(self):
+        deadlines = {}
+        while self._running:
+            now = time.monotonic()
+            wait = max(0.0, min(deadline for deadline, _ in deadlines.values()) - now) if deadlines else None
+            for key, _ in self._selector.select(wait):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                connection = key.fileobj
+                _, address = deadlines.pop(connection)
+                lane = classify_connection(connection, self.fp, self.threshold) or LANE_BULK
+                self._release(connection, address, lane)
+
+            now = time.monotonic()
+            while self._incoming:
+                connection, address = self._incoming.popleft()
+                self.held += 1
+                try:
+                    self._selector.register(connection, selectors.EVENT_READ)
+                except (ValueError, OSError):
+                    # Koneksi sudah ditutup
+                    connection.close()
+                    continue
+                deadlines[connection] = (now + self.timeout, address)
+
+            for connection, (deadline, address) in list(deadlines.items()):
+                if deadline <= now:
+                    del deadlines[connection]
+                    self.expired += 1
+                    self._release(connection, address, LANE_BULK)
+
+        # stop(): sisa koneksi tetap dilayani oleh worker bulk
+        for connection, (_, address) in deadlines.items():
+            self._release(connection, address, LANE_BULK)
+        self._selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
+
+if __name__ == '__main__':
+    scheduler = SizeAwareScheduler(pool_size=1, fast_lane_workers=1)
+    done = []
+    print("Testing SizeAwareScheduler:")
+    scheduler.submit(time.sleep, 0.5, lane=LANE_BULK)
+    scheduler.submit(time.sleep, 0.5, lane=LANE_BULK)
+    t0 = time.time()
+    scheduler.submit(lambda: done.append(time.time() - t0), lane=LANE_SMALL)
+    time.sleep(0.1)
+    print("1. Small job latency behind bulk jobs:", f"{done[0]:.3f}s" if done else "not finished")
+    print("2. Queue depth:", scheduler.queue_depth())
+    scheduler.shutdown(wait=True)
+
+    print("3. Autoscaling 1..8 workers with 20 jobs of 0.2s:")
+    scheduler = SizeAwareScheduler(pool_size=1, fast_lane_workers=0)
+    autoscaler = PoolAutoscaler(scheduler, min_workers=1, max_workers=8, interval=0.1, idle_intervals=3)
+    autoscaler.start()
+    for _ in range(20):
+        scheduler.submit(time.sleep, 0.2, lane=LANE_BULK)
+    time.sleep(2)
+    autoscaler.stop()
+    for _, old, new, reason in autoscaler.decisions:
+        print(f"   {old} -> {new}: {reason}")
+    scheduler.shutdown(wait=True)
@@ -0,0 +1,289 @@
+import logging
+import os
+import threading
+import time
+
+_CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def _stat_fields(pid):
+    """Fields of /proc/<pid>/stat after the command name (index 0 = state)"""
+    data = _read(f"/proc/{pid}/stat")
+    # Nama command bisa mengandung spasi/kurung, ambil setelah ')' terakhir
+    return data[data.rindex(')') + 2:].split()
+
+
+def children_of(pid):
+    """Direct and indirect child pids (e.g. worker processes of the multiprocessing server)"""
+    by_parent = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            ppid = int(_stat_fields(entry)[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        by_parent.setdefault(ppid, []).append(int(entry))
+    found = []
+    pending = [pid]
+    while pending:
+        for child in by_parent.get(pending.pop(), []):
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+def fd_limit(pid):
+    """Soft limit on open files of a process, None if unknown"""
+    try:
+        for line in _read(f"/proc/{pid}/limits").splitlines():
+            if line.startswith('Max open files'):
+                soft = line.split()[3]
+                return None if soft == 'unlimited' else int(soft)
+    except OSError:
+        pass
+    return None
+
+
+def process_rss(pid):
+    """Resident set size of a process in bytes (cheap: one read of /proc/<pid>/statm)"""
+    return int(_read(f"/proc/{pid}/statm").split()[1]) * _PAGE_SIZE
+
+
+def process_pss(pid):
+    """Proportional set size in bytes (shared pages split among their sharers), None if unavailable.
+
+    RSS parent dan worker hasil fork yang dijumlahkan menghitung halaman
+    bersama berkali-kali; jumlah PSS tidak. smaps_rollup ada sejak Linux 4.14.
+    """
+    try:
+        for line in _read(f"/proc/{pid}/smaps_rollup").splitlines():
+            if line.startswith('Pss:'):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def thread_context_switches(pid):
+    """{tid: (voluntary, involuntary)} for the live threads of a process.
+
+    /proc/<pid>/status hanya berisi context switch thread utama; thread yang
+    sudah selesai tidak terlihat sama sekali di /proc (lihat ResourceMonitor).
+    """
+    switches = {}
+    for tid in os.listdir(f"/proc/{pid}/task"):
+        voluntary = involuntary = 0
+        try:
+            for line in _read(f"/proc/{pid}/task/{tid}/status").splitlines():
+                if line.startswith('voluntary_ctxt_switches'):
+                    voluntary = int(line.split()[1])
+                elif line.startswith('nonvoluntary_ctxt_switches'):
+                    involuntary = int(line.split()[1])
+        except OSError:
+            continue
+        switches[int(tid)] = (voluntary, involuntary)
+    return switches
+
+
+def sample_process(pid, include_reaped=False, pss=True):
+    """One /proc reading of a single process: rss, pss, cpu, fds, threads, context switches per thread.
+
+    pss=False melewati smaps_rollup (mahal untuk process besar); 'pss' berisi None.
+    """
+    fields = _stat_fields(pid)
+    # Index relatif terhadap field ke-3 (state) pada proc(5): utime=14, stime=15, cutime=16,
+    # cstime=17, num_threads=20, rss=24
+    cpu_ticks = int(fields[11]) + int(fields[12])
+    if include_reaped:
+        # CPU child process yang sudah selesai dan di-wait (worker multiprocessing)
+        cpu_ticks += int(fields[13]) + int(fields[14])
+    sample = dict(
+        rss=int(fields[21]) * _PAGE_SIZE,
+        cpu=cpu_ticks / _CLK_TCK,
+        threads=int(fields[17]),
+        fds=len(os.listdir(f"/proc/{pid}/fd")),
+        pss=None,
+        switches=thread_context_switches(pid),
+    )
+    if pss:
+        value = process_pss(pid)
+        sample['pss'] = sample['rss'] if value is None else value
+    return sample
+
+
+class ResourceMonitor(threading.Thread):
+    """Sample a server process tree from /proc every `interval` seconds.
+
+    Dipakai stress test untuk melihat apakah kegagalan disebabkan memory,
+    habisnya file descriptor, atau batas jumlah process. Hanya berfungsi
+    kalau server jalan di mesin yang sama (Linux /proc).
+
+    rss_mb menjumlahkan RSS semua process, jadi halaman yang dibagi worker
+    hasil fork terhitung berkali-kali (batas atas); pss_mb adalah pemakaian
+    memory sebenarnya (sama dengan RSS kalau smaps_rollup tidak tersedia).
+    PSS dibaca setiap pss_interval detik saja: smaps_rollup berjalan di
+    seluruh page table process, jauh lebih mahal dari stat.
+
+    Context switch thread yang sudah selesai hilang dari /proc. Kolom ctx_*
+    menyimpan hitungan terakhir thread yang sempat terlihat, tapi thread
+    per koneksi yang lebih singkat dari `interval` tidak pernah terlihat.
+    Karena itu total ctx_switches di stop() memakai server_counts (kalau
+    ada): callable yang mengembalikan counter kumulatif process server sendiri
+    (getrusage, termasuk thread yang sudah selesai dan child yang sudah
+    di-reap, lihat context_switches di STATS), ditambah child yang masih
+    hidup dari /proc.
+    """
+
+    FIELDS = ['t', 'rss_mb', 'cpu_s', 'fds', 'threads', 'processes', 'ctx_voluntary', 'ctx_involuntary', 'pss_mb']
+
+    def __init__(self, pid, interval=0.1, include_children=True, pss_interval=1.0, server_counts=None):
+        super().__init__(name='resource-monitor', daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.include_children = include_children
+        self.pss_interval = pss_interval
+        self.server_counts = server_counts
+        self.samples = []
+        self._stop_event = threading.Event()
+        self._pss = {}
+        self._pss_at = None
+        # Context switch per thread yang terakhir terlihat ({pid: {tid: counts}}) dan total thread selesai per pid
+        self._threads = {}
+        self._exited = {}
+        # Total context switch child process saja (pertama/terakhir), untuk digabung dengan server_counts
+        self._children_ctx = []
+
+    @staticmethod
+    def available(pid):
+        return pid is not None and os.path.exists(f"/proc/{pid}/stat")
+
+    def _switches(self, pid, switches):
+        """(voluntary, involuntary) of a process including its threads that exited since they were seen"""
+        exited = self._exited.get(pid, (0, 0))
+        for tid, counts in self._threads.get(pid, {}).items():
+            now = switches.get(tid)
+            # tid yang hilang (atau dipakai ulang thread baru dengan hitungan lebih kecil) = thread selesai
+            if now is None or now[0] < counts[0] or now[1] < counts[1]:
+                exited = (exited[0] + counts[0], exited[1] + counts[1])
+        self._exited[pid] = exited
+        self._threads[pid] = switches
+        return (exited[0] + sum(v for v, _ in switches.values()),
+                exited[1] + sum(i for _, i in switches.values()))
+
+    def sample(self):
+        now = time.time()
+        read_pss = self._pss_at is None or now - self._pss_at >= self.pss_interval
+        if read_pss:
+            self._pss_at = now
+        pids = [self.pid] + (children_of(self.pid) if self.include_children else [])
+        alive = set()
+        total = dict(rss=0, cpu=0.0, threads=0, fds=0, pss=0)
+        ctx = [0, 0]
+        children_ctx = [0, 0]
+        processes = 0
+        for pid in pids:
+            try:
+                sample = sample_process(pid, include_reaped=pid == self.pid, pss=read_pss)
+            except (OSError, ValueError, IndexError):
+                if pid == self.pid:
+                    raise
+                continue  # process selesai di tengah pembacaan
+            processes += 1
+            alive.add(pid)
+            for key in ('rss', 'cpu', 'threads', 'fds'):
+                total[key] += sample[key]
+            if read_pss:
+                self._pss[pid] = sample['pss']
+            total['pss'] += self._pss.get(pid, sample['rss'])
+            voluntary, involuntary = self._switches(pid, sample['switches'])
+            ctx[0] += voluntary
+            ctx[1] += involuntary
+            if pid != self.pid:
+                children_ctx[0] += voluntary
+                children_ctx[1] += involuntary
+        # Process yang sudah selesai: hitungannya masuk getrusage parent-nya (server_counts)
+        self._threads = {pid: counts for pid, counts in self._threads.items() if pid in alive}
+        self._exited = {pid: counts for pid, counts in self._exited.items() if pid in alive}
+        self._pss = {pid: value for pid, value in self._pss.items() if pid in alive}
+        self._children_ctx = [self._children_ctx[0] if self._children_ctx else children_ctx, children_ctx]
+        return [round(now - self.started, 3), round(total['rss'] / (1024 * 1024), 1),
+                round(total['cpu'], 2), total['fds'], total['threads'], processes,
+                ctx[0], ctx[1], round(total['pss'] / (1024 * 1024), 1)]
+
+    def _server_counts(self):
+        if not self.server_counts:
+            return None
+        try:
+            return self.server_counts()
+        except Exception as e:
+            logging.warning(f"Resource monitor cannot read server context switches: {e}")
+            return None
+
+    def run(self):
+        while True:
+            try:
+                self.samples.append(self.sample())
+            except (OSError, ValueError, IndexError) as e:
+                logging.warning(f"Resource monitor stopped, server pid {self.pid} unreadable: {e}")
+                return
+            if self._stop_event.wait(self.interval):
+                return
+
+    def start(self):
+        self.started = time.time()
+        self.fd_limit = fd_limit(self.pid)
+        self.server_before = self._server_counts()
+        super().start()
+        return self
+
+    def stop(self):
+        """Stop sampling and return peaks, deltas and the time series"""
+        self._stop_event.set()
+        self.join()
+        if not self.samples:
+            return None
+        server_after = self._server_counts()
+        first, last = self.samples[0], self.samples[-1]
+        column = {name: [s[i] for s in self.samples] for i, name in enumerate(self.FIELDS)}
+        elapsed = last[0] - first[0]
+        cpu_s = last[2] - first[2]
+        return dict(
+            peak_rss_mb=max(column['rss_mb']),
+            peak_pss_mb=max(column['pss_mb']),
+            peak_fds=max(column['fds']),
+            fd_limit=self.fd_limit,
+            peak_threads=max(column['threads']),
+            peak_processes=max(column['processes']),
+            cpu_s=round(cpu_s, 2),
+            cpu_percent=round(cpu_s / elapsed * 100, 1) if elapsed > 0 else 0.0,
+            ctx_switches=self._ctx_delta(first, last, server_after),
+            ctx_source='getrusage' if self.server_before and server_after else 'proc',
+            interval=self.interval,
+            fields=self.FIELDS,
+            series=self.samples,
+        )
+
+    def _ctx_delta(self, first, last, server_after):
+        """Context switches of the whole server tree during the run"""
+        if self.server_before and server_after:
+            # Process server (termasuk thread selesai dan child yang di-reap) + child yang masih hidup
+            before, after = self._children_ctx
+            return max(0, sum(server_after) - sum(self.server_before) + sum(after) - sum(before))
+        # Tanpa counter dari server: hanya thread yang sempat terlihat di /proc (batas bawah)
+        return max(0, (last[6] + last[7]) - (first[6] + first[7]))
+
+
+if __name__ == '__main__':
+    import sys
+    pid = int(sys.argv[1]) if len(sys.argv) > 1 else os.getpid()
+    monitor = ResourceMonitor(pid).start()
+    time.sleep(2)
+    summary = monitor.stop()
+    print({k: v for k, v in summary.items() if k != 'series'})
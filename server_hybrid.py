@@ -0,0 +1,589 @@
+import argparse
+import asyncio
+import binascii
+import concurrent.futures
+import gc
+import json
+import logging
+import os
+import signal
+import socket
+import time
+import zlib
+from multiprocessing import shared_memory
+
+from admission_control import DEFAULT_MEMORY_BUDGET, AdmissionController, busy_response
+from async_logging import hot_log, log_access, setup_async_logging, stop_async_logging
+from base64_stream import strip_noise
+from buffered_reader import LEGACY_GRACE, REQUEST_TIMEOUT, TERMINATOR, UPLOAD_IDLE_END, AsyncBufferedReader, ReadAborted
+from file_protocol import FileProtocol, ENVELOPE_TAIL, envelope_head
+from graceful_restart import DRAIN_POLL, DRAIN_TIMEOUT, DrainController, notify_ready, open_listener
+from profiler import ServerProfiler
+from rate_limiter import RateLimiter, add_rate_limit_arguments, rate_limits_from_args
+from durability import DURABILITY_LEVELS, GROUP_COMMIT_WINDOW, make_durability
+from replication import Replicator
+from request_handler import SEND_CHUNK, UPLOAD_HEAD_LIMIT, upload_head_length
+from server_stats import ServerStats
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Satu job encoder: kelipatan 3 (encode) dan 4 (decode) supaya blok bisa disambung
+CODEC_BLOCK = 12 * 65536  # 768KB
+
+
+# --- Dijalankan di encoder process. Data lewat shared memory, yang di-pickle hanya offset ---
+
+_attached = {}
+
+def _init_encoder():
+    # Ctrl+C ditangani process utama, yang menutup pool dengan rapi
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _shared_buffer(name):
+    """Buffer of a segment created by the server, attached once per encoder process"""
+    segment = _attached.get(name)
+    if segment is None:
+        segment = _attached[name] = shared_memory.SharedMemory(name=name)
+    return segment.buf
+
+def encode_block(name, offset, length, out_offset):
+    """base64 of `length` bytes at offset, written at out_offset; returns (bytes written, seconds)"""
+    started = time.perf_counter()
+    buf = _shared_buffer(name)
+    out = binascii.b2a_base64(buf[offset:offset + length], newline=False)
+    buf[out_offset:out_offset + len(out)] = out
+    return len(out), time.perf_counter() - started
+
+def decode_block(name, offset, length, out_offset):
+    """Decode `length` base64 characters at offset into out_offset; returns (bytes written, seconds)"""
+    started = time.perf_counter()
+    buf = _shared_buffer(name)
+    out = binascii.a2b_base64(buf[offset:offset + length])
+    buf[out_offset:out_offset + len(out)] = out
+    return len(out), time.perf_counter() - started
+
+def checksum_block(name, offset, length, value):
+    """CRC32 of `length` bytes at offset, continuing from `value`; returns (crc32, seconds)"""
+    started = time.perf_counter()
+    value = zlib.crc32(_shared_buffer(name)[offset:offset + length], value)
+    return value, time.perf_counter() - started
+
+
+class CodecBuffers:
+    """Shared memory segments between the event loop and the encoder processes.
+
+    Setiap segment punya dua bagian (input + output) untuk double buffering:
+    selagi worker meng-encode satu blok, blok sebelumnya dikirim ke socket
+    (atau ditulis ke disk untuk UPLOAD). Satu transfer besar memegang satu
+    segment, jadi jumlah segment membatasi transfer yang berjalan bersamaan.
+    """
+
+    def __init__(self, count, block=CODEC_BLOCK):
+        self.block = block
+        self.half = block + block * 4 // 3
+        self.segment_size = 2 * self.half
+        self.segments = [shared_memory.SharedMemory(create=True, size=self.segment_size) for _ in range(count)]
+        self.free = asyncio.Queue()
+        for segment in self.segments:
+            self.free.put_nowait(segment)
+        self.waiting = 0
+
+    def offsets(self, half):
+        """(input offset, output offset) of half 0 or 1 of a segment"""
+        base = half * self.half
+        return base, base + self.block
+
+    async def acquire(self, timeout):
+        self.waiting += 1
+        try:
+            return await asyncio.wait_for(self.free.get(), timeout)
+        finally:
+            self.waiting -= 1
+
+    def release(self, segment):
+        self.free.put_nowait(segment)
+
+    def close(self):
+        # View dari transfer yang dibatalkan bisa masih tertahan di traceback (siklus referensi)
+        gc.collect()
+        for segment in self.segments:
+            try:
+                segment.close()
+            except BufferError:
+                pass  # masih ada view dari transfer yang dibatalkan, unlink tetap jalan
+            segment.unlink()
+
+
+class HybridServer:
+    """One event loop owns every socket; base64 and checksums run in a pool of encoder processes.
+
+    Koneksi murah seperti server asyncio (tidak ada thread/process per
+    koneksi), tapi encode/decode base64 dan CRC32 upload file besar tidak
+    memegang GIL event loop dan bisa memakai semua core. Kompresi tidak
+    ada di protokol, jadi tidak ada yang perlu di-offload untuk itu.
+    Command kecil (LIST, DELETE, STATS) dijalankan di thread executor
+    default karena menyentuh disk.
+    """
+
+    def __init__(self, ipaddress='0.0.0.0', port=6666, pool_size=None, memory_budget=None, rate_limits=None,
+                 buffers=None, drain_timeout=DRAIN_TIMEOUT, replicas=None,
+                 durability='none', group_commit_window=GROUP_COMMIT_WINDOW):
+        self.ipinfo = (ipaddress, port)
+        self.pool_size = pool_size or os.cpu_count() or 1
+        if memory_budget:
+            self.admission = AdmissionController(memory_budget=memory_budget)
+        else:
+            self.admission = AdmissionController()
+        self.rate_limiter = RateLimiter(**(rate_limits or {}))
+        self.stats = ServerStats()
+        self.stats.set_info('engine', 'hybrid')
+        self.stats.set_info('pool_size', self.pool_size)
+        self.profiler = ServerProfiler()
+        # Primary dengan read replica: upload/delete yang selesai dikirim ke replica di background
+        self.replicator = Replicator(replicas).start() if replicas else None
+        if self.replicator:
+            self.stats.add_gauge_provider('replication', self.replicator.status)
+        self.durability = make_durability(durability, group_commit_window)
+        self.stats.add_gauge_provider('durability', self.durability.status)
+        self.fp = FileProtocol(stats=self.stats, profiler=self.profiler, replicator=self.replicator,
+                               durability=self.durability)
+        # Dua segment per encoder: cukup untuk membuat semua worker sibuk
+        self.buffers = CodecBuffers(buffers or 2 * self.pool_size)
+        self.encoders = concurrent.futures.ProcessPoolExecutor(max_workers=self.pool_size,
+                                                               initializer=_init_encoder)
+        # Fork encoder sekarang, sebelum event loop berjalan
+        self.encoders.submit(os.getpid).result()
+        self.stats.add_gauge_provider('workers', lambda: self.pool_size)
+        self.stats.add_gauge_provider('queue_depth', lambda: self.buffers.waiting)
+        self.clients = set()
+        self.drain = DrainController(drain_timeout)
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            logging.info("Server shutdown requested")
+        except Exception as e:
+            logging.error(f"Server error: {e}")
+        finally:
+            self.cleanup()
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        # SIGTERM/SIGINT: drain, SIGHUP: hot restart
+        self.drain.install_signal_handlers(loop)
+        listener = open_listener(self.ipinfo, 128)
+        try:
+            listener.setblocking(False)
+            self.profiler.install_signal_handler()
+            logging.info(f"Hybrid Server running on {self.ipinfo} with {self.pool_size} encoder processes")
+
+            acceptor = asyncio.create_task(self.accept_loop(listener))
+            notify_ready()
+            # check() bisa menunggu server pengganti start, jangan sampai menahan event loop
+            while await loop.run_in_executor(None, self.drain.check, listener):
+                await asyncio.sleep(DRAIN_POLL)
+            acceptor.cancel()
+            await asyncio.gather(acceptor, return_exceptions=True)
+            # Koneksi baru ditangani server pengganti (hot restart) atau ditolak
+            listener.close()
+            while self.clients and not self.drain.expired():
+                await asyncio.wait(list(self.clients), timeout=0.1)
+            self.drain.report(len(self.clients))
+            for task in list(self.clients):
+                task.cancel()
+            await asyncio.gather(*self.clients, return_exceptions=True)
+        finally:
+            listener.close()
+
+    async def accept_loop(self, listener):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                connection, address = await loop.sock_accept(listener)
+            except OSError as e:
+                # Misalnya EMFILE: tunggu sebentar, koneksi lain mungkin sedang ditutup
+                logging.error(f"Accept error: {e}")
+                await asyncio.sleep(0.1)
+                continue
+            hot_log.info("New connection from %s", address)
+            connection.setblocking(False)
+            task = asyncio.create_task(self.handle_client(connection, address))
+            self.clients.add(task)
+            task.add_done_callback(self.clients.discard)
+
+    async def handle_client(self, connection, address):
+        reservation = self.admission.reservation()
+        started = time.time()
+        self.stats.connection_opened()
+        try:
+            wait = self.rate_limiter.request_delay(address)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self.handle_request(connection, address, reservation, started)
+        except Exception as e:
+            logging.error(f"Error handling client {address}: {e}")
+        finally:
+            reservation.release()
+            self.stats.connection_closed()
+            connection.close()
+            hot_log.info("Connection with %s closed", address)
+
+    async def _send(self, connection, address, data):
+        """Send data (paced per SEND_CHUNK when rate limited); returns the number of bytes"""
+        loop = asyncio.get_running_loop()
+        view = memoryview(data)
+        step = SEND_CHUNK if self.rate_limiter.enabled else max(len(view), 1)
+        for i in range(0, len(view), step):
+            chunk = view[i:i + step]
+            wait = self.rate_limiter.bytes_delay(address, len(chunk))
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await asyncio.wait_for(loop.sock_sendall(connection, chunk), REQUEST_TIMEOUT)
+        return len(view)
+
+    async def _reject_busy(self, connection, address, needed):
+        logging.warning(f"Memory budget exhausted, sending BUSY to {address}")
+        response = busy_response(self.admission.retry_after_ms(needed)) + "\r\n\r\n"
+        try:
+            await self._send(connection, address, response.encode('utf-8'))
+            connection.shutdown(socket.SHUT_WR)
+        except (OSError, asyncio.TimeoutError) as e:
+            logging.warning(f"Failed to send BUSY reply: {e}")
+        self.stats.request_rejected()
+
+    async def _read_head(self, reader, on_data):
+        """('UPLOAD <filename>', None) for an upload with a body, otherwise (None, request message)"""
+        while True:
+            with reader.peek() as view:
+                data = view[:UPLOAD_HEAD_LIMIT].tobytes()
+            length = upload_head_length(data)
+            if length is None:
+                if not reader.buffered:
+                    if await reader.fill(on_data) == 0:
+                        break
+                elif reader.eof or not await reader.wait_data(LEGACY_GRACE, on_data):
+                    break  # 'UPLOAD <filename>' tanpa body dari client lama
+                continue
+            if length:
+                (await reader.read_exact(length)).release()
+                return data[:length - 1].decode('utf-8', errors='replace'), None
+            break
+        return None, await reader.read_command(on_data)
+
+    async def handle_request(self, connection, address, reservation, started):
+        loop = asyncio.get_running_loop()
+        receive_start = time.perf_counter()
+        reader = AsyncBufferedReader(connection, loop)
+        debt = 0.0
+
+        def on_data(n):
+            nonlocal debt
+            # Budget dicek per recv; event loop tidak boleh sleep, rate limit dibayar setelah request terbaca
+            if not reservation.grow(n, timeout=0):
+                return False
+            debt = self.rate_limiter.bytes_delay(address, n)
+
+        try:
+            head, message = await asyncio.wait_for(self._read_head(reader, on_data), REQUEST_TIMEOUT)
+        except ReadAborted:
+            await self._reject_busy(connection, address, reservation.reserved)
+            return
+        except asyncio.TimeoutError:
+            # Sisa request yang belum lengkap tetap dilayani, kecuali UPLOAD yang terpotong
+            head, message = None, reader.take_pending()
+            if message is None or message[:9].tobytes().upper().startswith((b'UPLOAD', b'REPLICATE')):
+                logging.warning(f"Timeout receiving incomplete request from {address}")
+                return
+        if debt > 0:
+            await asyncio.sleep(debt)
+        if head is not None:
+            await self._handle_upload(connection, address, head, reader, reservation, started, receive_start)
+            return
+        if message is None:
+            return
+        with message:
+            try:
+                command_str = str(message, 'utf-8')
+            except UnicodeDecodeError as e:
+                logging.error(f"Unicode decode error from {address}: {e}")
+                await self._send(connection, address,
+                                 b'{"status": "ERROR", "message": "Invalid character encoding"}' + TERMINATOR)
+                return
+        receive_time = time.perf_counter() - receive_start
+        received = reader.total_received
+        hot_log.info("Processing %d characters from %s", len(command_str), address)
+
+        if command_str.lstrip()[:4].upper() == 'GET ':
+            await self._handle_get(connection, address, command_str, reservation, started, received, receive_time)
+            return
+
+        result, command, timings = await loop.run_in_executor(None, self._process, command_str)
+        send_start = time.perf_counter()
+        total_sent = await self._send(connection, address, result.encode('utf-8') + TERMINATOR)
+        timings = dict(timings, receive=receive_time, send=time.perf_counter() - send_start)
+        self.stats.record_request(command, result.startswith('{"status": "OK"'), received, total_sent, timings)
+        log_access(address, command_str, result, received, total_sent, started)
+
+    def _process(self, command_str):
+        """Small commands, run in the default thread executor"""
+        with self.profiler.request():
+            result = self.fp.proses_string(command_str)
+        command, timings = self.fp.last_request_info()
+        return result, command, timings
+
+    async def _acquire_segment(self, connection, address, reservation):
+        """A CodecBuffers segment reserved against the memory budget, or None after replying BUSY"""
+        needed = self.buffers.segment_size
+        if reservation.grow(needed, timeout=0):
+            try:
+                return await self.buffers.acquire(self.admission.max_wait)
+            except asyncio.TimeoutError:
+                pass
+        await self._reject_busy(connection, address, needed)
+        return None
+
+    async def _handle_get(self, connection, address, command_str, reservation, started, received, receive_time):
+        loop = asyncio.get_running_loop()
+        phase_start = time.perf_counter()
+        _, params = self.fp.split_command(command_str.strip())
+        now = time.perf_counter()
+        timings = dict(receive=receive_time, parse=now - phase_start)
+        header, fileobj = await loop.run_in_executor(None, self.fp.get_file_interface().open_for_get, params)
+        timings['disk'] = time.perf_counter() - now
+
+        send_start = time.perf_counter()
+        if fileobj is None:
+            result = json.dumps(header)
+            total_sent = await self._send(connection, address, result.encode('utf-8') + TERMINATOR)
+        else:
+            with fileobj:
+                segment = await self._acquire_segment(connection, address, reservation)
+                if segment is None:
+                    return
+                try:
+                    total_sent = await self._send_file(connection, address, header, fileobj, segment, timings)
+                finally:
+                    self.buffers.release(segment)
+            result = '{"status": "OK"'
+        # Disk dan encode berjalan bergantian dengan send, jangan dihitung dua kali
+        busy = timings.get('encode', 0.0) + timings.get('read', 0.0)
+        timings['disk'] += timings.pop('read', 0.0)
+        timings['send'] = max(0.0, time.perf_counter() - send_start - busy)
+        self.stats.record_request('get', result.startswith('{"status": "OK"'), received, total_sent, timings)
+        log_access(address, command_str, result, received, total_sent, started)
+
+    async def _send_file(self, connection, address, header, fileobj, segment, timings):
+        """Stream the GET envelope; block n+1 is read and encoded while block n is being sent"""
+        loop = asyncio.get_running_loop()
+        buf = segment.buf
+        jobs = []
+
+        def submit(executor, fn, *args):
+            # shield: worker tetap ditunggu sampai selesai menulis ke segment walau transfer dibatalkan
+            job = loop.run_in_executor(executor, fn, *args)
+            jobs.append(job)
+            return asyncio.shield(job)
+
+        total = await self._send(connection, address, envelope_head(header))
+        timings['encode'] = timings['read'] = 0.0
+        pending = None
+        half = 0
+        try:
+            while True:
+                in_offset, out_offset = self.buffers.offsets(half)
+                phase_start = time.perf_counter()
+                n = await submit(None, fileobj.readinto, buf[in_offset:in_offset + self.buffers.block])
+                timings['read'] += time.perf_counter() - phase_start
+                job = submit(self.encoders, encode_block, segment.name, in_offset, n, out_offset) if n else None
+                if pending is not None:
+                    previous, offset = pending
+                    length, seconds = await previous
+                    timings['encode'] += seconds
+                    total += await self._send(connection, address, buf[offset:offset + length])
+                if job is None:
+                    break
+                pending = (job, out_offset)
+                half ^= 1
+        finally:
+            await asyncio.gather(*jobs, return_exceptions=True)
+        total += await self._send(connection, address, ENVELOPE_TAIL + TERMINATOR)
+        return total
+
+    async def _handle_upload(self, connection, address, head, reader, reservation, started, receive_start):
+        loop = asyncio.get_running_loop()
+        segment = await self._acquire_segment(connection, address, reservation)
+        if segment is None:
+            return
+        sink, error = self.fp.begin_upload(head)
+        timings = dict(encode=0.0, disk=0.0)
+        try:
+            complete = await self._receive_upload(address, reader, sink, segment, timings)
+        except BaseException:
+            if sink is not None:
+                sink.abort()
+            raise
+        finally:
+            self.buffers.release(segment)
+        if not complete:
+            logging.warning(f"Timeout receiving incomplete upload from {address}")
+            if sink is not None:
+                sink.abort()
+            return
+        timings['receive'] = time.perf_counter() - receive_start - timings['encode'] - timings['disk']
+
+        phase_start = time.perf_counter()
+        result = json.dumps(await loop.run_in_executor(None, sink.finish)) if sink is not None else error
+        timings['disk'] += time.perf_counter() - phase_start
+        send_start = time.perf_counter()
+        total_sent = await self._send(connection, address, result.encode('utf-8') + TERMINATOR)
+        timings['send'] = time.perf_counter() - send_start
+        ok = result.startswith('{"status": "OK"')
+        self.stats.record_request('upload', ok, reader.total_received, total_sent, timings)
+        log_access(address, head, result, reader.total_received, total_sent, started)
+
+    async def _receive_upload(self, address, reader, sink, segment, timings):
+        """Fill the segment with the base64 body and decode it block by block; False on timeout.
+
+        Blok n+1 diterima selagi blok n di-decode worker, lalu hasil decode
+        ditulis ke file sementara milik UploadStream (urutan tetap terjaga)
+        bersamaan dengan CRC32-nya dihitung worker lain.
+        """
+        loop = asyncio.get_running_loop()
+        buf = segment.buf
+        block = self.buffers.block
+        jobs = []
+        pending = None
+        half = 0
+        used = 0
+
+        def submit(executor, fn, *args):
+            job = loop.run_in_executor(executor, fn, *args)
+            jobs.append(job)
+            return asyncio.shield(job)
+
+        async def store(entry):
+            job, offset = entry
+            try:
+                length, seconds = await job
+            except binascii.Error as e:
+                sink.fail(f'Invalid base64 encoding: {e}')
+                return
+            timings['encode'] += seconds
+            phase_start = time.perf_counter()
+            # CRC32 berantai per blok: blok berikutnya baru di-hash setelah blok ini
+            (sink.crc32, seconds), _ = await asyncio.gather(
+                submit(self.encoders, checksum_block, segment.name, offset, length, sink.crc32),
+                submit(None, sink.store, buf[offset:offset + length], False))
+            timings['encode'] += seconds
+            timings['disk'] += max(0.0, time.perf_counter() - phase_start - seconds)
+
+        async def flush():
+            nonlocal pending, half, used
+            in_offset, out_offset = self.buffers.offsets(half)
+            job = submit(self.encoders, decode_block, segment.name, in_offset, used, out_offset)
+            if pending is not None:
+                await store(pending)
+            pending = (job, out_offset)
+            half ^= 1
+            used = 0
+
+        try:
+            done = False
+            body_length = 0
+            tail = b''
+            while not done:
+                if (body_length and body_length % 4 == 0 and not reader.buffered
+                        and not await reader.wait_data(UPLOAD_IDLE_END)):
+                    break  # client lama tanpa terminator: diam setelah kelompok base64 utuh
+                try:
+                    chunk = await asyncio.wait_for(reader.read_some(), REQUEST_TIMEOUT)
+                except asyncio.TimeoutError:
+                    return False
+                if chunk is None:
+                    break  # client menutup arah kirim tanpa terminator
+                with chunk:
+                    data = chunk.tobytes()
+                wait = self.rate_limiter.bytes_delay(address, len(data))
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                # '\r' tidak ada di alfabet base64: awal terminator = akhir body
+                end = data.find(b'\r')
+                if end >= 0:
+                    data, tail = data[:end], data[end:]
+                    done = True
+                # Newline/spasi dibuang sebelum masuk segment supaya blok tetap kelipatan 4 karakter
+                data = strip_noise(data)
+                body_length += len(data)
+                if sink is None or sink.error:
+                    continue  # tetap konsumsi body supaya client bisa membaca response
+                view = memoryview(data)
+                while view:
+                    take = min(block - used, len(view))
+                    in_offset = self.buffers.offsets(half)[0] + used
+                    buf[in_offset:in_offset + take] = view[:take]
+                    used += take
+                    view = view[take:]
+                    if used == block:
+                        await flush()
+            if done:
+                await reader.finish_terminator(tail)
+            if sink is not None and not sink.error:
+                if used % 4:
+                    sink.fail(f'Invalid base64 encoding: base64 stream ends with {used % 4} stray character(s)')
+                elif used:
+                    await flush()
+            if pending is not None:
+                await store(pending)
+            return True
+        finally:
+            await asyncio.gather(*jobs, return_exceptions=True)
+
+    def cleanup(self):
+        if self.replicator:
+            self.replicator.stop()
+        self.durability.stop()
+        self.encoders.shutdown(wait=True, cancel_futures=True)
+        self.buffers.close()
+        logging.info("Hybrid Server cleaned up")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Hybrid file server (event loop + encoder process pool)")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=6666)
+    parser.add_argument('--pool-size', type=int, default=None,
+                        help="Jumlah encoder process (default: jumlah CPU)")
+    parser.add_argument('--memory-budget-mb', type=int, default=DEFAULT_MEMORY_BUDGET // (1024 * 1024),
+                        help="Memory untuk transfer yang sedang berjalan; request yang melebihinya dijawab BUSY")
+    parser.add_argument('--drain-timeout', type=float, default=DRAIN_TIMEOUT,
+                        help="Detik menunggu transfer aktif selesai saat SIGTERM/SIGHUP sebelum koneksi diputus")
+    parser.add_argument('--replicas', help="Jalankan sebagai primary: upload/delete dikirim ke read replica "
+                                           "host:port,host:port")
+    parser.add_argument('--durability', choices=DURABILITY_LEVELS, default='none',
+                        help="none: tanpa fsync; fsync: fsync per upload; group: fsync upload yang selesai "
+                             "berdekatan sekaligus. OK dikirim setelah data di disk (kecuali none)")
+    parser.add_argument('--group-commit-ms', type=float, default=GROUP_COMMIT_WINDOW * 1000,
+                        help="Jendela pengumpulan batch untuk --durability group")
+    add_rate_limit_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    # Semua log lewat satu writer thread, access log satu baris per request
+    setup_async_logging(access_log_path='access.log')
+    if not os.path.exists('files'):
+        os.makedirs('files')
+    server = HybridServer(ipaddress=args.host, port=args.port, pool_size=args.pool_size,
+                          memory_budget=args.memory_budget_mb * 1024 * 1024,
+                          drain_timeout=args.drain_timeout, replicas=args.replicas,
+                          durability=args.durability, group_commit_window=args.group_commit_ms / 1000,
+                          rate_limits=rate_limits_from_args(args))
+    try:
+        server.run()
+    finally:
+        stop_async_logging()
+
+if __name__ == "__main__":
+    main()
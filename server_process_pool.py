@@ -1,87 +1,393 @@
 import socket
 import multiprocessing as mp
 import logging
+import os
+import random
 import signal
+import time
+import argparse
+from multiprocessing import connection as mp_connection, reduction
 from file_protocol import FileProtocol
+from admission_control import DEFAULT_MEMORY_BUDGET, AdmissionController, send_busy
+from rate_limiter import RateLimiter, add_rate_limit_arguments, rate_limits_from_args
+from async_logging import hot_log, setup_async_logging, stop_async_logging
+from server_stats import ServerStats
+from profiler import ServerProfiler
+from request_handler import handle_request
+from buffered_reader import REQUEST_TIMEOUT
+from resource_monitor import process_rss
+from graceful_restart import DRAIN_TIMEOUT, DrainController, notify_ready, open_listener
+from durability import DURABILITY_LEVELS, GROUP_COMMIT_WINDOW, GroupCommitFeed, make_durability
+from replication import ReplicationFeed, Replicator, feed_change
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def handle_client_process(connection, address):
-    """Handle client in separate process"""
+# Batas supervisor untuk satu worker process (lihat --help)
+WORKER_REQUEST_TIMEOUT = 600
+WORKER_MAX_REQUESTS = 1000
+WORKER_MAX_RSS = 512 * 1024 * 1024
+# Worker yang di-terminate diberi waktu ini untuk membereskan request-nya sebelum di-kill
+KILL_GRACE = 2.0
+SUPERVISE_INTERVAL = 1.0
+
+def handle_client_process(connection, address, admission, rate_limiter, stats, profiler, worker_index=None,
+                          replicator=None, durability=None):
+    """Handle one client connection inside a worker process"""
+    reservation = admission.reservation()
+    started = time.time()
+    stats.set_worker(worker_index)
+    stats.connection_opened()
+    with profiler.request():
+        try:
+            fp = FileProtocol(stats=stats, profiler=profiler, replicator=replicator, durability=durability)
+            hot_log.info("Process %s handling client %s", mp.current_process().pid, address)
+            rate_limiter.acquire_request(address)
+
+            # Request dibaca sampai terminator; GET/UPLOAD di-stream per potongan base64
+            connection.settimeout(REQUEST_TIMEOUT)
+            handle_request(connection, address, fp, reservation, admission, rate_limiter, stats, started)
+
+        except Exception as e:
+            logging.error(f"Error in process handling {address}: {e}")
+        finally:
+            reservation.release()
+            stats.connection_closed()
+            connection.close()
+            hot_log.info("Process %s finished handling %s", mp.current_process().pid, address)
+
+def _terminate_worker(signum, frame):
+    # SystemExit membongkar request yang sedang jalan: finally melepas reservation,
+    # lock shared memory dan menutup koneksi sebelum process berhenti
+    raise SystemExit(0)
+
+def worker_main(index, control, listener, admission, rate_limiter, stats, profiler, replication=None,
+                durability='none', group_commit_window=GROUP_COMMIT_WINDOW):
+    """Persistent worker: receive connections from the supervisor over `control` until told to retire"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C ditangani supervisor
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)  # hot restart juga urusan supervisor
+    signal.signal(signal.SIGTERM, _terminate_worker)
+    # Salinan listening socket dari fork tidak dipakai; jangan ikut menahan port
+    listener.close()
+    # Perubahan file dilaporkan ke supervisor, yang mereplikasi semuanya dengan satu Replicator
+    if replication:
+        replication.connect(control)
+        stats.add_gauge_provider('replication', replication.status)
+    # Group commit: upload semua worker di-batch oleh satu GroupCommit di supervisor (lihat GroupCommitFeed)
+    if isinstance(durability, GroupCommitFeed):
+        durability.connect(control)
+    else:
+        durability = make_durability(durability, group_commit_window)
+    stats.add_gauge_provider('durability', durability.status)
+    supervisor = os.getppid()
     try:
-        fp = FileProtocol()
-        logging.info(f"Process {mp.current_process().pid} handling client {address}")
-        
-        # Receive data with larger buffer
-        data = connection.recv(8192)
-        if data:
-            d = data.decode('utf-8')
-            hasil = fp.proses_string(d)
-            hasil = hasil + "\r\n\r\n"
-            connection.sendall(hasil.encode('utf-8'))
-            
-    except Exception as e:
-        logging.error(f"Error in process handling {address}: {e}")
+        while True:
+            try:
+                # Berhenti sendiri kalau supervisor mati tanpa sempat mengirim 'retire'
+                while not control.poll(SUPERVISE_INTERVAL):
+                    if os.getppid() != supervisor:
+                        return
+                message, address = control.recv()
+            except (EOFError, OSError):
+                return  # supervisor sudah tidak ada
+            if message == 'retire':
+                return
+            fd = reduction.recv_handle(control)
+            connection = socket.socket(fileno=fd)
+            handle_client_process(connection, address, admission, rate_limiter, stats, profiler, index, replication,
+                                  durability)
+            try:
+                control.send('ready')
+            except OSError:
+                return
     finally:
-        connection.close()
-        logging.info(f"Process {mp.current_process().pid} finished handling {address}")
+        durability.stop()
+
+class Worker:
+    """The supervisor's view of one worker process"""
+
+    def __init__(self, index, process, control, max_requests):
+        self.index = index
+        self.process = process
+        self.control = control
+        self.max_requests = max_requests
+        self.requests = 0
+        # Upload yang sudah begin() di GroupCommit supervisor tapi belum commit/end
+        self.uploads = 0
+        self.busy_since = None
+        # Alasan worker dihentikan supervisor (None = masih melayani), dan batas waktu sebelum di-kill
+        self.stopping = None
+        self.kill_at = None
 
 class MultiprocessingServer:
-    def __init__(self, ipaddress='0.0.0.0', port=6666, max_processes=5):
+    """Persistent pool of supervised worker processes.
+
+    Process utama menerima koneksi dan mengirim socket-nya (SCM_RIGHTS) ke
+    worker yang idle; worker baru dibuat saat semua sibuk, sampai
+    max_processes. Supervisor mengganti worker yang crash, yang request-nya
+    melewati worker_timeout (terminate), dan yang sudah melayani
+    max_requests request atau RSS-nya melewati max_rss (diganti dengan rapi
+    saat idle). Setiap penggantian dihitung di STATS (restarts).
+    """
+
+    def __init__(self, ipaddress='0.0.0.0', port=6666, max_processes=5, memory_budget=None, rate_limits=None,
+                 worker_timeout=WORKER_REQUEST_TIMEOUT, max_requests=WORKER_MAX_REQUESTS, max_rss=WORKER_MAX_RSS,
+                 drain_timeout=DRAIN_TIMEOUT, replicas=None, durability='none',
+                 group_commit_window=GROUP_COMMIT_WINDOW):
         self.ipinfo = (ipaddress, port)
+        # Primary: satu Replicator di supervisor untuk semua worker (lihat ReplicationFeed)
+        self.replicator = Replicator(replicas) if replicas else None
+        self.replication = ReplicationFeed() if replicas else None
+        # Group commit: satu GroupCommit di supervisor untuk semua worker, worker memakai GroupCommitFeed
+        self.committer = make_durability('group', group_commit_window) if durability == 'group' else None
+        self.durability = GroupCommitFeed() if self.committer else durability
+        self.group_commit_window = group_commit_window
         self.max_processes = max_processes
-        self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.processes = []
+        self.worker_timeout = worker_timeout
+        self.max_requests = max_requests
+        self.max_rss = max_rss
+        if memory_budget:
+            self.admission = AdmissionController(memory_budget=memory_budget, shared=True)
+        else:
+            self.admission = AdmissionController(shared=True)
+        # Bucket per client disimpan di shared memory supaya berlaku untuk semua worker process
+        self.rate_limiter = RateLimiter(shared=True, **(rate_limits or {}))
+        # Baris stats per worker ditulis tanpa lock: worker pengganti memakai slot cadangan selama
+        # worker lama masih berhenti (sampai KILL_GRACE), jadi dua process tidak pernah berbagi baris
+        self.worker_slots = max_processes * 2
+        self.stats = ServerStats(shared=True, max_workers=self.worker_slots)
+        self.stats.set_info('engine', 'process_pool')
+        self.stats.set_info('pool_size', max_processes)
+        # State profiling di shared memory: setiap worker process memprofile request-nya sendiri
+        self.profiler = ServerProfiler(shared=True)
+        self.my_socket = None
+        self.workers = []
+        # Worker yang sudah diganti tapi belum selesai berhenti
+        self.retiring = []
+        # False setelah drain dimulai: tidak ada accept dan worker pengganti lagi
         self.running = True
-        
-        # Setup signal handlers (tanpa sys)
-        signal.signal(signal.SIGINT, self.signal_handler)
+
+        # SIGTERM/SIGINT: drain, SIGHUP: hot restart
+        self.drain = DrainController(drain_timeout)
+        self.drain.install_signal_handlers()
+        self.profiler.install_signal_handler()
+
+    def spawn_worker(self, index):
+        control, child_control = mp.Pipe()
+        process = mp.Process(target=worker_main,
+                             args=(index, child_control, self.my_socket, self.admission, self.rate_limiter,
+                                   self.stats, self.profiler, self.replication, self.durability,
+                                   self.group_commit_window))
+        process.start()
+        child_control.close()
+        # Jitter supaya worker yang dibuat bersamaan tidak di-recycle bersamaan
+        max_requests = self.max_requests + random.randint(0, max(1, self.max_requests // 10))
+        worker = Worker(index, process, control, max_requests)
+        self.workers.append(worker)
+        self.stats.set_gauge('workers', len(self.workers))
+        hot_log.info("Started worker %d (pid %s)", index, process.pid)
+        return worker
+
+    def idle_worker(self):
+        return next((w for w in self.workers if w.busy_since is None), None)
+
+    def ensure_idle_worker(self):
+        """Start a worker if all are busy and the pool is not full yet.
+
+        Dipanggil sebelum accept(): fork saat socket client sedang terbuka membuat
+        worker baru ikut memegang koneksi itu, dan client tidak pernah mendapat EOF.
+        """
+        if self.idle_worker() is None and len(self.workers) < self.max_processes:
+            slot = self.free_slot()
+            if slot is not None:
+                self.spawn_worker(slot)
+
+    def free_slot(self):
+        """Smallest stats slot not held by a live or a still-stopping worker; None if all are taken.
+
+        Nomor worker = slot kosong terkecil, supaya stats per worker stabil antar restart.
+        """
+        used = {w.index for w in self.workers + self.retiring}
+        free = set(range(self.worker_slots)) - used
+        return min(free) if free else None
+
+    def dispatch(self, connection, address):
+        """Hand the connection to an idle worker; False if all are busy"""
+        worker = self.idle_worker()
+        if worker is None:
+            return False
         try:
-            signal.signal(signal.SIGTERM, self.signal_handler)
-        except AttributeError:
-            # SIGTERM mungkin tidak tersedia di Windows
+            worker.control.send(('connection', address))
+            reduction.send_handle(worker.control, connection.fileno(), worker.process.pid)
+        except OSError as e:
+            # Worker mati di antara dua pengecekan; supervise() yang akan menggantinya
+            logging.error(f"Failed to hand connection to worker {worker.index}: {e}")
+            worker.busy_since = time.time()
+            return False
+        worker.busy_since = time.time()
+        worker.requests += 1
+        hot_log.info("Worker %d (pid %s) handling %s", worker.index, worker.process.pid, address)
+        return True
+
+    def retire(self, worker, reason):
+        """Replace a worker: an idle one exits by itself, a busy one is terminated"""
+        logging.warning(f"Replacing worker {worker.index} (pid {worker.process.pid}): {reason}")
+        self.workers.remove(worker)
+        self.release_uploads(worker)
+        worker.stopping = reason
+        if worker.busy_since is None:
+            try:
+                worker.control.send(('retire', None))
+            except OSError:
+                pass
+        else:
+            worker.process.terminate()
+        worker.kill_at = time.time() + KILL_GRACE
+        self.retiring.append(worker)
+        self.stats.worker_restarted(reason)
+        # Kapasitas pool langsung diisi worker baru di slot stats lain; kalau semua slot masih dipegang
+        # worker yang sedang berhenti, ensure_idle_worker() mengisinya setelah worker lama di-reap
+        if self.running:
+            slot = self.free_slot()
+            if slot is not None:
+                self.spawn_worker(slot)
+
+    def worker_ready(self, worker):
+        try:
+            message = worker.control.recv()
+        except (EOFError, OSError):
+            # Pipe putus: worker mati di tengah jalan
+            logging.error(f"Worker {worker.index} (pid {worker.process.pid}) exited unexpectedly")
+            self.retire(worker, 'crash')
+            return
+        if self.replicator and feed_change(message, self.replicator):
+            return  # file yang berubah di tengah request, worker masih sibuk
+        if self.committer and self.feed_commit(worker, message):
+            return  # upload di tengah request, worker masih sibuk
+        worker.busy_since = None
+        if worker.requests >= worker.max_requests:
+            self.retire(worker, 'max_requests')
+            return
+        rss = self.worker_rss(worker)
+        if rss and rss > self.max_rss:
+            self.retire(worker, 'max_rss')
+
+    def feed_commit(self, worker, message):
+        """Pass a ('durability', ...) message from a worker to the supervisor's GroupCommit; False for other messages"""
+        if not (isinstance(message, tuple) and message[0] == 'durability'):
+            return False
+        action = message[1]
+        if action == 'begin':
+            worker.uploads += 1
+            self.committer.begin()
+            return True
+        worker.uploads -= 1
+        if action == 'commit':
+            # Balasan dikirim dari thread group commit; worker sedang menunggu, supervisor tidak
+            self.committer.submit(message[2], message[3], lambda error: self.commit_done(worker, error))
+        else:
+            self.committer.end()
+        return True
+
+    def commit_done(self, worker, error):
+        # Status batch terbaru terlihat di STATS worker mana pun tanpa menunggu supervise()
+        self.durability.publish(self.committer.status())
+        try:
+            worker.control.send(('committed', str(error) if error else None))
+        except (OSError, ValueError):
+            pass  # worker sudah dihentikan, client-nya tidak menunggu OK lagi
+
+    def release_uploads(self, worker):
+        """Close the uploads a stopped worker left open, so batches stop waiting for them"""
+        if self.committer:
+            for _ in range(worker.uploads):
+                self.committer.end()
+        worker.uploads = 0
+
+    def collect_changes(self, worker):
+        """Replicate the changes a stopped worker reported after the supervisor stopped reading its pipe"""
+        if not self.replicator:
+            return
+        try:
+            while worker.control.poll():
+                feed_change(worker.control.recv(), self.replicator)
+        except (EOFError, OSError):
             pass
 
-    def signal_handler(self, signum, frame):
-        logging.info(f"Received signal {signum}, shutting down...")
-        self.running = False
+    def worker_rss(self, worker):
+        try:
+            return process_rss(worker.process.pid)
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def supervise(self):
+        now = time.time()
+        for worker in list(self.workers):
+            if not worker.process.is_alive():
+                logging.error(f"Worker {worker.index} (pid {worker.process.pid}) died with exit code "
+                              f"{worker.process.exitcode}")
+                self.retire(worker, 'crash')
+            elif worker.busy_since is not None and now - worker.busy_since > self.worker_timeout:
+                self.retire(worker, 'timeout')
+            elif worker.busy_since is None and worker.requests:
+                # Worker yang belum pernah melayani request tidak punya memory untuk dibebaskan
+                rss = self.worker_rss(worker)
+                if rss and rss > self.max_rss:
+                    self.retire(worker, 'max_rss')
+        for worker in list(self.retiring):
+            if not worker.process.is_alive():
+                worker.process.join()
+                self.collect_changes(worker)
+                worker.control.close()
+                self.retiring.remove(worker)
+            elif now > worker.kill_at:
+                logging.warning(f"Force killing worker pid {worker.process.pid}")
+                worker.process.kill()
+        self.stats.set_gauge('workers', len(self.workers))
+        if self.replicator:
+            self.replication.publish(self.replicator.status())
+        if self.committer:
+            self.durability.publish(self.committer.status())
+
+    def busy_workers(self):
+        return sum(1 for w in self.workers if w.busy_since is not None)
 
     def run(self):
         try:
-            self.my_socket.bind(self.ipinfo)
-            self.my_socket.listen(50)  # Increased backlog
-            self.my_socket.settimeout(1.0)  # Non-blocking accept
+            self.my_socket = open_listener(self.ipinfo, 50)  # Increased backlog
             logging.info(f"Multiprocessing Server running on {self.ipinfo} with max {self.max_processes} processes")
+            if self.replicator:
+                self.replicator.start()
+            notify_ready()
+
+            last_supervise = 0.0
+            while self.running or (self.busy_workers() and not self.drain.expired()):
+                if self.running and not self.drain.check(self.my_socket):
+                    # Drain: koneksi baru ditangani server pengganti (hot restart) atau ditolak,
+                    # worker yang sibuk menyelesaikan transfernya
+                    self.running = False
+                    self.my_socket.close()
+                    continue
+                # Tunggu koneksi baru atau worker yang selesai, sekalian cek kesehatan worker
+                waitables = [w.control for w in self.workers] + ([self.my_socket] if self.running else [])
+                ready = mp_connection.wait(waitables, timeout=SUPERVISE_INTERVAL)
+                workers = {w.control: w for w in self.workers}
+                for obj in ready:
+                    if obj in workers:
+                        self.worker_ready(workers[obj])
+                if self.running and self.my_socket in ready:
+                    self.accept_connection()
+                if time.time() - last_supervise >= SUPERVISE_INTERVAL:
+                    self.supervise()
+                    # Gabungkan file profil dari worker setelah sesi PROFILE selesai
+                    self.profiler.poll()
+                    last_supervise = time.time()
+                # Counter kumulatif supervisor untuk STATS (satu getrusage, termasuk worker yang sudah di-reap)
+                self.stats.publish_context_switches()
+
+            self.drain.report(self.busy_workers())
 
-            while self.running:
-                try:
-                    connection, address = self.my_socket.accept()
-                    logging.info(f"New connection from {address}")
-                    
-                    # Clean up finished processes
-                    self.processes = [p for p in self.processes if p.is_alive()]
-                    
-                    # Create new process if under limit
-                    if len(self.processes) < self.max_processes:
-                        process = mp.Process(target=handle_client_process, args=(connection, address))
-                        process.start()
-                        self.processes.append(process)
-                        logging.info(f"Started new process {process.pid} for {address}")
-                        
-                        # Close connection in parent process
-                        connection.close()
-                    else:
-                        logging.warning(f"Max processes ({self.max_processes}) reached, rejecting connection from {address}")
-                        connection.close()
-                        
-                except socket.timeout:
-                    continue  # Check if still running
-                except Exception as e:
-                    if self.running:
-                        logging.error(f"Accept error: {e}")
-                    
         except KeyboardInterrupt:
             logging.info("Server shutdown requested")
         except Exception as e:
@@ -89,41 +395,111 @@ class MultiprocessingServer:
         finally:
             self.cleanup()
 
+    def accept_connection(self):
+        self.ensure_idle_worker()
+        try:
+            connection, address = self.my_socket.accept()
+        except socket.timeout:
+            return  # koneksi sudah diambil server lain yang berbagi listening socket (hot restart)
+        except OSError as e:
+            if self.running:
+                logging.error(f"Accept error: {e}")
+            return
+        hot_log.info("New connection from %s", address)
+        try:
+            if not self.dispatch(connection, address):
+                logging.warning(f"Max processes ({self.max_processes}) busy, rejecting connection from {address}")
+                # Balas BUSY supaya client tahu kapan harus retry
+                send_busy(connection, self.admission.retry_after_ms())
+                # Ditolak oleh acceptor, bukan oleh worker tertentu
+                self.stats.request_rejected(worker=False)
+        finally:
+            # Worker sudah punya salinan socket-nya sendiri
+            connection.close()
+
     def cleanup(self):
         logging.info("Starting cleanup...")
         self.running = False
-        
-        for process in self.processes:
+
+        processes = [w.process for w in self.workers + self.retiring]
+        for process in processes:
             if process.is_alive():
                 logging.info(f"Terminating process {process.pid}")
                 process.terminate()
-                process.join(timeout=2)
-                if process.is_alive():
-                    logging.warning(f"Force killing process {process.pid}")
-                    process.kill()
-        
+        deadline = time.time() + KILL_GRACE
+        for process in processes:
+            process.join(timeout=max(0.0, deadline - time.time()))
+            if process.is_alive():
+                logging.warning(f"Force killing process {process.pid}")
+                process.kill()
+                process.join()
+        for worker in self.workers + self.retiring:
+            self.collect_changes(worker)
+        self.workers = []
+        self.retiring = []
+
         try:
             self.my_socket.close()
-        except:
+        except AttributeError:
             pass
-        
+
+        if self.replicator:
+            self.replicator.stop()
+        if self.committer:
+            self.committer.stop()
         logging.info("Multiprocessing Server cleaned up")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Multiprocessing file server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=6666)
+    parser.add_argument('--pool-size', type=int, default=50, help="Jumlah maksimal worker process")
+    parser.add_argument('--worker-timeout', type=float, default=WORKER_REQUEST_TIMEOUT,
+                        help="Detik maksimal satu request di worker sebelum worker di-terminate dan diganti")
+    parser.add_argument('--max-requests', type=int, default=WORKER_MAX_REQUESTS,
+                        help="Worker diganti setelah melayani sekian request (+ jitter 10%%)")
+    parser.add_argument('--max-rss-mb', type=int, default=WORKER_MAX_RSS // (1024 * 1024),
+                        help="Worker diganti kalau RSS-nya melewati batas ini")
+    parser.add_argument('--memory-budget-mb', type=int, default=DEFAULT_MEMORY_BUDGET // (1024 * 1024),
+                        help="Memory untuk transfer yang sedang berjalan; request yang melebihinya dijawab BUSY")
+    parser.add_argument('--drain-timeout', type=float, default=DRAIN_TIMEOUT,
+                        help="Detik menunggu transfer aktif selesai saat SIGTERM/SIGHUP sebelum worker dihentikan")
+    parser.add_argument('--replicas', help="Jalankan sebagai primary: upload/delete dikirim ke read replica "
+                                           "host:port,host:port")
+    parser.add_argument('--durability', choices=DURABILITY_LEVELS, default='none',
+                        help="none: tanpa fsync; fsync: fsync per upload; group: fsync upload yang selesai "
+                             "berdekatan sekaligus (satu batch untuk semua worker, di supervisor). "
+                             "OK dikirim setelah data di disk (kecuali none)")
+    parser.add_argument('--group-commit-ms', type=float, default=GROUP_COMMIT_WINDOW * 1000,
+                        help="Jendela pengumpulan batch untuk --durability group")
+    add_rate_limit_arguments(parser)
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    # Log semua worker process dikirim lewat multiprocessing queue ke satu writer di parent
+    setup_async_logging(access_log_path='access.log', multiprocess=True)
+
     # Pastikan folder files ada
-    import os
     if not os.path.exists('files'):
         os.makedirs('files')
         print("Created 'files' directory")
-    
-    server = MultiprocessingServer(max_processes=50)  # Increased for stress test
-    
+
+    server = MultiprocessingServer(ipaddress=args.host, port=args.port, max_processes=args.pool_size,
+                                   memory_budget=args.memory_budget_mb * 1024 * 1024,
+                                   worker_timeout=args.worker_timeout, max_requests=args.max_requests,
+                                   max_rss=args.max_rss_mb * 1024 * 1024, drain_timeout=args.drain_timeout,
+                                   replicas=args.replicas, durability=args.durability,
+                                   group_commit_window=args.group_commit_ms / 1000,
+                                   rate_limits=rate_limits_from_args(args))
+
     try:
         server.run()
     except KeyboardInterrupt:
         print("Server interrupted")
     finally:
         server.cleanup()
+        stop_async_logging()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,320 @@
+import multiprocessing as mp
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Command yang dihitung terpisah, command lain masuk 'other'
+COMMANDS = ['list', 'get', 'upload', 'delete', 'stat', 'copy', 'move', 'stats', 'profile', 'other']
+PHASES = ['receive', 'parse', 'disk', 'encode', 'send']
+GAUGES = ['queue_depth', 'workers']
+# Alasan worker process diganti oleh supervisor server multiprocessing
+RESTART_REASONS = ['crash', 'timeout', 'max_requests', 'max_rss']
+# Counter per worker: request selesai, gagal, dan ditolak (BUSY)
+_W_COMPLETED = 0
+_W_FAILED = 1
+_W_REJECTED = 2
+
+# Histogram HDR-style (log-linear): nilai dalam mikrodetik, 16 sub-bucket per
+# pangkat dua sehingga error relatif maksimal ~6%, range sampai ~9 jam
+_SUB_BITS = 4
+_SUB_COUNT = 1 << _SUB_BITS
+_MAX_EXPONENT = 35
+HIST_BUCKETS = _SUB_COUNT + (_MAX_EXPONENT - _SUB_BITS + 1) * _SUB_COUNT
+
+# Layout satu slot counter (array float datar supaya bisa di shared memory)
+_REQUESTS = 0
+_ERRORS = _REQUESTS + len(COMMANDS)
+_BYTES_IN = _ERRORS + len(COMMANDS)
+_BYTES_OUT = _BYTES_IN + 1
+_CONN_OPENED = _BYTES_OUT + 1
+_CONN_CLOSED = _CONN_OPENED + 1
+_REJECTED = _CONN_CLOSED + 1
+_RESTARTS = _REJECTED + 1
+_PHASE_SUM = _RESTARTS + len(RESTART_REASONS)
+_HIST = _PHASE_SUM + len(PHASES)
+SLOT_SIZE = _HIST + len(PHASES) * HIST_BUCKETS
+
+
+def context_switches():
+    """(voluntary, involuntary) context switches of this process, None if getrusage is unavailable.
+
+    Kumulatif: termasuk thread yang sudah selesai (thread per koneksi) dan
+    child process yang sudah di-reap (worker yang diganti supervisor), yang
+    keduanya tidak terlihat lagi di /proc.
+    """
+    if resource is None:
+        return None
+    voluntary = involuntary = 0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        voluntary += usage.ru_nvcsw
+        involuntary += usage.ru_nivcsw
+    return voluntary, involuntary
+
+
+def bucket_index(value_us):
+    v = max(int(value_us), 0)
+    if v < _SUB_COUNT:
+        return v
+    exponent = min(v.bit_length() - 1, _MAX_EXPONENT)
+    sub = (v >> (exponent - _SUB_BITS)) & (_SUB_COUNT - 1)
+    return _SUB_COUNT + (exponent - _SUB_BITS) * _SUB_COUNT + sub
+
+
+def bucket_value(index):
+    """Upper bound (us) of a histogram bucket"""
+    if index < _SUB_COUNT:
+        return index
+    exponent = (index - _SUB_COUNT) // _SUB_COUNT + _SUB_BITS
+    sub = (index - _SUB_COUNT) % _SUB_COUNT
+    return ((_SUB_COUNT + sub + 1) << (exponent - _SUB_BITS)) - 1
+
+
+def histogram_summary(buckets, total_us):
+    """Percentiles (ms) and non-empty buckets from raw bucket counts"""
+    count = int(sum(buckets))
+    summary = dict(count=count)
+    if not count:
+        return summary
+    targets = [('p50', 0.50), ('p90', 0.90), ('p99', 0.99), ('p999', 0.999)]
+    seen = 0
+    t = 0
+    for i, n in enumerate(buckets):
+        if not n:
+            continue
+        seen += n
+        while t < len(targets) and seen >= targets[t][1] * count:
+            summary[targets[t][0]] = round(bucket_value(i) / 1000.0, 3)
+            t += 1
+        summary['max'] = round(bucket_value(i) / 1000.0, 3)
+    summary['mean'] = round(total_us / count / 1000.0, 3)
+    summary['buckets'] = [[round(bucket_value(i) / 1000.0, 3), int(n)] for i, n in enumerate(buckets) if n]
+    return summary
+
+
+class ServerStats:
+    """Live server metrics with lock-free per-thread counters merged on read.
+
+    Setiap thread menulis ke slot miliknya sendiri (hanya satu writer, tanpa
+    lock). snapshot() menjumlahkan semua slot. Dengan shared=True slot ada di
+    shared memory dan dipilih berdasarkan pid, sehingga worker process pada
+    server multiprocessing ikut teragregasi.
+
+    Selain itu dicatat counter per worker (completed/failed/rejected). Worker
+    diidentifikasi dengan nama thread, atau pada mode shared dengan index
+    worker 0..max_workers-1 yang di-set lewat set_worker() di child process.
+    """
+
+    def __init__(self, shared=False, shared_slots=16, max_workers=64):
+        self.shared = shared
+        self.started = time.time()
+        # pid dipakai stress test untuk membaca /proc server (resource telemetry)
+        self.info = {'pid': os.getpid()}
+        self._local = threading.local()
+        self._gauge_providers = {}
+        self._worker_index = None
+        if shared:
+            self._shared_slots = shared_slots
+            self._table = mp.Array('d', shared_slots * SLOT_SIZE, lock=False)
+            self._slot_locks = [mp.Lock() for _ in range(shared_slots)]
+            self._gauges = mp.Array('d', len(GAUGES), lock=False)
+            self._max_workers = max_workers
+            self._worker_table = mp.Array('d', max_workers * 3, lock=False)
+            # Context switch process utama (supervisor), ditulis lewat publish_context_switches()
+            self._context_switches = mp.Array('d', 2, lock=False)
+        else:
+            self._workers = {}
+            self._slots = []  # (thread, counters)
+            self._retired = [0.0] * SLOT_SIZE
+            self._registry_lock = threading.Lock()
+            self._gauges = [0.0] * len(GAUGES)
+
+    def _slot(self):
+        slot = getattr(self._local, 'slot', None)
+        if slot is None:
+            slot = [0.0] * SLOT_SIZE
+            with self._registry_lock:
+                # Thread-per-connection server: gabungkan slot thread yang sudah mati
+                if len(self._slots) > 256:
+                    alive = []
+                    for owner, counters in self._slots:
+                        if owner.is_alive():
+                            alive.append((owner, counters))
+                        else:
+                            for i, v in enumerate(counters):
+                                if v:
+                                    self._retired[i] += v
+                    self._slots = alive
+                self._slots.append((threading.current_thread(), slot))
+            self._local.slot = slot
+        return slot
+
+    def _update(self, updates):
+        """Apply a list of (index, delta) to this thread's (or process') slot"""
+        if self.shared:
+            n = os.getpid() % self._shared_slots
+            base = n * SLOT_SIZE
+            with self._slot_locks[n]:
+                for i, delta in updates:
+                    self._table[base + i] += delta
+        else:
+            slot = self._slot()
+            for i, delta in updates:
+                slot[i] += delta
+
+    def set_worker(self, index):
+        """Mark this process as worker `index` (shared mode, called in the child)"""
+        self._worker_index = index
+
+    def set_info(self, name, value):
+        """Static server information reported by STATS, e.g. engine and pool_size"""
+        self.info[name] = value
+
+    def _count_worker(self, field):
+        # Satu worker hanya dipakai satu thread/process pada satu waktu, jadi tanpa lock
+        if self.shared:
+            if self._worker_index is not None and self._worker_index < self._max_workers:
+                self._worker_table[self._worker_index * 3 + field] += 1
+        else:
+            name = threading.current_thread().name
+            counters = self._workers.get(name)
+            if counters is None:
+                counters = self._workers.setdefault(name, [0, 0, 0])
+            counters[field] += 1
+
+    def connection_opened(self):
+        self._update([(_CONN_OPENED, 1)])
+
+    def connection_closed(self):
+        self._update([(_CONN_CLOSED, 1)])
+
+    def request_rejected(self, worker=True):
+        self._update([(_REJECTED, 1)])
+        if worker:
+            self._count_worker(_W_REJECTED)
+
+    def worker_restarted(self, reason):
+        """Count a worker replaced by the supervisor (see RESTART_REASONS)"""
+        self._update([(_RESTARTS + RESTART_REASONS.index(reason), 1)])
+
+    def record_request(self, command, ok, bytes_in, bytes_out, timings):
+        """Record one finished request. timings: {phase: seconds}"""
+        c = COMMANDS.index(command) if command in COMMANDS else COMMANDS.index('other')
+        updates = [(_REQUESTS + c, 1), (_BYTES_IN, bytes_in), (_BYTES_OUT, bytes_out)]
+        if not ok:
+            updates.append((_ERRORS + c, 1))
+        # Command admin (STATS, PROFILE) tidak dihitung sebagai kerja worker
+        if command not in ('stats', 'profile'):
+            self._count_worker(_W_COMPLETED if ok else _W_FAILED)
+        for phase, seconds in timings.items():
+            if phase not in PHASES:
+                continue
+            p = PHASES.index(phase)
+            value_us = seconds * 1e6
+            updates.append((_PHASE_SUM + p, value_us))
+            updates.append((_HIST + p * HIST_BUCKETS + bucket_index(value_us), 1))
+        self._update(updates)
+
+    def publish_context_switches(self):
+        """Shared mode: store this (supervisor) process' context switches for STATS served by the workers"""
+        counts = context_switches()
+        if counts is not None:
+            self._context_switches[:] = counts
+
+    def _context_switch_counts(self):
+        if self.shared:
+            counts = self._context_switches[:]
+            return dict(voluntary=int(counts[0]), involuntary=int(counts[1])) if any(counts) else None
+        counts = context_switches()
+        return dict(voluntary=counts[0], involuntary=counts[1]) if counts else None
+
+    def set_gauge(self, name, value):
+        self._gauges[GAUGES.index(name)] = value
+
+    def add_gauge_provider(self, name, fn):
+        """Gauge computed on read, e.g. the executor queue depth"""
+        self._gauge_providers[name] = fn
+
+    def _merged(self):
+        total = [0.0] * SLOT_SIZE
+        if self.shared:
+            for n in range(self._shared_slots):
+                base = n * SLOT_SIZE
+                row = self._table[base:base + SLOT_SIZE]
+                for i, v in enumerate(row):
+                    if v:
+                        total[i] += v
+        else:
+            with self._registry_lock:
+                slots = [counters for _, counters in self._slots] + [self._retired]
+            for counters in slots:
+                for i, v in enumerate(counters):
+                    if v:
+                        total[i] += v
+        return total
+
+    def _worker_counts(self):
+        if self.shared:
+            table = self._worker_table[:]
+            rows = {f"worker-{i}": table[i * 3:i * 3 + 3] for i in range(self._max_workers)}
+        else:
+            rows = {name: list(counters) for name, counters in list(self._workers.items())}
+        return {name: dict(completed=int(row[_W_COMPLETED]), failed=int(row[_W_FAILED]),
+                           rejected=int(row[_W_REJECTED]))
+                for name, row in rows.items() if any(row)}
+
+    def snapshot(self):
+        total = self._merged()
+        gauges = {name: self._gauges[i] for i, name in enumerate(GAUGES)}
+        for name, fn in self._gauge_providers.items():
+            try:
+                gauges[name] = fn()
+            except Exception:
+                gauges[name] = None
+
+        latency = {}
+        for p, phase in enumerate(PHASES):
+            start = _HIST + p * HIST_BUCKETS
+            latency[phase] = histogram_summary(total[start:start + HIST_BUCKETS], total[_PHASE_SUM + p])
+
+        return dict(
+            uptime=round(time.time() - self.started, 1),
+            requests={c: int(total[_REQUESTS + i]) for i, c in enumerate(COMMANDS)},
+            errors={c: int(total[_ERRORS + i]) for i, c in enumerate(COMMANDS)},
+            bytes_in=int(total[_BYTES_IN]),
+            bytes_out=int(total[_BYTES_OUT]),
+            active_connections=int(total[_CONN_OPENED] - total[_CONN_CLOSED]),
+            rejected=int(total[_REJECTED]),
+            restarts={r: int(total[_RESTARTS + i]) for i, r in enumerate(RESTART_REASONS)},
+            gauges=gauges,
+            info=dict(self.info),
+            workers=self._worker_counts(),
+            # Process utama server saja; child yang masih hidup dibaca ResourceMonitor dari /proc
+            context_switches=self._context_switch_counts(),
+            latency_ms=latency,
+        )
+
+
+if __name__ == '__main__':
+    stats = ServerStats()
+    print("Testing ServerStats:")
+
+    def worker(n):
+        for i in range(1000):
+            stats.record_request('get', i % 50 != 0, 20, 1400,
+                                 dict(receive=0.0001 * n, parse=0.00001, disk=0.001 * (i % 10), send=0.0005))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(1, 5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    snap = stats.snapshot()
+    print("1. Requests:", snap['requests'], "errors:", snap['errors'])
+    print("2. Disk latency:", {k: v for k, v in snap['latency_ms']['disk'].items() if k != 'buckets'})
+    print("3. Bucket round trip:", [(v, bucket_value(bucket_index(v))) for v in (5, 17, 1000, 123456)])
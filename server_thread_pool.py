@@ -1,52 +1,125 @@
 import socket
 import threading
-from concurrent.futures import ThreadPoolExecutor
 import logging
+import time
+import argparse
 from file_protocol import FileProtocol
+from admission_control import DEFAULT_MEMORY_BUDGET, AdmissionController
+from request_scheduler import HeadWaiter, PoolAutoscaler, SizeAwareScheduler, classify_connection
+from rate_limiter import RateLimiter, add_rate_limit_arguments, rate_limits_from_args
+from async_logging import hot_log, setup_async_logging, stop_async_logging
+from server_stats import ServerStats
+from profiler import ServerProfiler
+from request_handler import handle_request
+from buffered_reader import REQUEST_TIMEOUT
+from durability import DURABILITY_LEVELS, GROUP_COMMIT_WINDOW, make_durability
+from replication import Replicator
+from graceful_restart import DRAIN_TIMEOUT, DrainController, notify_ready, open_listener
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class ThreadPoolServer:
-    def __init__(self, ipaddress='0.0.0.0', port=6666, pool_size=5):
+    def __init__(self, ipaddress='0.0.0.0', port=6666, pool_size=5, memory_budget=None, fast_lane_workers=1,
+                 rate_limits=None, min_workers=None, max_workers=None, drain_timeout=DRAIN_TIMEOUT, replicas=None,
+                 durability='none', group_commit_window=GROUP_COMMIT_WINDOW):
         self.ipinfo = (ipaddress, port)
+        # max_workers diisi: mode adaptif, jumlah worker diatur autoscaler di antara min dan max
+        if max_workers:
+            min_workers = min_workers or 1
+            pool_size = min(max_workers, max(min_workers, pool_size))
         self.pool_size = pool_size
-        self.pool = ThreadPoolExecutor(max_workers=pool_size)
-        self.my_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.fp = FileProtocol()
+        if memory_budget:
+            self.admission = AdmissionController(memory_budget=memory_budget)
+        else:
+            self.admission = AdmissionController()
+        # rate_limits: argumen untuk RateLimiter, contoh dict(bytes_per_sec=..., per_client={...})
+        self.rate_limiter = RateLimiter(**(rate_limits or {}))
+        # Scheduler dengan lane terpisah supaya request kecil tidak antri di belakang transfer besar
+        self.pool = SizeAwareScheduler(pool_size=pool_size, fast_lane_workers=fast_lane_workers)
+        self.autoscaler = None
+        if max_workers:
+            self.autoscaler = PoolAutoscaler(self.pool, min_workers=min_workers, max_workers=max_workers,
+                                             admission=self.admission)
+        self.my_socket = None
+        # SIGTERM/SIGINT: drain, SIGHUP: hot restart
+        self.drain = DrainController(drain_timeout)
+        self.stats = ServerStats()
+        self.stats.set_info('engine', 'thread_pool_adaptive' if self.autoscaler else 'thread_pool')
+        self.stats.set_info('pool_size', pool_size)
+        if self.autoscaler:
+            self.stats.set_info('autoscale', f"{self.autoscaler.min_workers}-{self.autoscaler.max_workers}")
+        self.stats.add_gauge_provider('queue_depth', lambda: sum(self.pool.queue_depth().values()))
+        self.stats.add_gauge_provider('workers', lambda: self.pool.pool_size)
+        # Profiling on-demand lewat command PROFILE atau kill -USR1
+        self.profiler = ServerProfiler()
+        # Primary dengan read replica: upload/delete yang selesai dikirim ke replica di background
+        self.replicator = Replicator(replicas).start() if replicas else None
+        if self.replicator:
+            self.stats.add_gauge_provider('replication', self.replicator.status)
+        self.durability = make_durability(durability, group_commit_window)
+        self.stats.add_gauge_provider('durability', self.durability.status)
+        self.fp = FileProtocol(stats=self.stats, profiler=self.profiler, replicator=self.replicator,
+                               durability=self.durability)
+        # Koneksi yang request-nya belum datang saat accept diklasifikasi begitu readable
+        self.head_waiter = HeadWaiter(self.pool, self.fp, self.handle_client)
 
     def handle_client(self, connection, address):
-        try:
-            logging.info(f"Thread {threading.current_thread().name} handling client {address}")
-            
-            # Increased buffer for large files
-            data = connection.recv(8192)
-            if not data:
-                return
+        reservation = self.admission.reservation()
+        started = time.time()
+        self.stats.connection_opened()
+        with self.profiler.request():
+            try:
+                hot_log.info("Thread %s handling client %s", threading.current_thread().name, address)
+                self.rate_limiter.acquire_request(address)
             
-            d = data.decode('utf-8')
-            hasil = self.fp.proses_string(d)
-            hasil = hasil + "\r\n\r\n"
-            connection.sendall(hasil.encode('utf-8'))
-                
-        except Exception as e:
-            logging.error(f"Error handling client {address}: {e}")
-        finally:
-            connection.close()
-            logging.info(f"Connection with {address} closed")
+                # Request dibaca sampai terminator; GET/UPLOAD di-stream per potongan base64
+                connection.settimeout(REQUEST_TIMEOUT)
+                handle_request(connection, address, self.fp, reservation, self.admission,
+                               self.rate_limiter, self.stats, started)
+
+            except Exception as e:
+                logging.error(f"Error handling client {address}: {e}")
+            finally:
+                reservation.release()
+                self.stats.connection_closed()
+                self.drain.untrack(connection)
+                connection.close()
+                hot_log.info("Connection with %s closed", address)
 
     def run(self):
         try:
-            self.my_socket.bind(self.ipinfo)
-            self.my_socket.listen(10)
-            logging.info(f"ThreadPool Server running on {self.ipinfo} with {self.pool_size} workers")
+            self.my_socket = open_listener(self.ipinfo, 10)
+            self.drain.install_signal_handlers()
+            self.profiler.install_signal_handler()
+            if self.autoscaler:
+                self.autoscaler.start()
+                logging.info(f"ThreadPool Server running on {self.ipinfo} with {self.pool_size} workers "
+                             f"(adaptive {self.autoscaler.min_workers}-{self.autoscaler.max_workers})")
+            else:
+                logging.info(f"ThreadPool Server running on {self.ipinfo} with {self.pool_size} workers")
+
+            self.head_waiter.start()
+            notify_ready()
+            while self.drain.check(self.my_socket):
+                try:
+                    connection, address = self.my_socket.accept()
+                except socket.timeout:
+                    continue
+                hot_log.info("New connection from %s", address)
+                self.drain.track(connection)
+                lane = classify_connection(connection, self.fp)
+                if lane is None:
+                    # Request belum datang: tunggu di HeadWaiter, bukan ditebak bulk
+                    self.head_waiter.add(connection, address)
+                else:
+                    self.pool.submit(self.handle_client, connection, address, lane=lane)
+
+            # Koneksi baru ditangani server pengganti (hot restart) atau ditolak
+            self.my_socket.close()
+            if not self.drain.wait():
+                self.drain.abort_remaining()
 
-            while True:
-                connection, address = self.my_socket.accept()
-                logging.info(f"New connection from {address}")
-                self.pool.submit(self.handle_client, connection, address)
-                
         except KeyboardInterrupt:
             logging.info("Server shutdown requested")
         except Exception as e:
@@ -55,10 +128,52 @@ class ThreadPoolServer:
             self.cleanup()
 
     def cleanup(self):
+        if self.autoscaler:
+            self.autoscaler.stop()
+        if self.head_waiter.is_alive():
+            self.head_waiter.stop()
+            self.head_waiter.join()
         self.pool.shutdown(wait=True)
-        self.my_socket.close()
+        if self.replicator:
+            self.replicator.stop()
+        self.durability.stop()
+        if self.my_socket is not None:
+            self.my_socket.close()
         logging.info("Server cleaned up")
 
 if __name__ == "__main__":
-    server = ThreadPoolServer(pool_size=5)
-    server.run()
+    parser = argparse.ArgumentParser(description="Thread pool file server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=6666)
+    parser.add_argument('--pool-size', type=int, default=5)
+    parser.add_argument('--autoscale', action='store_true',
+                        help="Atur jumlah worker otomatis di antara --min-workers dan --max-workers")
+    parser.add_argument('--min-workers', type=int, default=1)
+    parser.add_argument('--max-workers', type=int, default=64)
+    parser.add_argument('--memory-budget-mb', type=int, default=DEFAULT_MEMORY_BUDGET // (1024 * 1024),
+                        help="Memory untuk transfer yang sedang berjalan; request yang melebihinya dijawab BUSY")
+    parser.add_argument('--drain-timeout', type=float, default=DRAIN_TIMEOUT,
+                        help="Detik menunggu transfer aktif selesai saat SIGTERM/SIGHUP sebelum koneksi diputus")
+    parser.add_argument('--replicas', help="Jalankan sebagai primary: upload/delete dikirim ke read replica "
+                                           "host:port,host:port")
+    parser.add_argument('--durability', choices=DURABILITY_LEVELS, default='none',
+                        help="none: tanpa fsync; fsync: fsync per upload; group: fsync upload yang selesai "
+                             "berdekatan sekaligus. OK dikirim setelah data di disk (kecuali none)")
+    parser.add_argument('--group-commit-ms', type=float, default=GROUP_COMMIT_WINDOW * 1000,
+                        help="Jendela pengumpulan batch untuk --durability group")
+    add_rate_limit_arguments(parser)
+    args = parser.parse_args()
+
+    # Semua log lewat satu writer thread, access log satu baris per request
+    setup_async_logging(access_log_path='access.log')
+    server = ThreadPoolServer(ipaddress=args.host, port=args.port, pool_size=args.pool_size,
+                              memory_budget=args.memory_budget_mb * 1024 * 1024,
+                              min_workers=args.min_workers if args.autoscale else None,
+                              max_workers=args.max_workers if args.autoscale else None,
+                              drain_timeout=args.drain_timeout, replicas=args.replicas,
+                              durability=args.durability, group_commit_window=args.group_commit_ms / 1000,
+                              rate_limits=rate_limits_from_args(args))
+    try:
+        server.run()
+    finally:
+        stop_async_logging()
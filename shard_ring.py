@@ -0,0 +1,114 @@
+import bisect
+import hashlib
+
+# Titik per node di ring: makin banyak makin rata pembagian file antar node
+VIRTUAL_NODES = 160
+
+
+def parse_nodes(spec, default_host='localhost'):
+    """'host:port,host:port' (or a list of such strings / (host, port) tuples) -> [(host, port), ...]"""
+    if isinstance(spec, str):
+        spec = [s for s in spec.split(',') if s.strip()]
+    nodes = []
+    for item in spec:
+        if isinstance(item, (tuple, list)):
+            host, port = item
+        else:
+            host, _, port = item.strip().rpartition(':')
+        node = (host or default_host, int(port))
+        if node not in nodes:
+            nodes.append(node)
+    return nodes
+
+
+def node_name(node):
+    return f"{node[0]}:{node[1]}"
+
+
+def _hash(key):
+    # md5 hanya untuk sebaran yang rata dan sama di semua client, bukan keamanan
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent-hash ring mapping file names to server nodes.
+
+    Setiap node ditempatkan di VIRTUAL_NODES titik; file milik node dengan
+    titik pertama searah jarum jam dari hash nama file. Menambah atau
+    menghapus satu node hanya memindahkan file di sekitar titik node itu
+    (sekitar 1/N dari semua file), bukan mengacak ulang semuanya.
+    """
+
+    def __init__(self, nodes=(), vnodes=VIRTUAL_NODES):
+        self.vnodes = vnodes
+        self._points = []  # hash titik, terurut
+        self._owners = []  # node untuk titik pada index yang sama
+        self._nodes = []
+        for node in parse_nodes(nodes):
+            self.add_node(node)
+
+    @property
+    def nodes(self):
+        return list(self._nodes)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def add_node(self, node):
+        node = parse_nodes([node])[0]
+        if node in self._nodes:
+            return
+        self._nodes.append(node)
+        for i in range(self.vnodes):
+            point = _hash(f"{node_name(node)}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove_node(self, node):
+        node = parse_nodes([node])[0]
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    def node_for(self, filename):
+        """(host, port) of the node that owns `filename`"""
+        if not self._points:
+            raise ValueError("hash ring has no nodes")
+        index = bisect.bisect(self._points, _hash(filename)) % len(self._points)
+        return self._owners[index]
+
+    def distribution(self, filenames):
+        """{node: number of the given files it owns}, to check how evenly the ring spreads them"""
+        counts = {node: 0 for node in self._nodes}
+        for filename in filenames:
+            counts[self.node_for(filename)] += 1
+        return counts
+
+
+def plan_rebalance(ring, files_by_node):
+    """Moves needed so every file sits on its owner in `ring`: [(filename, source, target), ...].
+
+    files_by_node: {node: [nama file]} hasil LIST tiap node, termasuk node
+    yang baru ditambahkan atau akan dilepas.
+    """
+    moves = []
+    for source, filenames in files_by_node.items():
+        for filename in filenames:
+            target = ring.node_for(filename)
+            if target != source:
+                moves.append((filename, source, target))
+    return moves
+
+
+if __name__ == '__main__':
+    names = [f"file_{i}.bin" for i in range(10000)]
+    ring = HashRing('localhost:6666,localhost:6667,localhost:6668')
+    print("Distribution over 3 nodes:", {node_name(n): c for n, c in ring.distribution(names).items()})
+    before = {name: ring.node_for(name) for name in names}
+    ring.add_node('localhost:6669')
+    moved = sum(1 for name in names if ring.node_for(name) != before[name])
+    print(f"Adding a 4th node moves {moved}/{len(names)} files ({moved * 100 / len(names):.1f}%, ideal 25%)")
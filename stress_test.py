@@ -1,67 +1,93 @@
+import asyncio
 import concurrent.futures
+import functools
+import multiprocessing as mp
 import time
 import os
+import signal
 import socket
 import threading
 import logging
+import math
 import csv
-import json
 import base64
 from datetime import datetime
 import statistics
+import argparse
+from benchmark_results import save_results_json
+from resource_monitor import ResourceMonitor
+from async_client import AsyncFileClient, raise_fd_limit
+from buffered_reader import BufferedReader, TERMINATOR
+from client_protocol import decode_response, encode_get, encode_list
+from shard_ring import HashRing
+from replication import LeastOutstanding
 
 # Setup logging
 logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class FileClient:
-    def __init__(self, server_address=('localhost', 6666)):
+    def __init__(self, server_address=('localhost', 6666), source_address=None, retries=2):
         self.server_address = server_address
+        # Bind ke IP lokal tertentu (misal 127.0.0.2) untuk mensimulasikan client berbeda
+        self.source_address = source_address
+        # Jumlah percobaan kalau koneksi gagal (BUSY tidak dihitung); 1 = tanpa retry
+        self.retries = retries
 
     def send_command_robust(self, command, timeout=120):
         """Send command with robust error handling"""
-        max_retries = 2
+        max_retries = self.retries
+        max_busy_retries = 10
+        busy_retries = 0
+        attempt = 0
         
-        for attempt in range(max_retries):
+        while attempt < max_retries:
             sock = None
             try:
                 sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                 sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
                 sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
                 sock.settimeout(timeout)
+                if self.source_address:
+                    sock.bind((self.source_address, 0))
                 sock.connect(self.server_address)
                 
-                # Send command in chunks
-                command_bytes = command.encode('utf-8')
+                # Send command in chunks, diakhiri terminator
+                command_bytes = command.encode('utf-8') if isinstance(command, str) else command
                 chunk_size = 32768
                 
-                for i in range(0, len(command_bytes), chunk_size):
-                    chunk = command_bytes[i:i + chunk_size]
-                    sock.sendall(chunk)
+                try:
+                    with memoryview(command_bytes) as view:
+                        for i in range(0, len(view), chunk_size):
+                            sock.sendall(view[i:i + chunk_size])
+                    sock.sendall(TERMINATOR)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Server mungkin sudah membalas BUSY dan menutup koneksi di tengah upload,
+                    # response-nya masih bisa dibaca dari socket
+                    pass
                 
-                # Receive response
-                response_data = b""
-                while True:
-                    try:
-                        data = sock.recv(32768)
-                        if data:
-                            response_data += data
-                            if b"\r\n\r\n" in response_data:
-                                break
-                        else:
-                            break
-                    except socket.timeout:
-                        break
+                # Receive response ke buffer yang tumbuh (recv_into), tanpa concat
+                reader = BufferedReader(sock)
+                try:
+                    message = reader.read_until()
+                except socket.timeout:
+                    message = reader.take_pending()
                 
-                if response_data:
-                    response_str = response_data.decode('utf-8', errors='ignore')
-                    response_str = response_str.replace("\r\n\r\n", "")
-                    result = json.loads(response_str)
+                if message is not None:
+                    with message:
+                        result = decode_response(message)
+                    
+                    # Server kelebihan beban: tunggu sesuai hint lalu coba lagi
+                    if result.get('status') == 'BUSY' and busy_retries < max_busy_retries:
+                        busy_retries += 1
+                        time.sleep(result.get('retry_after_ms', 500) / 1000.0)
+                        continue
                     return result
                 else:
                     return {'status': 'ERROR', 'message': 'No response'}
                     
             except Exception as e:
-                if attempt == max_retries - 1:
+                attempt += 1
+                if attempt >= max_retries:
                     return {'status': 'ERROR', 'message': str(e)}
                 time.sleep(0.5)
             finally:
@@ -73,13 +99,13 @@ class FileClient:
         
         return {'status': 'ERROR', 'message': 'Max retries exceeded'}
 
-    def upload_file(self, file_path):
-        """Upload file to server using proper protocol"""
+    def upload_file(self, file_path, filename=None):
+        """Upload file to server using proper protocol; stored as `filename` (default: its basename)"""
         try:
             with open(file_path, 'rb') as f:
                 file_content = base64.b64encode(f.read()).decode()
             
-            filename = os.path.basename(file_path)
+            filename = filename or os.path.basename(file_path)
             command = f"UPLOAD {filename} {file_content}"
             
             # Adjust timeout based on file size
@@ -104,6 +130,222 @@ class FileClient:
             logging.debug(f"Download error: {e}")
             return False
 
+    def file_version(self, filename):
+        """Version of `filename` from STAT, or None if the file (or STAT) is not there"""
+        result = self.send_command_robust(f"STAT {filename}", 30)
+        return result.get('version') if result.get('status') == 'OK' else None
+
+    def server_stats(self):
+        """Live metrics from the server STATS command, or None if the server has no STATS"""
+        result = self.send_command_robust("STATS", 30)
+        if result.get('status') == 'OK':
+            return result['data']
+        return None
+
+    def list_files(self):
+        """List files on server"""
+        try:
+            result = self.send_command_robust("LIST", 30)
+            return result.get('status') == 'OK'
+            
+        except Exception as e:
+            logging.debug(f"List error: {e}")
+            return False
+
+class ShardedFileClient:
+    """FileClient for several server nodes: each file goes to its owner on a consistent-hash ring"""
+
+    def __init__(self, nodes, retries=2):
+        self.ring = HashRing(nodes)
+        self.clients = {node: FileClient(node, retries=retries) for node in self.ring.nodes}
+
+    def client_for(self, filename):
+        return self.clients[self.ring.node_for(filename)]
+
+    def upload_file(self, file_path, filename=None):
+        filename = filename or os.path.basename(file_path)
+        return self.client_for(filename).upload_file(file_path, filename)
+
+    def download_file(self, filename):
+        return self.client_for(filename).download_file(filename)
+
+    def list_files(self):
+        """LIST fanned out to every node; True only if all of them answered"""
+        return all(client.list_files() for client in self.clients.values())
+
+    def server_stats(self):
+        """{node: STATS snapshot or None}"""
+        return {node: client.server_stats() for node, client in self.clients.items()}
+
+class ReplicatedFileClient:
+    """FileClient for a primary with read replicas.
+
+    Upload/delete ke primary (primary yang mereplikasi). GET disebar ke
+    primary dan replica yang request-nya paling sedikit sedang berjalan dari
+    client ini; versi file dari STAT ke primary dibandingkan dengan versi di
+    response, kalau replica belum menerima versi terbaru dibaca ulang dari
+    primary sehingga tidak ada baca basi setelah file ditimpa.
+    """
+
+    def __init__(self, primary, replicas, retries=2):
+        self.primary = FileClient(primary, retries=retries)
+        self.balancer = LeastOutstanding([primary] + list(replicas))
+        self.clients = {node: FileClient(node, retries=retries) for node in self.balancer.nodes}
+        self.clients[self.balancer.nodes[0]] = self.primary
+        # GET per node dan yang dibaca ulang dari primary karena replica tertinggal
+        self.reads = {node: 0 for node in self.balancer.nodes}
+        self.stale_reads = 0
+
+    def upload_file(self, file_path, filename=None):
+        return self.primary.upload_file(file_path, filename)
+
+    def download_file(self, filename):
+        version = self.primary.file_version(filename)
+        if version is None:
+            return False
+        with self.balancer.use() as node:
+            result = self.clients[node].send_command_robust(f"GET {filename}", 120)
+        self.reads[node] += 1
+        if result.get('status') == 'OK' and result.get('version') == version:
+            return True
+        if self.clients[node] is self.primary:
+            return result.get('status') == 'OK'
+        self.stale_reads += 1
+        return self.primary.download_file(filename)
+
+    def list_files(self):
+        return self.primary.list_files()
+
+    def server_stats(self):
+        """{node: STATS snapshot or None}"""
+        return {node: client.server_stats() for node, client in self.clients.items()}
+
+# State per client process (ProcessPoolExecutor), di-set oleh initializer
+_process_client = None
+_process_barrier = None
+
+def _init_client_process(server_address, barrier):
+    global _process_client, _process_barrier
+    _process_client = FileClient(server_address)
+    _process_barrier = barrier
+
+def run_operation(client, operation, file_path, test_id, barrier=None):
+    """One upload/download, timed after all clients passed the start barrier.
+
+    File dibaca sendiri oleh worker dari path-nya, yang lewat IPC hanya dict hasil kecil.
+    """
+    if barrier is not None:
+        try:
+            barrier.wait(timeout=120)
+        except Exception:
+            # Barrier rusak (client lain gagal start), tetap jalan tanpa menunggu
+            pass
+    
+    started = time.time()
+    success = False
+    
+    try:
+        if operation == "upload":
+            success = client.upload_file(file_path)
+        elif operation == "download":
+            filename = os.path.basename(file_path)
+            success = client.download_file(filename)
+        
+    except Exception as e:
+        logging.debug(f"Test {test_id} error: {e}")
+    
+    finished = time.time()
+    operation_time = finished - started
+    
+    file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+    throughput = file_size / operation_time if operation_time > 0 and success else 0
+    
+    return {
+        'test_id': test_id,
+        'success': success,
+        'time': operation_time,
+        'size': file_size,
+        'throughput': throughput,
+        'started': started,
+        'finished': finished,
+        'thread': f"{os.getpid()}/{threading.current_thread().name}"
+    }
+
+def _process_operation_test(operation, file_path, test_id):
+    return run_operation(_process_client, operation, file_path, test_id, _process_barrier)
+
+async def _async_operation(client, operation, file_path, test_id, start_event):
+    """run_operation for one coroutine client of the asyncio model"""
+    await start_event.wait()
+    started = time.time()
+    success = False
+    try:
+        if operation == "upload":
+            result = await client.upload(file_path)
+        else:
+            result = await client.get(os.path.basename(file_path))
+        success = result.get('status') == 'OK'
+    except Exception as e:
+        logging.debug(f"Test {test_id} error: {e}")
+    finished = time.time()
+    operation_time = finished - started
+    file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+    return {
+        'test_id': test_id,
+        'success': success,
+        'time': operation_time,
+        'size': file_size,
+        'throughput': file_size / operation_time if operation_time > 0 and success else 0,
+        'started': started,
+        'finished': finished,
+        'thread': f"{os.getpid()}/asyncio-{test_id}"
+    }
+
+def run_async_clients(server_address, operation, file_path, workers, timeout):
+    """All clients as coroutines in one event loop; an Event plays the role of the start barrier"""
+    raise_fd_limit(workers + 64)
+    
+    async def run_all():
+        client = AsyncFileClient(server_address, timeout=timeout)
+        start_event = asyncio.Event()
+        tasks = [asyncio.create_task(_async_operation(client, operation, file_path, i, start_event))
+                 for i in range(workers)]
+        # Beri kesempatan semua task sampai di start_event.wait() dulu
+        await asyncio.sleep(0)
+        start_event.set()
+        return await asyncio.gather(*tasks)
+    
+    return asyncio.run(run_all())
+
+def diff_server_stats(before, after):
+    """Per-worker and total request counts the server handled between two STATS snapshots"""
+    if not before or not after:
+        return None
+    workers = {}
+    for name, counts in after.get('workers', {}).items():
+        prev = before.get('workers', {}).get(name, {})
+        delta = {k: counts[k] - prev.get(k, 0) for k in ('completed', 'failed', 'rejected')}
+        if any(delta.values()):
+            workers[name] = delta
+    return {
+        'workers': workers,
+        'worker_sukses': sum(1 for d in workers.values() if d['completed'] and not d['failed'] and not d['rejected']),
+        'worker_gagal': sum(1 for d in workers.values() if d['failed'] or d['rejected']),
+        'requests_sukses': sum(d['completed'] for d in workers.values()),
+        'requests_gagal': sum(d['failed'] for d in workers.values()),
+        # Termasuk penolakan di acceptor (misalnya batas process penuh) yang tidak milik worker manapun
+        'requests_ditolak': after.get('rejected', 0) - before.get('rejected', 0),
+        'pool_size': after.get('info', {}).get('pool_size'),
+        'engine': after.get('info', {}).get('engine'),
+    }
+
+def percentile(values, p):
+    """Nearest-rank percentile (p dalam 0-100)"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100.0 * len(ordered)) - 1)]
+
 class ComprehensiveStressTest:
     def __init__(self, server_address=('localhost', 6666)):
         self.server_address = server_address
@@ -148,65 +390,41 @@ class ComprehensiveStressTest:
         print("All test files ready!")
         return True
 
-    def single_operation_test(self, operation, file_path, test_id):
+    def single_operation_test(self, operation, file_path, test_id, barrier=None):
         """Single operation test with better error handling"""
-        start_time = time.time()
-        success = False
-        
-        try:
-            if operation == "upload":
-                success = self.client.upload_file(file_path)
-            elif operation == "download":
-                filename = os.path.basename(file_path)
-                success = self.client.download_file(filename)
-            
-        except Exception as e:
-            logging.debug(f"Test {test_id} error: {e}")
-        
-        end_time = time.time()
-        operation_time = end_time - start_time
-        
-        file_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
-        throughput = file_size / operation_time if operation_time > 0 and success else 0
-        
-        return {
-            'test_id': test_id,
-            'success': success,
-            'time': operation_time,
-            'size': file_size,
-            'throughput': throughput,
-            'thread': threading.current_thread().name
-        }
+        return run_operation(self.client, operation, file_path, test_id, barrier)
 
-    def run_stress_test(self, operation, volume_mb, jumlah_client_worker, jumlah_server_worker):
-        """Run stress test with specified parameters"""
-        print(f"Running {operation} test: {volume_mb}MB, {jumlah_client_worker} clients, {jumlah_server_worker} server workers")
-        
-        test_file = self.test_files.get(volume_mb)
-        if not test_file or not os.path.exists(test_file):
-            print(f"Error: Test file for {volume_mb}MB not found!")
-            return None
-        
-        start_time = time.time()
+    def client_executor(self, client_model, workers):
+        """Executor plus start barrier for exactly `workers` concurrent clients.
+
+        thread: ThreadPoolExecutor, client berbagi GIL (base64 upload jadi serial).
+        process: ProcessPoolExecutor, satu process per client dengan FileClient sendiri.
+        Model async tidak memakai executor, lihat run_async_clients.
+        """
+        if client_model == 'process':
+            barrier = mp.Barrier(workers)
+            executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_client_process, initargs=(self.server_address, barrier))
+            return executor, _process_operation_test
+        barrier = threading.Barrier(workers)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        return executor, functools.partial(self.single_operation_test, barrier=barrier)
+
+    def run_pool_clients(self, client_model, operation, test_file, jumlah_client_worker, timeout_per_test):
+        """Run the clients of one combination on a thread or process pool"""
         results = []
         
-        # Reduce concurrent workers for better success rate
-        actual_workers = min(jumlah_client_worker, 10)  # Max 10 concurrent for stability
+        # Tepat jumlah_client_worker client bersamaan, semua mulai setelah barrier terbuka
+        executor, operation_test = self.client_executor(client_model, jumlah_client_worker)
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=actual_workers) as executor:
+        with executor:
             # Submit all tasks
             futures = []
             for i in range(jumlah_client_worker):
-                future = executor.submit(self.single_operation_test, operation, test_file, i)
+                future = executor.submit(operation_test, operation, test_file, i)
                 futures.append(future)
-                
-                # Add small delay between submissions for large file tests
-                if volume_mb >= 50:
-                    time.sleep(0.1)
             
             # Collect results with extended timeout
-            timeout_per_test = 300 if volume_mb >= 50 else 180  # 5 minutes for large files
-            
             for i, future in enumerate(futures):
                 try:
                     result = future.result(timeout=timeout_per_test)
@@ -233,8 +451,40 @@ class ComprehensiveStressTest:
                         'size': 0,
                         'throughput': 0
                     })
+        return results
+
+    def run_stress_test(self, operation, volume_mb, jumlah_client_worker, jumlah_server_worker, client_model='thread'):
+        """Run stress test with specified parameters"""
+        print(f"Running {operation} test: {volume_mb}MB, {jumlah_client_worker} {client_model} clients, "
+              f"{jumlah_server_worker} server workers")
+        
+        test_file = self.test_files.get(volume_mb)
+        if not test_file or not os.path.exists(test_file):
+            print(f"Error: Test file for {volume_mb}MB not found!")
+            return None
+        
+        stats_before = self.client.server_stats()
+        if stats_before is None:
+            print("  Warning: server does not support STATS, server columns will be empty")
+        
+        # RSS/CPU/FD/thread/process server dari /proc selama combination ini berjalan
+        monitor = self.start_resource_monitor(stats_before)
+        
+        start_time = time.time()
+        timeout_per_test = 300 if volume_mb >= 50 else 180  # 5 minutes for large files
+        if client_model == 'async':
+            results = run_async_clients(self.server_address, operation, test_file, jumlah_client_worker,
+                                        timeout_per_test)
+        else:
+            results = self.run_pool_clients(client_model, operation, test_file, jumlah_client_worker,
+                                            timeout_per_test)
         
         end_time = time.time()
+        # Waktu dihitung dari barrier terbuka, tanpa waktu start thread/process client
+        started = [r['started'] for r in results if 'started' in r]
+        if started:
+            start_time = min(started)
+            end_time = max(r['finished'] for r in results if 'finished' in r)
         
         # Calculate metrics
         successful_results = [r for r in results if r['success']]
@@ -242,8 +492,17 @@ class ComprehensiveStressTest:
         
         worker_client_sukses = len(successful_results)
         worker_client_gagal = len(failed_results)
-        worker_server_sukses = min(worker_client_sukses, jumlah_server_worker)
-        worker_server_gagal = jumlah_server_worker - worker_server_sukses
+        
+        # Kolom server diambil dari counter STATS di server, bukan diturunkan dari hasil client
+        server = diff_server_stats(stats_before, self.wait_server_idle())
+        resources = monitor.stop() if monitor else None
+        if server:
+            worker_server_sukses = server['worker_sukses']
+            worker_server_gagal = server['worker_gagal']
+            if server['pool_size'] is not None and server['pool_size'] != jumlah_server_worker:
+                print(f"  Warning: server runs with pool size {server['pool_size']}, not {jumlah_server_worker}")
+        else:
+            worker_server_sukses = worker_server_gagal = None
         
         waktu_total_per_client = end_time - start_time
         
@@ -254,8 +513,19 @@ class ComprehensiveStressTest:
             throughput_per_client = 0
         
         print(f"  Completed - Success: {worker_client_sukses}/{jumlah_client_worker}")
+        if server:
+            print(f"  Server - workers OK: {worker_server_sukses}, failed: {worker_server_gagal}, "
+                  f"requests OK/failed/rejected: {server['requests_sukses']}/{server['requests_gagal']}/"
+                  f"{server['requests_ditolak']}")
+        if resources:
+            print(f"  Server resources - peak PSS {resources['peak_pss_mb']}MB (RSS {resources['peak_rss_mb']}MB), "
+                  f"CPU {resources['cpu_s']}s "
+                  f"({resources['cpu_percent']}%), peak FDs {resources['peak_fds']}/{resources['fd_limit']}, "
+                  f"peak threads {resources['peak_threads']}, peak processes {resources['peak_processes']}")
         
         return {
+            'engine': server['engine'] if server else None,
+            'client_model': client_model,
             'operasi': operation,
             'volume': f"{volume_mb}MB",
             'jumlah_client_worker': jumlah_client_worker,
@@ -265,12 +535,272 @@ class ComprehensiveStressTest:
             'worker_client_sukses': worker_client_sukses,
             'worker_client_gagal': worker_client_gagal,
             'worker_server_sukses': worker_server_sukses,
-            'worker_server_gagal': worker_server_gagal
+            'worker_server_gagal': worker_server_gagal,
+            'server_request_sukses': server['requests_sukses'] if server else None,
+            'server_request_gagal': server['requests_gagal'] if server else None,
+            'server_request_ditolak': server['requests_ditolak'] if server else None,
+            'server_peak_rss_mb': resources['peak_rss_mb'] if resources else None,
+            'server_peak_pss_mb': resources['peak_pss_mb'] if resources else None,
+            'server_cpu_s': resources['cpu_s'] if resources else None,
+            'server_peak_fds': resources['peak_fds'] if resources else None,
+            'server_peak_threads': resources['peak_threads'] if resources else None,
+            'server_peak_processes': resources['peak_processes'] if resources else None,
+            'server_ctx_switches': resources['ctx_switches'] if resources else None,
+            # Time series lengkap hanya masuk JSON
+            'server_resources': resources,
+            # Sampel mentah per client untuk perbandingan statistik (benchmark_results.py compare)
+            'samples': [{k: r.get(k) for k in ('test_id', 'success', 'time', 'size', 'throughput')}
+                        for r in results],
         }
 
-def run_all_combinations():
-    """Run all test combinations as per assignment requirements"""
-    test = ComprehensiveStressTest()
+    def start_resource_monitor(self, stats):
+        """Sample the server from /proc, only when it runs on this machine"""
+        pid = (stats or {}).get('info', {}).get('pid')
+        host = self.server_address[0]
+        if host not in ('localhost', '0.0.0.0') and not host.startswith('127.'):
+            return None
+        if not ResourceMonitor.available(pid):
+            return None
+        return ResourceMonitor(pid, server_counts=self.server_context_switches).start()
+
+    def server_context_switches(self):
+        """Cumulative (voluntary, involuntary) context switches the server reports in STATS, None if absent"""
+        counts = (self.client.server_stats() or {}).get('context_switches')
+        return (counts['voluntary'], counts['involuntary']) if counts else None
+
+    def wait_server_idle(self, timeout=5):
+        """STATS snapshot once the server has finished recording in-flight requests"""
+        deadline = time.time() + timeout
+        stats = self.client.server_stats()
+        # Koneksi STATS itu sendiri masih terbuka saat snapshot diambil
+        while stats and stats.get('active_connections', 0) > 1 and time.time() < deadline:
+            time.sleep(0.1)
+            stats = self.client.server_stats()
+        return stats
+
+    def run_latency_under_load(self, volume_mb=100, bulk_clients=5, small_requests=200, small_concurrency=5,
+                               late_delay=0.02):
+        """Measure small-request latency (LIST, 1KB GET) while bulk downloads occupy the server.
+
+        Fase 'late' (bersamaan dengan bulk-load) membuka koneksi dulu dan baru
+        mengirim request setelah late_delay detik, jadi server tidak bisa
+        melihat command saat accept.
+        Latency diukur sejak request dikirim; p99-nya harus tetap datar
+        dibanding fase bulk-load (koneksi itu tidak boleh antri di bulk lane).
+        """
+        print(f"Running head-of-line test: {bulk_clients} x {volume_mb}MB downloads + {small_requests} small requests")
+        
+        test_file = self.test_files.get(volume_mb)
+        if not test_file or not os.path.exists(test_file):
+            print(f"Error: Test file for {volume_mb}MB not found!")
+            return None
+        
+        # File kecil untuk GET 1KB, diupload dulu ke server
+        small_file = "test_1KB.txt"
+        with open(small_file, 'w') as f:
+            f.write("A" * 1024)
+        self.client.upload_file(small_file)
+        self.client.upload_file(test_file)
+        
+        def small_request(i):
+            start = time.time()
+            if i % 2 == 0:
+                success = self.client.list_files()
+            else:
+                success = self.client.download_file(small_file)
+            return time.time() - start, success
+        
+        def late_request(i):
+            command = encode_list() if i % 2 == 0 else encode_get(os.path.basename(small_file))
+            try:
+                with socket.create_connection(self.server_address, timeout=30) as sock:
+                    time.sleep(late_delay)
+                    start = time.time()
+                    sock.sendall(command + TERMINATOR)
+                    message = BufferedReader(sock).read_until()
+                    if message is None:
+                        return time.time() - start, False
+                    with message:
+                        success = decode_response(message).get('status') == 'OK'
+                    return time.time() - start, success
+            except OSError as e:
+                logging.debug(f"Late request {i} error: {e}")
+                return 0, False
+        
+        def measure_small(label, request=small_request):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=small_concurrency) as executor:
+                samples = list(executor.map(request, range(small_requests)))
+            latencies = [t for t, ok in samples if ok]
+            failed = sum(1 for _, ok in samples if not ok)
+            result = {
+                'phase': label,
+                'requests': small_requests,
+                'failed': failed,
+                'p50': percentile(latencies, 50),
+                'p99': percentile(latencies, 99),
+                'max': max(latencies) if latencies else 0,
+            }
+            print(f"  {label:<10} p50={result['p50']*1000:.1f}ms p99={result['p99']*1000:.1f}ms "
+                  f"max={result['max']*1000:.1f}ms failed={failed}")
+            return result
+        
+        idle = measure_small('idle')
+        
+        # Jalankan bulk download di background, lalu ukur ulang request kecil. Client bulk di process
+        # terpisah: decode base64 100MB di client menahan GIL dan ikut terukur sebagai latency server
+        bulk_executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=bulk_clients, initializer=_init_client_process, initargs=(self.server_address, None))
+        bulk_futures = [bulk_executor.submit(_process_operation_test, 'download', test_file, i)
+                        for i in range(bulk_clients)]
+        time.sleep(0.5)
+        # Fase late berjalan bersamaan dengan bulk-load supaya keduanya mengukur beban bulk yang sama
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as phases:
+            loaded_future = phases.submit(measure_small, 'bulk-load')
+            late_future = phases.submit(measure_small, 'late', late_request)
+            loaded, late = loaded_future.result(), late_future.result()
+        bulk_running = sum(1 for f in bulk_futures if not f.done())
+        bulk_results = [f.result() for f in bulk_futures]
+        bulk_executor.shutdown()
+        
+        bulk_ok = sum(1 for r in bulk_results if r['success'])
+        print(f"  Bulk downloads succeeded: {bulk_ok}/{bulk_clients} ({bulk_running} still running after late phase)")
+        return {'idle': idle, 'bulk_load': loaded, 'late': late, 'late_delay': late_delay,
+                'bulk_success': bulk_ok, 'bulk_clients': bulk_clients, 'bulk_running_after_late': bulk_running}
+
+    def run_fairness_test(self, volume_mb=10, heavy_parallel=20, light_clients=3, duration=30):
+        """One aggressive client vs several light clients, each from its own loopback address"""
+        print(f"Running fairness test: 1 heavy client x {heavy_parallel} parallel downloads, "
+              f"{light_clients} light clients x 1 download, {duration}s")
+        
+        test_file = self.test_files.get(volume_mb)
+        if not test_file or not os.path.exists(test_file):
+            print(f"Error: Test file for {volume_mb}MB not found!")
+            return None
+        filename = os.path.basename(test_file)
+        file_size = os.path.getsize(test_file)
+        
+        # Setiap client memakai IP loopback sendiri supaya server melihat alamat yang berbeda
+        clients = [('heavy', '127.0.0.2', heavy_parallel)]
+        clients += [(f'light-{i}', f'127.0.0.{i + 3}', 1) for i in range(light_clients)]
+        
+        stats = {name: {'address': ip, 'parallel': n, 'completed': 0, 'failed': 0} for name, ip, n in clients}
+        stats_lock = threading.Lock()
+        deadline = time.time() + duration
+        
+        def download_loop(name, ip):
+            client = FileClient(self.server_address, source_address=ip)
+            while time.time() < deadline:
+                success = client.download_file(filename)
+                with stats_lock:
+                    stats[name]['completed' if success else 'failed'] += 1
+        
+        threads = []
+        for name, ip, parallel in clients:
+            for _ in range(parallel):
+                t = threading.Thread(target=download_loop, args=(name, ip), daemon=True)
+                t.start()
+                threads.append(t)
+        for t in threads:
+            t.join()
+        elapsed = time.time() - (deadline - duration)
+        
+        throughputs = []
+        print(f"  {'client':<10} {'address':<12} {'parallel':<9} {'completed':<10} {'failed':<7} throughput")
+        for name, ip, parallel in clients:
+            entry = stats[name]
+            entry['throughput'] = entry['completed'] * file_size / elapsed
+            throughputs.append(entry['throughput'])
+            print(f"  {name:<10} {ip:<12} {parallel:<9} {entry['completed']:<10} {entry['failed']:<7} "
+                  f"{entry['throughput'] / (1024 * 1024):.2f} MB/s")
+        
+        # Jain's fairness index: 1.0 = semua client dapat bandwidth sama
+        total = sum(throughputs)
+        squares = sum(t * t for t in throughputs)
+        fairness = (total * total) / (len(throughputs) * squares) if squares else 0
+        print(f"  Jain fairness index: {fairness:.3f}")
+        return {'clients': stats, 'fairness_index': fairness, 'elapsed': elapsed}
+
+    def run_restart_test(self, volume_mb=100, clients=5, duration=30, restarts=3):
+        """Hot restarts (SIGHUP) under load; every request must succeed across the restarts.
+
+        Client tidak me-retry koneksi yang gagal (BUSY tetap boleh), jadi koneksi
+        yang ditolak atau transfer yang terputus saat restart langsung terhitung gagal.
+        Server harus berjalan di mesin yang sama: pid diambil dari STATS.
+        """
+        test_file = self.test_files.get(volume_mb)
+        if not test_file or not os.path.exists(test_file):
+            print(f"Error: Test file for {volume_mb}MB not found!")
+            return None
+        if not self.client.upload_file(test_file):
+            print(f"Error: could not upload {test_file} to the server")
+            return None
+        print(f"Running restart test: {clients} clients x download/upload {volume_mb}MB + LIST for {duration}s, "
+              f"{restarts} hot restarts")
+        
+        operations = ['download', 'upload', 'list']
+        counts = {op: {'completed': 0, 'failed': 0} for op in operations}
+        counts_lock = threading.Lock()
+        deadline = time.time() + duration
+        
+        def client_loop(i):
+            client = FileClient(self.server_address, retries=1)
+            n = i
+            while time.time() < deadline:
+                op = operations[n % len(operations)]
+                n += 1
+                if op == 'download':
+                    success = client.download_file(os.path.basename(test_file))
+                elif op == 'upload':
+                    success = client.upload_file(test_file)
+                else:
+                    success = client.list_files()
+                with counts_lock:
+                    counts[op]['completed' if success else 'failed'] += 1
+        
+        threads = [threading.Thread(target=client_loop, args=(i,), daemon=True) for i in range(clients)]
+        for t in threads:
+            t.start()
+        
+        # Restart tersebar rata selama test, saat transfer sedang berjalan
+        restart_log = []
+        for r in range(restarts):
+            time.sleep(max(0.0, deadline - duration + duration * (r + 1) / (restarts + 1) - time.time()))
+            stats = self.client.server_stats()
+            old_pid = (stats or {}).get('info', {}).get('pid')
+            if not old_pid:
+                print("  Server pid not available from STATS, stopping restarts")
+                break
+            os.kill(old_pid, signal.SIGHUP)
+            started = time.time()
+            new_pid = old_pid
+            # Server lama masih menjawab STATS sampai server baru siap
+            while new_pid == old_pid and time.time() - started < 30:
+                time.sleep(0.2)
+                new_pid = (self.client.server_stats() or {}).get('info', {}).get('pid', old_pid)
+            restart_log.append({'old_pid': old_pid, 'new_pid': new_pid, 'seconds': time.time() - started})
+            print(f"  Restart {r + 1}: pid {old_pid} -> {new_pid} ({time.time() - started:.1f}s)")
+        
+        for t in threads:
+            t.join()
+        
+        print(f"  {'operation':<10} {'completed':<10} failed")
+        for op in operations:
+            print(f"  {op:<10} {counts[op]['completed']:<10} {counts[op]['failed']}")
+        failed = sum(c['failed'] for c in counts.values())
+        restarted = sum(1 for r in restart_log if r['new_pid'] != r['old_pid'])
+        passed = failed == 0 and restarted == restarts
+        print(f"  Restarts completed: {restarted}/{restarts}, failed requests: {failed} -> "
+              f"{'PASS' if passed else 'FAIL'}")
+        return {'operations': counts, 'restarts': restart_log, 'failed': failed, 'passed': passed}
+
+def run_all_combinations(server_address=('localhost', 6666), operations=None, volumes=None,
+                         client_workers=None, server_workers=None, client_models=None):
+    """Run all test combinations as per assignment requirements.
+
+    server_workers hanya label: pool size server ditentukan saat server dijalankan
+    (lihat benchmark_orchestrator.py yang menjalankan server per konfigurasi).
+    """
+    test = ComprehensiveStressTest(server_address=server_address)
     
     if not test.create_test_files():
         print("Failed to create test files!")
@@ -278,35 +808,42 @@ def run_all_combinations():
     
     results = []
     
-    operations = ['upload', 'download']
-    volumes = [10, 50, 100]
-    client_workers = [1, 5, 50]
-    server_workers = [1, 5, 50]
+    operations = operations or ['upload', 'download']
+    volumes = volumes or [10, 50, 100]
+    client_workers = client_workers or [1, 5, 50]
+    server_workers = server_workers or [1, 5, 50]
+    client_models = client_models or ['thread']
     
-    total_tests = len(operations) * len(volumes) * len(client_workers) * len(server_workers)
+    total_tests = len(client_models) * len(operations) * len(volumes) * len(client_workers) * len(server_workers)
     test_number = 1
     
     print(f"\nStarting comprehensive stress test with {total_tests} combinations...")
     print("=" * 100)
     
-    for operation in operations:
-        for volume in volumes:
-            for client_worker in client_workers:
-                for server_worker in server_workers:
-                    print(f"\nTest {test_number}/{total_tests}: {operation} {volume}MB, C:{client_worker}, S:{server_worker}")
-                    
-                    result = test.run_stress_test(operation, volume, client_worker, server_worker)
-                    if result:
-                        result['nomor'] = test_number
-                        results.append(result)
-                    else:
-                        print("✗ Test failed")
-                    
-                    test_number += 1
-                    time.sleep(2)  # Longer pause between tests
+    for client_model in client_models:
+        for operation in operations:
+            for volume in volumes:
+                for client_worker in client_workers:
+                    for server_worker in server_workers:
+                        print(f"\nTest {test_number}/{total_tests}: {operation} {volume}MB, "
+                              f"C:{client_worker} ({client_model}), S:{server_worker}")
+                        
+                        result = test.run_stress_test(operation, volume, client_worker, server_worker, client_model)
+                        if result:
+                            result['nomor'] = test_number
+                            results.append(result)
+                        else:
+                            print("✗ Test failed")
+                        
+                        test_number += 1
+                        time.sleep(2)  # Longer pause between tests
     
     return results
 
+def _cell(value):
+    """Server column value, '-' when the server did not report it"""
+    return '-' if value is None else str(value)
+
 # Sisanya tetap sama (print_results_table, save_results_to_csv, dll.)
 def print_results_table(results):
     """Print results in the exact format shown by the teacher"""
@@ -319,9 +856,11 @@ def print_results_table(results):
     print("="*150)
     
     headers = [
-        "nomor", "operasi", "volume", "jumlah_client_worker", "jumlah_server_worker",
+        "nomor", "engine", "client_model", "operasi", "volume", "jumlah_client_worker", "jumlah_server_worker",
         "waktu_total_per_client", "throughput_per_client", "worker_client_sukses",
-        "worker_client_gagal", "worker_server_sukses", "worker_server_gagal"
+        "worker_client_gagal", "worker_server_sukses", "worker_server_gagal",
+        "server_request_sukses", "server_request_gagal", "server_request_ditolak",
+        "server_peak_rss_mb", "server_peak_pss_mb", "server_cpu_s", "server_peak_fds", "server_peak_threads", "server_peak_processes"
     ]
     
     header_line = " | ".join([f"{h:<20}" for h in headers])
@@ -331,16 +870,27 @@ def print_results_table(results):
     for result in results:
         row = [
             str(result['nomor']),
+            _cell(result.get('engine')),
+            _cell(result.get('client_model')),
             result['operasi'],
             result['volume'],
             str(result['jumlah_client_worker']),
-            str(result['jumlah_server_worker']),
+            _cell(result['jumlah_server_worker']),
             f"{result['waktu_total_per_client']:.3f}",
             f"{result['throughput_per_client']:.3f}",
             str(result['worker_client_sukses']),
             str(result['worker_client_gagal']),
-            str(result['worker_server_sukses']),
-            str(result['worker_server_gagal'])
+            _cell(result['worker_server_sukses']),
+            _cell(result['worker_server_gagal']),
+            _cell(result.get('server_request_sukses')),
+            _cell(result.get('server_request_gagal')),
+            _cell(result.get('server_request_ditolak')),
+            _cell(result.get('server_peak_rss_mb')),
+            _cell(result.get('server_peak_pss_mb')),
+            _cell(result.get('server_cpu_s')),
+            _cell(result.get('server_peak_fds')),
+            _cell(result.get('server_peak_threads')),
+            _cell(result.get('server_peak_processes'))
         ]
         
         row_line = " | ".join([f"{cell:<20}" for cell in row])
@@ -351,12 +901,16 @@ def save_results_to_csv(results, filename="stress_test_results.csv"):
    try:
        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
            fieldnames = [
-               'nomor', 'operasi', 'volume', 'jumlah_client_worker', 'jumlah_server_worker',
+               'nomor', 'engine', 'client_model', 'operasi', 'volume', 'jumlah_client_worker', 'jumlah_server_worker',
                'waktu_total_per_client', 'throughput_per_client', 'worker_client_sukses',
-               'worker_client_gagal', 'worker_server_sukses', 'worker_server_gagal'
+               'worker_client_gagal', 'worker_server_sukses', 'worker_server_gagal',
+               'server_request_sukses', 'server_request_gagal', 'server_request_ditolak',
+               'server_peak_rss_mb', 'server_peak_pss_mb', 'server_cpu_s', 'server_peak_fds', 'server_peak_threads',
+               'server_peak_processes', 'server_ctx_switches'
            ]
            
-           writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+           # Sampel per request hanya masuk JSON
+           writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
            writer.writeheader()
            
            for result in results:
@@ -413,7 +967,116 @@ def generate_analysis_report(results):
            success_rate = (total_success / total_attempts) * 100 if total_attempts > 0 else 0
            print(f"{volume}MB files - Success Rate: {success_rate:.1f}%, Avg Throughput: {avg_throughput:.3f} B/s, Avg Time: {avg_time:.3f}s")
 
+# Selisih p99 (ms) di atas p99 idle yang masih dianggap datar untuk request yang datang terlambat
+LATE_P99_SLACK_MS = 100
+
+def run_latency_test(args):
+    """Head-of-line blocking test: small request latency under concurrent bulk load"""
+    test = ComprehensiveStressTest(server_address=(args.host, args.port))
+    if not test.create_test_files():
+        print("Failed to create test files!")
+        return None
+    
+    result = test.run_latency_under_load(volume_mb=args.volume, bulk_clients=args.bulk_clients,
+                                         small_requests=args.small_requests,
+                                         late_delay=args.late_delay_ms / 1000)
+    if result:
+        idle_p99 = result['idle']['p99'] * 1000
+        loaded_p99 = result['bulk_load']['p99'] * 1000
+        late_p99 = result['late']['p99'] * 1000
+        print(f"\nSmall request p99: idle {idle_p99:.1f}ms, under bulk load {loaded_p99:.1f}ms, "
+              f"late arrival {late_p99:.1f}ms")
+        # Datar = tetap dekat p99 idle; antri di belakang transfer bulk menambah detik, bukan milidetik
+        result['late_flat'] = late_p99 <= idle_p99 + LATE_P99_SLACK_MS
+        if not result['bulk_running_after_late']:
+            print("Late-arrival check inconclusive: bulk downloads finished before the late phase "
+                  "(use a larger --volume or more --bulk-clients)")
+        elif result['late_flat']:
+            print("Late-arrival check passed: p99 stays flat when requests arrive after accept")
+        else:
+            print(f"Late-arrival check FAILED: late p99 {late_p99:.1f}ms is more than {LATE_P99_SLACK_MS}ms "
+                  f"above idle p99 {idle_p99:.1f}ms (late connections wait behind bulk transfers)")
+    return result
+
+def run_fairness(args):
+    """Fairness test: heavy vs light clients, run against a server with per-client limits (e.g. --bytes-per-sec)"""
+    test = ComprehensiveStressTest(server_address=(args.host, args.port))
+    if not test.create_test_files():
+        print("Failed to create test files!")
+        return None
+    return test.run_fairness_test(volume_mb=args.volume, heavy_parallel=args.heavy_parallel,
+                                  light_clients=args.light_clients, duration=args.duration)
+
+def run_restart(args):
+    """Zero-downtime check: hot restarts of the server while transfers are running"""
+    test = ComprehensiveStressTest(server_address=(args.host, args.port))
+    if not test.create_test_files():
+        print("Failed to create test files!")
+        return None
+    return test.run_restart_test(volume_mb=args.volume, clients=args.bulk_clients, duration=args.duration,
+                                 restarts=args.restarts)
+
+def run_open_loop(args):
+    """Open-loop constant arrival rate: latency percentiles per offered rate"""
+    from load_generator import OpenLoopLoadGenerator, print_open_loop_table, find_knee
+    
+    filename = None
+    if args.request != 'list':
+        test = ComprehensiveStressTest(server_address=(args.host, args.port))
+        filename = args.file
+        if not filename:
+            filename = "test_1KB.txt"
+            with open(filename, 'w') as f:
+                f.write("A" * 1024)
+        if args.request == 'download':
+            # File harus ada di server sebelum GET
+            test.client.upload_file(filename)
+    
+    generator = OpenLoopLoadGenerator(server_address=(args.host, args.port), operation=args.request,
+                                      filename=filename, arrival=args.arrival, timeout=args.timeout)
+    results = generator.sweep(args.rates, duration=args.duration)
+    print_open_loop_table(results)
+    knee = find_knee(results)
+    if knee is None:
+        print(f"\nServer kept up with every offered rate up to {max(args.rates)} req/s")
+    else:
+        print(f"\nSaturation: server stops keeping up at {knee} req/s")
+    return results
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Stress test untuk file server")
+    parser.add_argument('--mode', choices=['matrix', 'latency', 'fairness', 'openloop', 'restart'], default='matrix',
+                        help="matrix: 81 kombinasi tugas, latency: p99 request kecil di bawah bulk load, "
+                             "fairness: client agresif vs client ringan, "
+                             "openloop: request dengan arrival rate tetap untuk mencari titik saturasi, "
+                             "restart: hot restart (SIGHUP) saat transfer berjalan, harus tanpa request gagal")
+    parser.add_argument('--client-model', nargs='+', choices=['thread', 'process', 'async'], default=['thread'],
+                        help="Model concurrency client di mode matrix: thread pool, process pool dan/atau "
+                             "coroutine asyncio dalam satu process")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=6666)
+    parser.add_argument('--volume', type=int, default=100, help="Ukuran file bulk (MB) untuk mode latency dan restart")
+    parser.add_argument('--bulk-clients', type=int, default=5, help="Jumlah client di mode latency dan restart")
+    parser.add_argument('--small-requests', type=int, default=200)
+    parser.add_argument('--late-delay-ms', type=float, default=20,
+                        help="Mode latency: jeda antara connect dan kirim request di fase late")
+    parser.add_argument('--heavy-parallel', type=int, default=20)
+    parser.add_argument('--light-clients', type=int, default=3)
+    parser.add_argument('--duration', type=int, default=30,
+                        help="Durasi (detik) untuk mode fairness, openloop dan restart")
+    parser.add_argument('--restarts', type=int, default=3, help="Jumlah hot restart di mode restart")
+    parser.add_argument('--rates', nargs='+', type=float, default=[5, 10, 20, 50, 100],
+                        help="Offered rate (request/detik) untuk mode openloop")
+    parser.add_argument('--arrival', choices=['poisson', 'fixed'], default='poisson')
+    parser.add_argument('--request', choices=['list', 'download', 'upload'], default='list',
+                        help="Jenis request di mode openloop")
+    parser.add_argument('--file', help="File untuk download/upload di mode openloop (default 1KB)")
+    parser.add_argument('--timeout', type=float, default=10, help="Timeout per request di mode openloop")
+    return parser.parse_args()
+
 def main():
+   args = parse_args()
+   
    print("COMPREHENSIVE STRESS TEST - IMPROVED VERSION")
    print(f"Start time: {datetime.now()}")
    print("="*80)
@@ -423,19 +1086,36 @@ def main():
        os.makedirs('files')
        print("Created 'files' directory")
    
+   if args.mode == 'latency':
+       run_latency_test(args)
+       return
+   if args.mode == 'fairness':
+       run_fairness(args)
+       return
+   if args.mode == 'openloop':
+       run_open_loop(args)
+       return
+   if args.mode == 'restart':
+       run_restart(args)
+       return
+   
    try:
        
 
-       results = run_all_combinations()
+       # Matrix ini menguji server yang sudah jalan; untuk semua engine dan pool size
+       # sekaligus pakai benchmark_orchestrator.py
+       results = run_all_combinations(server_address=(args.host, args.port), client_models=args.client_model)
        
        print_results_table(results)
        
-       SERVER_MODE = "threading"  # atau "multiprocessing"
+       # Nama engine diambil dari STATS server, bukan di-hardcode
+       engine = next((r['engine'] for r in results if r.get('engine')), 'unknown')
        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
        
-       filename = f"stress_{SERVER_MODE}_{timestamp}.csv"
+       filename = f"stress_{engine}_{timestamp}.csv"
        
        save_results_to_csv(results, filename)
+       save_results_json(results, filename.replace('.csv', '.json'))
        
        generate_analysis_report(results)
        